@@ -0,0 +1,75 @@
+"""Time and memory of the conversions between pydub and NumPy.
+
+Compares the original conversions (through array.array, always 16-bit)
+with sound_to_samples and a reused PcmEncoder:
+
+    python benchmarks/pcm_bridge.py [--seconds 60] [--channels 2] [--rungs 20]
+
+Decoding is measured once per input; encoding once per rung, as the ladder
+loop does. For each the table lists the mean time and the peak of memory
+allocated on top of the rendered samples, from tracemalloc.
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from pydub import AudioSegment
+
+from soundladder_engine import sound_to_samples
+from soundladder_export import PcmEncoder
+
+def legacy_decode(sound):
+    samples = np.array(sound.get_array_of_samples())
+    samples = samples.reshape(-1, sound.channels).T
+    return samples.astype(np.float32) / 32768.0
+
+def legacy_encode(shifted):
+    shifted = np.clip(shifted.T * 32768.0, -32768, 32767).astype(np.int16)
+    return shifted.tobytes()
+
+def measure(function, argument, repeats):
+    """Mean seconds per call and peak bytes allocated by one call."""
+    function(argument)  # warm up, and let the encoder allocate its buffers
+
+    tracemalloc.start()
+    function(argument)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function(argument)
+    return (time.perf_counter() - start) / repeats, peak
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pydub/NumPy sample conversions.")
+    parser.add_argument("--seconds", type=float, default=60.0, help="length of the test signal")
+    parser.add_argument("--channels", type=int, default=2, help="channels of the test signal")
+    parser.add_argument("--rungs", type=int, default=20, help="encodes timed per method")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    samples = rng.uniform(-0.5, 0.5, (args.channels, int(44100 * args.seconds))).astype(np.float32)
+    sound = AudioSegment(
+        legacy_encode(samples), frame_rate=44100, sample_width=2, channels=args.channels
+    )
+    encoder = PcmEncoder(2)
+
+    rows = [
+        ('decode', 'legacy', *measure(legacy_decode, sound, 3)),
+        ('decode', 'frombuffer', *measure(sound_to_samples, sound, 3)),
+        ('encode', 'legacy', *measure(legacy_encode, samples, args.rungs)),
+        ('encode', 'PcmEncoder', *measure(encoder.encode, samples, args.rungs))
+    ]
+
+    print(f"{'stage':<7} {'method':<11} {'ms':>8} {'peak MB':>8}")
+    for stage, method, seconds, peak in rows:
+        print(f"{stage:<7} {method:<11} {seconds * 1000:>8.1f} {peak / 1e6:>8.1f}")
+
+if __name__ == '__main__':
+    main()
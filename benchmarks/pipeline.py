@@ -0,0 +1,215 @@
+"""Stage-by-stage benchmark of the ladder pipeline, with a stored baseline.
+
+Generates synthetic inputs (a sung-note-like tone, seeded, so every run
+renders the same audio) for each combination of length, channel count,
+sample rate and ladder size, and times every stage of the pipeline:
+
+    decode    decode_input (a memory map of the WAV input) and sound_to_samples
+    detect    pitch detection (detect_sound_pitch, without the pitch store)
+    analysis  the LadderAnalysis STFT shared by every rung (the pitch track and
+              marks for --engine psola, nothing for varispeed)
+    shift     rendering the rungs
+    encode    converting the rungs to PCM
+    export    writing the rungs (WAV) or encoding them (MP3)
+
+    python benchmarks/pipeline.py [--lengths 2 10 30] [--channels 1 2]
+        [--rates 44100 48000] [--rungs 12] [--engine vocoder] [--json results.json]
+        [--baseline baseline.json]
+
+Each case is run ``--repeats`` times and the median of every stage is kept.
+It also reports rungs per second, the real-time factor (seconds of audio
+produced per second of processing) and the peak memory traced during one
+extra run. With --baseline, the stages that got slower than the threshold
+are listed and the exit status is 1, so a release script can stop on them.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import itertools
+import statistics
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import librosa
+import numpy as np
+
+from quality_tiers import synthetic_note
+from soundladder_constants import DEFAULT_DETECTOR, QUALITY_PROFILES, RENDER_ENGINES
+from soundladder_engine import (
+    decode_input,
+    detect_sound_pitch,
+    ladder_renderer,
+    sound_to_samples
+)
+from soundladder_export import PcmEncoder, encode_mp3, rung_encoder, write_wav
+
+STAGES = ('decode', 'detect', 'analysis', 'shift', 'encode', 'export')
+
+# Slowdowns smaller than this are noise, whatever the ratio
+MIN_REGRESSION_S = 0.005
+
+def case_id(case):
+    return "{seconds}s-{channels}ch-{rate}Hz-{rungs}r".format(**case)
+
+def write_input(path, case):
+    """Write the 16-bit synthetic input of ``case``; each channel gets its own noise."""
+    channels = [
+        synthetic_note(case['rate'], case['seconds'], seed=channel)[0][0] * (1.0 - 0.2 * channel)
+        for channel in range(case['channels'])
+    ]
+    write_wav(path, PcmEncoder(2).encode(np.stack(channels)), case['rate'], case['channels'], 2)
+
+def run_case(input_file, output_dir, case, settings):
+    """Run the pipeline once; returns the seconds spent in each stage."""
+    times = dict.fromkeys(STAGES, 0.0)
+
+    def timed(stage, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        times[stage] += time.perf_counter() - start
+        return result
+
+    sound = timed('decode', decode_input, input_file)
+    samples = timed('decode', sound_to_samples, sound)
+    frequency = timed('detect', detect_sound_pitch, sound, settings['detector'])
+    analysis = timed('analysis', ladder_renderer, samples, sound.frame_rate, settings, frequency)
+
+    encoder = rung_encoder(settings['output_format'], sound.sample_width)
+    for i in range(case['rungs']):
+        semitones = (i - case['rungs'] // 2) * settings['pitch_increment']
+        shifted = timed('shift', analysis.render, semitones)
+        pcm = timed('encode', encoder.encode, shifted)
+
+        output_file = os.path.join(output_dir, f"rung_{i:03d}.{settings['output_format']}")
+        if settings['output_format'] == "mp3":
+            timed('export', encode_mp3, output_file, pcm, sound.frame_rate, sound.channels, {})
+        else:
+            timed('export', write_wav, output_file, pcm, sound.frame_rate, sound.channels, encoder.sample_width)
+    return times
+
+def peak_memory(input_file, output_dir, case, settings):
+    """Peak bytes allocated (tracemalloc) during one run of the pipeline."""
+    tracemalloc.start()
+    try:
+        run_case(input_file, output_dir, case, settings)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def benchmark(cases, settings, repeats):
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix='soundladder-bench-')
+    try:
+        for case in cases:
+            input_file = os.path.join(work_dir, 'input.wav')
+            output_dir = os.path.join(work_dir, 'out')
+            os.makedirs(output_dir, exist_ok=True)
+            write_input(input_file, case)
+
+            # The first run warms up librosa's and the filter bank's caches
+            run_case(input_file, output_dir, case, settings)
+            runs = [run_case(input_file, output_dir, case, settings) for _ in range(repeats)]
+            stages = {stage: statistics.median(run[stage] for run in runs) for stage in STAGES}
+
+            total = sum(stages.values())
+            results[case_id(case)] = {
+                **case,
+                'stages_s': stages,
+                'total_s': total,
+                'rungs_per_s': case['rungs'] / total,
+                'realtime_factor': case['rungs'] * case['seconds'] / total,
+                'peak_mb': peak_memory(input_file, output_dir, case, settings) / 1e6
+            }
+            shutil.rmtree(output_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'librosa': librosa.__version__
+    }
+
+def compare(results, baseline, threshold):
+    """List (case, stage, baseline s, new s) of the stages slower than the baseline."""
+    regressions = []
+    for case, result in results.items():
+        previous = baseline.get('results', {}).get(case)
+        if previous is None:
+            continue
+        for stage in (*STAGES, 'total'):
+            new = result['total_s'] if stage == 'total' else result['stages_s'][stage]
+            old = previous['total_s'] if stage == 'total' else previous['stages_s'].get(stage)
+            if old is None:
+                continue
+            if new > old * (1 + threshold) and new - old > MIN_REGRESSION_S:
+                regressions.append((case, stage, old, new))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the ladder pipeline.")
+    parser.add_argument("--lengths", type=float, nargs="+", default=[2.0, 10.0, 30.0], help="input lengths in seconds")
+    parser.add_argument("--channels", type=int, nargs="+", default=[1, 2], help="input channel counts")
+    parser.add_argument("--rates", type=int, nargs="+", default=[44100, 48000], help="input sample rates")
+    parser.add_argument("--rungs", type=int, nargs="+", default=[12], help="ladder sizes")
+    parser.add_argument("--quality", choices=QUALITY_PROFILES, default='standard', help="quality profile")
+    parser.add_argument("--detector", default=DEFAULT_DETECTOR, help="pitch detector")
+    parser.add_argument("--engine", choices=RENDER_ENGINES, default='vocoder', help="rendering engine")
+    parser.add_argument("--format", choices=("wav", "mp3"), default="wav", help="output format")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per case (the median is kept)")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown reported as a regression (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    settings = {
+        'quality': args.quality,
+        'detector': args.detector,
+        'engine': args.engine,
+        'output_format': args.format,
+        'pitch_increment': 1.0
+    }
+    cases = [
+        {'seconds': seconds, 'channels': channels, 'rate': rate, 'rungs': rungs}
+        for seconds, channels, rate, rungs in itertools.product(args.lengths, args.channels, args.rates, args.rungs)
+    ]
+    results = benchmark(cases, settings, args.repeats)
+
+    print(f"{'case':<22} " + " ".join(f"{stage:>8}" for stage in STAGES) + f" {'rungs/s':>8} {'x RT':>7} {'peak MB':>8}")
+    for case, result in results.items():
+        print(
+            f"{case:<22} "
+            + " ".join(f"{result['stages_s'][stage] * 1000:>6.0f}ms" for stage in STAGES)
+            + f" {result['rungs_per_s']:>8.2f} {result['realtime_factor']:>7.1f} {result['peak_mb']:>8.1f}"
+        )
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'settings': settings, 'results': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != settings:
+            print("Warning: the baseline was run with different settings")
+        regressions = compare(results, baseline, args.threshold)
+        for case, stage, old, new in regressions:
+            print(f"REGRESSION {case} {stage}: {old * 1000:.1f}ms -> {new * 1000:.1f}ms ({new / old - 1:+.0%})")
+        if regressions:
+            return 1
+        print(f"No stage is more than {args.threshold:.0%} slower than the baseline")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Speed/quality table of the rendering quality profiles.
+
+Renders the same ladder with every profile in QUALITY_PROFILES and compares
+each rung with the "mastering" render (kaiser_best resampling):
+
+    python benchmarks/quality_tiers.py [input.wav] [--rungs 12] [--increment 1.0]
+
+Without an input, a synthetic sung-note-like tone is used. For every profile
+the table lists the analysis time, the mean render time per rung, the speed-up
+over mastering, the waveform SNR against mastering and the log-spectral
+distance against it (0 dB means identical spectra).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import librosa
+import numpy as np
+
+from soundladder_engine import QUALITY_PROFILES, LadderAnalysis, load_sound, sound_to_samples
+
+REFERENCE_QUALITY = 'mastering'
+
+def synthetic_note(sample_rate=44100, duration=2.0, frequency=220.0, seed=0):
+    """A harmonic tone with vibrato and an attack/release envelope, shaped (1, n)."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+
+    # 5 Hz vibrato of +-0.3 semitones
+    instantaneous = frequency * 2.0 ** (0.3 * np.sin(2 * np.pi * 5.0 * t) / 12)
+    phase = 2 * np.pi * np.cumsum(instantaneous) / sample_rate
+    y = sum(np.sin(k * phase) / k for k in range(1, 11))
+
+    envelope = np.minimum(1.0, np.minimum(t / 0.05, (duration - t) / 0.2))
+    y = y * envelope + 0.001 * rng.standard_normal(len(t))
+    y = 0.5 * y / np.max(np.abs(y))
+    return y.astype(np.float32)[np.newaxis, :], sample_rate
+
+def snr_db(reference, rendered):
+    """Waveform signal-to-noise ratio of ``rendered`` against ``reference``."""
+    noise = np.sum((reference - rendered) ** 2)
+    if noise == 0:
+        return float('inf')
+    return float(10 * np.log10(np.sum(reference ** 2) / noise))
+
+def log_spectral_distance(reference, rendered, n_fft=2048):
+    """Mean log-spectral distance in dB between two signals."""
+    eps = 1e-8
+    reference_db = 20 * np.log10(np.abs(librosa.stft(reference, n_fft=n_fft)) + eps)
+    rendered_db = 20 * np.log10(np.abs(librosa.stft(rendered, n_fft=n_fft)) + eps)
+    return float(np.mean(np.sqrt(np.mean((reference_db - rendered_db) ** 2, axis=-2))))
+
+def benchmark(samples, sample_rate, rungs, increment):
+    shifts = [(i - rungs // 2) * increment for i in range(rungs)]
+    results = {}
+    renders = {}
+    for quality in QUALITY_PROFILES:
+        start = time.perf_counter()
+        analysis = LadderAnalysis(samples, sample_rate, quality)
+        analysis_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        renders[quality] = [analysis.render(semitones) for semitones in shifts]
+        render_time = (time.perf_counter() - start) / rungs
+
+        results[quality] = {
+            'res_type': QUALITY_PROFILES[quality]['res_type'],
+            'n_fft': QUALITY_PROFILES[quality]['n_fft'],
+            'analysis_s': analysis_time,
+            'render_s_per_rung': render_time
+        }
+
+    reference = renders[REFERENCE_QUALITY]
+    for quality, result in results.items():
+        result['speedup'] = results[REFERENCE_QUALITY]['render_s_per_rung'] / result['render_s_per_rung']
+        result['snr_db'] = float(np.mean([snr_db(r, x) for r, x in zip(reference, renders[quality])]))
+        result['lsd_db'] = float(np.mean([
+            log_spectral_distance(r, x) for r, x in zip(reference, renders[quality])
+        ]))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the speed and quality of the quality profiles.")
+    parser.add_argument("input", nargs="?", help="audio file to render (default: synthetic tone)")
+    parser.add_argument("--rungs", type=int, default=12, help="rungs rendered per profile")
+    parser.add_argument("--increment", type=float, default=1.0, help="semitones between rungs")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        sound = load_sound(args.input)
+        samples, sample_rate = sound_to_samples(sound), sound.frame_rate
+    else:
+        samples, sample_rate = synthetic_note()
+
+    results = benchmark(samples, sample_rate, args.rungs, args.increment)
+
+    print(f"{'profile':<10} {'resampler':<12} {'n_fft':>5} {'analysis':>9} {'ms/rung':>8} "
+          f"{'speedup':>8} {'SNR dB':>7} {'LSD dB':>7}")
+    for quality, result in results.items():
+        print(
+            f"{quality:<10} {result['res_type']:<12} {result['n_fft']:>5} "
+            f"{result['analysis_s'] * 1000:>7.1f}ms {result['render_s_per_rung'] * 1000:>8.1f} "
+            f"{result['speedup']:>7.2f}x {result['snr_db']:>7.1f} {result['lsd_db']:>7.2f}"
+        )
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
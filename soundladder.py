@@ -5,6 +5,19 @@ from tkinter import filedialog, messagebox
 import logging
 import subprocess
 import sys
+import queue
+import threading
+
+from soundladder_constants import (
+    BIT_DEPTHS,
+    DEFAULT_DETECTOR,
+    DEFAULT_ENGINE,
+    DEFAULT_QUALITY,
+    PITCH_DETECTORS,
+    QUALITY_PROFILES,
+    RENDER_ENGINES
+)
+from soundladder_filelist import FileRegistry, VirtualFileList
 
 # Set up logging with more detail
 logging.basicConfig(
@@ -77,30 +90,34 @@ label_style = {
     'padx': 10
 }
 
-# Create the root window FIRST
-root = tk.Tk()
-root.title("Sound Bite Generator")
-root.state('zoomed')
-root.configure(bg=DARK_BG)
-
-# THEN create Tkinter variables
-output_dir_var = tk.StringVar()
-num_files_var = tk.StringVar(value="100")
-output_format_var = tk.StringVar(value="wav")
-start_pitch_var = tk.StringVar(value="60")
-pitch_increment_var = tk.StringVar(value="0.5")
-
-# Other global variables
-selected_files = []
-files_treeview = None
+# Minimum time between two treeview refreshes while rendering
+PROGRESS_INTERVAL_MS = 100
+
+# Errors listed in the dialog at the end of a batch; the log has all of them
+MAX_ERRORS_SHOWN = 10
+
+# Time the preview slider must rest on a file before it is previewed
+PREVIEW_DEBOUNCE_MS = 80
+
+# Global state, filled in when the GUI starts
+root = None
+file_registry = FileRegistry()
+file_list = None
 status_label = None
+generate_button = None
+cancel_button = None
+preview_scale = None
+preview_after_id = None
 
-# Variables for settings
-output_dir_var = tk.StringVar()
-num_files_var = tk.StringVar(value="100")  # Default value
-output_format_var = tk.StringVar(value="wav")  # Default value
-start_pitch_var = tk.StringVar(value="60")  # Default value
-pitch_increment_var = tk.StringVar(value="0.5")  # Default value
+# Previews render on a background thread each and report through preview_queue;
+# only the latest request (preview_request) is played
+preview_request = 0
+preview_queue = queue.Queue()
+
+# Rendering runs on generation_thread and reports through progress_queue
+generation_thread = None
+progress_queue = queue.Queue()
+cancel_event = threading.Event()
 
 def create_round_rectangle(canvas, x1, y1, x2, y2, radius=25, **kwargs):
     """Create a rounded rectangle on a canvas."""
@@ -224,189 +241,105 @@ def check_dependencies():
         messagebox.showerror("Error", f"An unexpected error occurred:\n{str(e)}")
         return False
 
-# Check dependencies before importing them
-if not check_dependencies():
-    root.destroy()
-    sys.exit(1)
-
-# Only import these after checking dependencies
-import librosa
-import numpy as np
-from pydub import AudioSegment
+def get_settings():
+    """Read the ladder settings from the GUI, raising ValueError if invalid."""
+    settings = {
+        'start_pitch': float(start_pitch_var.get()),
+        'pitch_increment': float(pitch_increment_var.get()),
+        'num_files': int(num_files_var.get()),
+        'output_format': output_format_var.get(),
+        'detector': detector_var.get(),
+        'quality': quality_var.get(),
+        'engine': engine_var.get(),
+        'target_duration': float(target_duration_var.get()),
+        'memory_budget_mb': int(memory_budget_var.get()),
+        'bit_depth': 0 if bit_depth_var.get() == "Source" else int(bit_depth_var.get())
+    }
+    if settings['num_files'] < 1:
+        raise ValueError("Number of files must be at least 1")
+    if settings['memory_budget_mb'] < 0:
+        raise ValueError("Memory budget cannot be negative")
+    if settings['target_duration'] < 0:
+        raise ValueError("Target duration cannot be negative")
+    return settings
+
+def run_generation(input_files, item_ids, output_dir, settings, workers):
+    """Render a batch on the background thread, reporting through progress_queue."""
+    def on_status(index, status, progress=None):
+        progress_queue.put(('status', item_ids[index], status, progress))
 
-# Function to change the pitch of the sound
-def change_pitch(sound, semitones):
-    """Change pitch while preserving duration exactly."""
     try:
-        # Convert pydub AudioSegment to numpy array
-        samples = np.array(sound.get_array_of_samples())
-        sample_rate = sound.frame_rate
-        
-        # Handle stereo by processing each channel separately
-        if sound.channels == 2:
-            samples = samples.reshape(-1, 2)
-        
-        # Convert to float32 for librosa
-        samples = samples.astype(np.float32) / 32768.0
-        
-        # Process mono or each stereo channel
-        if sound.channels == 1:
-            shifted = librosa.effects.pitch_shift(
-                y=samples,
-                sr=sample_rate,
-                n_steps=semitones,
-                bins_per_octave=12,
-                res_type='kaiser_best'  # Higher quality resampling
-            )
-        else:
-            # Process each channel separately
-            shifted_left = librosa.effects.pitch_shift(
-                y=samples[:, 0],
-                sr=sample_rate,
-                n_steps=semitones,
-                bins_per_octave=12,
-                res_type='kaiser_best'
-            )
-            shifted_right = librosa.effects.pitch_shift(
-                y=samples[:, 1],
-                sr=sample_rate,
-                n_steps=semitones,
-                bins_per_octave=12,
-                res_type='kaiser_best'
-            )
-            shifted = np.vstack((shifted_left, shifted_right)).T
-        
-        # Ensure exact same length as input
-        if len(shifted) > len(samples):
-            shifted = shifted[:len(samples)]
-        elif len(shifted) < len(samples):
-            # Pad with silence if needed
-            if sound.channels == 2:
-                padding = np.zeros((len(samples) - len(shifted), 2))
-            else:
-                padding = np.zeros(len(samples) - len(shifted))
-            shifted = np.concatenate([shifted, padding])
-        
-        # Convert back to int16
-        shifted = np.clip(shifted * 32768.0, -32768, 32767).astype(np.int16)
-        
-        # Create new AudioSegment
-        new_sound = AudioSegment(
-            shifted.tobytes(), 
-            frame_rate=sample_rate,
-            sample_width=2, 
-            channels=sound.channels
+        errors = generate_batch(
+            input_files,
+            output_dir,
+            settings,
+            workers,
+            on_status=on_status,
+            is_cancelled=cancel_event.is_set
         )
-        
-        # Final length check
-        if len(new_sound) != len(sound):
-            logger.warning(f"Length mismatch: original={len(sound)}ms, new={len(new_sound)}ms")
-            new_sound = new_sound[:len(sound)]
-        
-        return new_sound
-        
+        errors = [(input_files[index], e) for index, e in errors]
     except Exception as e:
-        logger.error(f"Error in pitch shifting: {str(e)}", exc_info=True)
-        raise
-
-def detect_pitch(file_path):
-    """Detect the fundamental frequency (pitch) of an audio file."""
-    y, sr = librosa.load(file_path)
-    pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
-    
-    # Get the highest magnitude pitch for each time
-    pit_mags = []
-    for time_slice in range(pitches.shape[1]):
-        index = magnitudes[:, time_slice].argmax()
-        pit_mags.append(pitches[index, time_slice])
-    
-    # Get the most common pitch (excluding zeros)
-    pit_mags = np.array(pit_mags)
-    pit_mags = pit_mags[pit_mags > 0]
-    return np.median(pit_mags)
-
-def frequency_to_midi_note(frequency):
-    """Convert frequency in Hz to MIDI note number."""
-    return 69 + 12 * np.log2(frequency / 440.0)
-
-def midi_note_to_frequency(midi_note):
-    """Convert MIDI note number to frequency in Hz."""
-    return 440.0 * (2.0 ** ((midi_note - 69.0) / 12.0))
-
-# Function to generate sound files
-def generate_sounds(input_file, output_dir, item_id):
-    """Generate pitch-shifted sounds with user-defined settings."""
-    try:
-        # Get all values first
+        logger.error(f"Error during generation: {str(e)}", exc_info=True)
+        errors = [(None, e)]
+
+    logger.info(render_cache.format_stats())
+    if trace_file:
+        soundladder_trace.tracer.write_chrome_trace(trace_file)
+        logger.info(f"Stage timings (trace written to {trace_file}):\n{soundladder_trace.tracer.format_summary()}")
+        soundladder_trace.tracer.clear()
+    progress_queue.put(('done', errors))
+
+def drain_progress():
+    """Apply queued progress events to the treeview, at most every PROGRESS_INTERVAL_MS.
+
+    Only the latest event of each file is applied, so the cost of a refresh
+    does not depend on how many rungs finished since the previous one.
+    """
+    latest = {}
+    finished = None
+    while True:
         try:
-            start_pitch = float(start_pitch_var.get())
-            pitch_increment = float(pitch_increment_var.get())
-            num_files = int(num_files_var.get())  # Get num_files from the variable
-            output_format = output_format_var.get()
-            
-            if num_files < 1:
-                raise ValueError("Number of files must be at least 1")
-                
-        except ValueError as e:
-            logger.error(f"Invalid values: {str(e)}")
-            messagebox.showerror("Error", f"Please enter valid numbers: {str(e)}")
-            return
-            
-        # Update status to analyzing
-        update_file_status(item_id, 'ANALYZING')
-        
-        # Get original filename without extension
-        original_filename = os.path.splitext(os.path.basename(input_file))[0]
-        
-        # Load and process sound
-        sound = AudioSegment.from_file(input_file)
-        input_freq = detect_pitch(input_file)
-        input_note = frequency_to_midi_note(input_freq)
-        semitone_adjustment = start_pitch - input_note
-        
-        logger.debug(f"Input frequency: {input_freq:.2f} Hz")
-        logger.debug(f"Input MIDI note: {input_note:.1f}")
-        logger.debug(f"Adjustment needed: {semitone_adjustment:.1f} semitones")
-        logger.debug(f"Pitch increment: {pitch_increment} semitones")
-        logger.debug(f"Number of files: {num_files}")
-        logger.debug(f"Output format: {output_format}")
-        
-        os.makedirs(output_dir, exist_ok=True)
-
-        # Generate sound bites
-        for i in range(num_files):
-            if PROCESSING_CANCELLED:
-                update_file_status(item_id, 'CANCELLED')
-                return
-                
-            progress = int((i + 1) / num_files * 100)
-            update_file_status(item_id, 'CONVERTING', progress)
-            
-            semitone_increase = (i * pitch_increment) + semitone_adjustment
-            new_sound = change_pitch(sound, semitone_increase)
-            output_file = os.path.join(output_dir, f"{original_filename}_sound_{i+1:03d}.{output_format}")
-            
-            # Export with format-specific settings
-            if output_format == "mp3":
-                new_sound.export(
-                    output_file, 
-                    format="mp3",
-                    bitrate="192k",
-                    tags={
-                        'title': f'{original_filename} Sound {i+1}',
-                        'artist': 'Sound Ladder Generator',
-                        'pitch_shift': f'{semitone_increase:.1f} semitones'
-                    }
-                )
-            else:  # WAV
-                new_sound.export(output_file, format="wav")
-            
-        update_file_status(item_id, 'COMPLETED', 100)
-        return output_dir
-    except Exception as e:
-        logger.error(f"Error in generate_sounds: {str(e)}", exc_info=True)
-        update_file_status(item_id, 'ERROR')
-        raise
+            event = progress_queue.get_nowait()
+        except queue.Empty:
+            break
+        if event[0] == 'status':
+            latest[event[1]] = event[2:]
+        else:
+            finished = event[1]
+
+    for item_id, (status, progress) in latest.items():
+        update_file_status(item_id, status, progress)
+    if latest:
+        file_list.refresh()
+
+    if finished is None:
+        root.after(PROGRESS_INTERVAL_MS, drain_progress)
+    else:
+        finish_generation(finished)
+
+def finish_generation(errors):
+    """Restore the buttons and report the outcome of a batch."""
+    global generation_thread
+    generation_thread = None
+    generate_button.configure(state='normal')
+    cancel_button.configure(state='disabled')
+
+    # One dialog for the whole batch, however many inputs failed
+    if errors:
+        lines = [
+            f"An error occurred:\n{str(e)}" if input_file is None else
+            f"Error processing {os.path.basename(input_file)}:\n{str(e)}"
+            for input_file, e in errors[:MAX_ERRORS_SHOWN]
+        ]
+        if len(errors) > MAX_ERRORS_SHOWN:
+            lines.append(f"... and {len(errors) - MAX_ERRORS_SHOWN} more (see the log)")
+        messagebox.showerror("Error", "\n\n".join(lines))
+
+    if cancel_event.is_set():
+        update_status("Processing cancelled.")
+        messagebox.showinfo("Cancelled", "Processing has been cancelled.")
+    else:
+        update_status("Processing finished.", is_error=bool(errors))
 
 # Callback for the "Select File" button
 def select_file():
@@ -419,10 +352,12 @@ def select_file():
 
 # Callback for the "Generate" button
 def generate():
-    global PROCESSING_CANCELLED
-    PROCESSING_CANCELLED = False
-    
-    if not selected_files:
+    global generation_thread
+
+    if generation_thread is not None:
+        return
+
+    if not file_registry:
         logger.error("No files selected")
         messagebox.showerror("Error", "Please select at least one input file.")
         return
@@ -433,38 +368,38 @@ def generate():
         messagebox.showerror("Error", "Please select an output directory.")
         return
 
-    # Enable cancel button
-    for widget in root.winfo_children():
-        if isinstance(widget, tk.Button) and widget['text'] == "Cancel Processing":
-            widget.configure(state='normal')
+    # Get all values first, Tk variables can only be read on this thread
+    try:
+        settings = get_settings()
+    except ValueError as e:
+        logger.error(f"Invalid values: {str(e)}")
+        messagebox.showerror("Error", f"Please enter valid numbers: {str(e)}")
+        return
 
     try:
-        total_files = 0
-        for i, (input_file, _) in enumerate(selected_files, 1):
-            if PROCESSING_CANCELLED:
-                messagebox.showinfo("Cancelled", "Processing has been cancelled.")
-                break
-
-            item_id = files_treeview.get_children()[i-1]
-            
-            try:
-                generate_sounds(input_file, output_dir, item_id)
-            except Exception as e:
-                logger.error(f"Error processing {input_file}: {str(e)}")
-                update_file_status(item_id, 'ERROR')
-                messagebox.showerror("Error", f"Error processing {os.path.basename(input_file)}:\n{str(e)}")
-                
-        if total_files > 0 and not PROCESSING_CANCELLED:
-            messagebox.showinfo("Success", f"Generated {total_files} sound files in:\n{output_dir}")
-    except Exception as e:
-        logger.error(f"Error during generation: {str(e)}", exc_info=True)
-        messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
-    finally:
-        # Disable cancel button
-        for widget in root.winfo_children():
-            if isinstance(widget, tk.Button) and widget['text'] == "Cancel Processing":
-                widget.configure(state='disabled')
-        PROCESSING_CANCELLED = False
+        workers = max(1, int(workers_var.get()))
+    except ValueError:
+        workers = 1
+
+    cancel_event.clear()
+    generate_button.configure(state='disabled')
+    cancel_button.configure(state='normal')
+    update_status("Processing...")
+
+    # Render on a background thread so the window stays responsive
+    generation_thread = threading.Thread(
+        target=run_generation,
+        args=(
+            file_registry.paths(),
+            file_registry.item_ids(),
+            output_dir,
+            settings,
+            workers
+        ),
+        daemon=True
+    )
+    generation_thread.start()
+    root.after(PROGRESS_INTERVAL_MS, drain_progress)
 
 # Callback for the "Select Output Directory" button
 def select_output_dir():
@@ -508,8 +443,8 @@ def create_ui():
         foreground=[('active', TEXT_COLOR)]
     )
 
-    # Create Treeview with scrollbar
-    global files_treeview
+    # Create Treeview with scrollbar; it only holds the visible rows
+    global file_list
     files_treeview = ttk.Treeview(
         tree_frame,
         columns=("file", "status", "progress"),
@@ -526,8 +461,10 @@ def create_ui():
     files_treeview.column("status", width=100)
     files_treeview.column("progress", width=100)
     
-    scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=files_treeview.yview)
-    files_treeview.configure(yscrollcommand=scrollbar.set)
+    scrollbar = ttk.Scrollbar(tree_frame, orient="vertical")
+    file_list = VirtualFileList(
+        files_treeview, scrollbar, file_registry, {key: status['text'] for key, status in STATUS_TYPES.items()}
+    )
     
     files_treeview.pack(side='left', fill='x', expand=True)
     scrollbar.pack(side='right', fill='y')
@@ -596,7 +533,7 @@ def create_ui():
     ttk.Combobox(
         format_frame,
         textvariable=output_format_var,
-        values=["wav", "mp3"],
+        values=["wav", "mp3", "packed"],
         state="readonly",
         width=8
     ).pack(side='left')
@@ -620,6 +557,74 @@ def create_ui():
         width=10
     ).pack(side='left')
 
+    detector_frame = create_input_row(settings_section, "Pitch Detector:", None)
+    ttk.Combobox(
+        detector_frame,
+        textvariable=detector_var,
+        values=list(PITCH_DETECTORS),
+        state="readonly",
+        width=8
+    ).pack(side='left')
+
+    bit_depth_frame = create_input_row(settings_section, "Bit Depth:", None)
+    ttk.Combobox(
+        bit_depth_frame,
+        textvariable=bit_depth_var,
+        values=["Source"] + [str(bits) for bits in BIT_DEPTHS if bits],
+        state="readonly",
+        width=8
+    ).pack(side='left')
+
+    quality_frame = create_input_row(settings_section, "Quality:", None)
+    ttk.Combobox(
+        quality_frame,
+        textvariable=quality_var,
+        values=list(QUALITY_PROFILES),
+        state="readonly",
+        width=10
+    ).pack(side='left')
+
+    # Varispeed resamples only: much faster, but higher rungs are shorter
+    engine_frame = create_input_row(settings_section, "Engine:", None)
+    ttk.Combobox(
+        engine_frame,
+        textvariable=engine_var,
+        values=list(RENDER_ENGINES),
+        state="readonly",
+        width=10
+    ).pack(side='left')
+
+    # 0 keeps each varispeed rung's natural length
+    duration_frame = create_input_row(settings_section, "Target Duration (s):", None)
+    RoundedSpinbox(
+        duration_frame,
+        from_=0,
+        to=600,
+        increment=0.5,
+        textvariable=target_duration_var,
+        width=10
+    ).pack(side='left')
+
+    workers_frame = create_input_row(settings_section, "Worker Processes:", None)
+    RoundedSpinbox(
+        workers_frame,
+        from_=1,
+        to=64,
+        textvariable=workers_var,
+        width=10
+    ).pack(side='left')
+
+    # 0 renders in memory; a budget streams long inputs block by block
+    memory_frame = create_input_row(settings_section, "Memory Budget (MB):", None)
+    RoundedSpinbox(
+        memory_frame,
+        from_=0,
+        to=65536,
+        increment=64,
+        textvariable=memory_budget_var,
+        width=10
+    ).pack(side='left')
+
     # Preview section
     preview_frame = tk.Frame(main_container, bg=DARK_BG)
     preview_frame.pack(fill='x', pady=10)
@@ -628,6 +633,28 @@ def create_ui():
     preview_center.pack(expand=True)
     
     RoundedButton(preview_center, text="Preview Lowest", command=lambda: preview_pitch("lowest"), **regular_button_style).pack(side='left', padx=5)
+
+    # Scrub through the ladder: every rung previews from the cached analysis
+    global preview_scale
+    preview_scale = tk.Scale(
+        preview_center,
+        from_=1,
+        to=max(1, int(num_files_var.get())),
+        orient='horizontal',
+        variable=preview_rung_var,
+        command=schedule_preview,
+        length=300,
+        label="Preview File",
+        bg=DARK_BG,
+        fg=TEXT_COLOR,
+        troughcolor=FIELD_BG,
+        activebackground=ACCENT_COLOR,
+        highlightthickness=0,
+        font=('Segoe UI', 10)
+    )
+    preview_scale.pack(side='left', padx=5)
+    num_files_var.trace_add('write', update_preview_range)
+
     RoundedButton(preview_center, text="Preview Highest", command=lambda: preview_pitch("highest"), **regular_button_style).pack(side='left', padx=5)
 
     # Center the generate button
@@ -637,30 +664,29 @@ def create_ui():
     generate_center = tk.Frame(generate_frame, bg=DARK_BG)
     generate_center.pack(expand=True)
     
-    RoundedButton(
+    global generate_button, cancel_button
+    generate_button = RoundedButton(
         generate_center,
         text="Generate Sound Bites",
         command=generate,
         **large_button_style
-    ).pack()
+    )
+    generate_button.pack(side='left', padx=5)
+
+    cancel_button = RoundedButton(
+        generate_center,
+        text="Cancel Processing",
+        command=cancel_processing,
+        **regular_button_style
+    )
+    cancel_button.configure(state='disabled')
+    cancel_button.pack(side='left', padx=5)
 
     # Status label
     global status_label
     status_label = tk.Label(main_container, text="", bg=DARK_BG, fg=TEXT_COLOR, font=('Segoe UI', 11))
     status_label.pack(pady=10)
 
-# Initialize variables
-input_file_var = tk.StringVar()
-output_dir_var = tk.StringVar()
-status_label = None
-pitch_increment_var = tk.StringVar(value="0.5")  # Default increment
-start_pitch_var = tk.StringVar(value="60")  # Default to middle C (MIDI note 60)
-num_files_var = tk.StringVar(value="100")  # Default to 100 files
-output_format_var = tk.StringVar(value="wav")  # Default to WAV
-start_file_var = tk.StringVar(value="1")  # Default start file number
-end_file_var = tk.StringVar(value="100")  # Default end file number
-selected_files = []  # List to store file paths
-
 def add_files():
     """Callback for Add Files button"""
     files = filedialog.askopenfilenames(
@@ -668,76 +694,111 @@ def add_files():
         filetypes=[("Audio Files", "*.wav *.mp3 *.ogg")]
     )
     if files:
-        for file in files:
-            if file not in [f[0] for f in selected_files]:
-                selected_files.append((file, "Queued..."))
-                files_treeview.insert('', 'end', values=(os.path.basename(file), "Queued...", ""))
+        added = file_registry.add(files)
+        logger.debug(f"Queued {len(added)} of {len(files)} files")
+        file_list.refresh()
 
 def remove_selected():
     """Callback for Remove Selected button"""
-    selected = files_treeview.selection()
-    for item in selected:
-        item_values = files_treeview.item(item)['values']
-        selected_files[:] = [f for f in selected_files if os.path.basename(f[0]) != item_values[0]]
-        files_treeview.delete(item)
+    file_registry.remove(file_list.selection())
+    file_list.refresh()
 
 def clear_files():
     """Callback for Clear All button"""
-    selected_files.clear()
-    for item in files_treeview.get_children():
-        files_treeview.delete(item)
+    file_registry.clear()
+    file_list.selected.clear()
+    file_list.refresh()
 
 def cancel_processing():
     """Cancel the file processing."""
-    global PROCESSING_CANCELLED
-    PROCESSING_CANCELLED = True
+    cancel_event.set()
     if status_label:
         update_status("Cancelling processing...")
 
 def preview_pitch(position):
-    """Preview the pitch-shifted sound"""
-    if not selected_files:
+    """Move the preview slider to the lowest or highest rung and preview it"""
+    try:
+        num_files = int(num_files_var.get())
+    except ValueError:
+        num_files = 1
+    preview_rung_var.set(1 if position == "lowest" else max(1, num_files))
+    schedule_preview()
+
+def schedule_preview(value=None):
+    """Preview the rung under the slider once it stops moving"""
+    global preview_after_id
+    if preview_after_id is not None:
+        root.after_cancel(preview_after_id)
+    preview_after_id = root.after(PREVIEW_DEBOUNCE_MS, preview_selected_rung)
+
+def preview_selected_rung():
+    """Render an excerpt of the slider's rung of the first input on a background thread"""
+    global preview_after_id, preview_request
+    preview_after_id = None
+    if not file_registry:
         messagebox.showwarning("Warning", "Please select at least one input file.")
         return
-        
+
     try:
-        input_file = selected_files[0][0]  # Use first file for preview
-        sound = AudioSegment.from_file(input_file)
-        
-        if position == "lowest":
-            semitones = float(start_pitch_var.get()) - frequency_to_midi_note(detect_pitch(input_file))
-        else:  # highest
-            num_files = int(num_files_var.get())
-            pitch_increment = float(pitch_increment_var.get())
-            semitones = (float(start_pitch_var.get()) - frequency_to_midi_note(detect_pitch(input_file)) + 
-                        (num_files - 1) * pitch_increment)
-        
-        preview = change_pitch(sound, semitones)
-        preview.export("preview.wav", format="wav")
-        
-        # Play the preview
-        if sys.platform == "win32":
-            os.startfile("preview.wav")
-        else:
-            subprocess.run(["xdg-open", "preview.wav"])
-            
+        settings = get_settings()
+        index = min(preview_rung_var.get(), settings['num_files']) - 1
     except Exception as e:
         logger.error(f"Error in preview: {str(e)}", exc_info=True)
         messagebox.showerror("Error", f"Error previewing sound:\n{str(e)}")
+        return
 
-def update_file_status(item_id, status, progress=None):
-    """Update the status and progress of a file in the treeview"""
-    current_values = files_treeview.item(item_id)['values']
-    new_values = [
-        current_values[0],
-        STATUS_TYPES[status]['text'],
-        f"{progress}%" if progress is not None else ""
-    ]
-    files_treeview.item(item_id, values=new_values)
-    files_treeview.update()
+    preview_request += 1
+    threading.Thread(
+        target=run_preview,
+        args=(preview_request, file_registry[0].path, index, settings),  # Use first file for preview
+        daemon=True
+    ).start()
+    root.after(PROGRESS_INTERVAL_MS, drain_preview, preview_request)
 
-# Create the UI
-create_ui()
+def run_preview(request, input_file, index, settings):
+    """Render a preview on its background thread, reporting through preview_queue."""
+    try:
+        outcome = ('rendered', render_preview(input_file, index, settings))
+    except Exception as e:
+        logger.error(f"Error in preview: {str(e)}", exc_info=True)
+        outcome = ('error', e)
+    preview_queue.put((request, outcome))
+
+def drain_preview(request):
+    """Play preview ``request``, or report its error, once it is rendered"""
+    # A newer preview was requested, and drains the queue itself
+    if request != preview_request:
+        return
+    while True:
+        try:
+            rendered, (kind, result) = preview_queue.get_nowait()
+        except queue.Empty:
+            break
+        # Drop previews that were superseded while they rendered
+        if rendered != request:
+            continue
+        if kind == 'rendered':
+            player.play(*result)
+        else:
+            messagebox.showerror("Error", f"Error previewing sound:\n{str(result)}")
+        return
+    root.after(PROGRESS_INTERVAL_MS, drain_preview, request)
+
+def update_preview_range(*args):
+    """Keep the preview slider within the number of files"""
+    try:
+        num_files = int(num_files_var.get())
+    except ValueError:
+        return
+    if preview_scale is not None and num_files >= 1:
+        preview_scale.configure(to=num_files)
+
+def update_file_status(item_id, status, progress=None):
+    """Update the status and progress of a file; file_list.refresh() shows it"""
+    entry = file_registry.get(item_id)
+    if entry is not None:
+        entry.status = status
+        entry.progress = progress
 
 # Update status function with Windows 11 colors
 def update_status(message, is_error=False):
@@ -748,4 +809,57 @@ def update_status(message, is_error=False):
         )
     root.update()
 
-root.mainloop()
+if __name__ == '__main__':
+    # Create the root window FIRST
+    root = tk.Tk()
+    root.title("Sound Bite Generator")
+    root.state('zoomed')
+    root.configure(bg=DARK_BG)
+
+    # THEN create Tkinter variables
+    input_file_var = tk.StringVar()
+    output_dir_var = tk.StringVar()
+    num_files_var = tk.StringVar(value="100")  # Default to 100 files
+    output_format_var = tk.StringVar(value="wav")  # Default to WAV
+    start_pitch_var = tk.StringVar(value="60")  # Default to middle C (MIDI note 60)
+    pitch_increment_var = tk.StringVar(value="0.5")  # Default increment
+    start_file_var = tk.StringVar(value="1")  # Default start file number
+    end_file_var = tk.StringVar(value="100")  # Default end file number
+
+    # Check dependencies before importing them
+    if not check_dependencies():
+        root.destroy()
+        sys.exit(1)
+
+    # Only import these after checking dependencies
+    from soundladder_engine import (
+        default_workers,
+        generate_batch,
+        use_pitch_store,
+        use_render_cache
+    )
+    from soundladder_preview import player, render_preview
+
+    # Remember detected pitches and rendered rungs between sessions
+    use_pitch_store()
+    render_cache = use_render_cache()
+
+    # Record stage timings of every batch when SOUNDLADDER_TRACE names a trace file
+    import soundladder_trace
+    trace_file = os.environ.get('SOUNDLADDER_TRACE')
+    if trace_file:
+        soundladder_trace.enable()
+
+    workers_var = tk.StringVar(value=str(default_workers()))  # Default to one per core
+    detector_var = tk.StringVar(value=DEFAULT_DETECTOR)
+    quality_var = tk.StringVar(value=DEFAULT_QUALITY)
+    engine_var = tk.StringVar(value=DEFAULT_ENGINE)
+    target_duration_var = tk.StringVar(value="0")  # Natural length of each rung
+    memory_budget_var = tk.StringVar(value="0")
+    bit_depth_var = tk.StringVar(value="Source")  # Same bit depth as each input
+    preview_rung_var = tk.IntVar(value=1)  # File previewed by the slider
+
+    # Create the UI
+    create_ui()
+
+    root.mainloop()
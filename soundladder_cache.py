@@ -0,0 +1,207 @@
+"""Content-addressed cache of rendered rungs, shared by every output directory.
+
+Ladders are often rendered again with overlapping settings: the same input
+with a different number of files, or into another directory. Every rung
+written is kept here under a key naming everything its file depends on (see
+render_key in soundladder_engine), and the next time the same rung is needed
+it is hard-linked, or copied, into the output directory instead of rendered.
+
+This module only needs the standard library.
+"""
+import os
+import time
+import shutil
+import logging
+import sqlite3
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+# Sizes are reported in MB of 1024 * 1024 bytes, as --render-cache-mb sets them
+MB = 1024 * 1024
+
+# Default size limit of the cached files
+RENDER_CACHE_BYTES = 1024 * MB
+
+class RenderCache:
+    """Rendered rung files keyed by a content hash, with an SQLite index.
+
+    Files live in ``directory``/objects, named by their key, and the index
+    records the size, modification time and last use of each. Hits are
+    materialized as hard links when ``link`` is set and the output is on the
+    same file system, as copies otherwise. A hard link shares the file with
+    the output, so an entry whose size or modification time no longer
+    matches the index was changed through an output and is dropped. Once the
+    files exceed ``max_bytes`` the least recently used are evicted.
+
+    ``hits`` and ``misses`` count the lookups of this session. Cache errors
+    are logged and treated as misses.
+    """
+    def __init__(self, directory, max_bytes=RENDER_CACHE_BYTES, link=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.link = link
+        self.hits = 0
+        self.misses = 0
+        self.index = os.path.join(directory, 'index.sqlite3')
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        self._execute(
+            lambda db: db.execute(
+                "CREATE TABLE IF NOT EXISTS render ("
+                "key TEXT PRIMARY KEY, bytes INTEGER, mtime_ns INTEGER, last_used REAL)"
+            ),
+            lambda db: db.execute("CREATE INDEX IF NOT EXISTS render_last_used ON render (last_used)")
+        )
+        # The limit may be lower than in the last session
+        self._evict()
+
+    def _execute(self, *steps):
+        """Run steps (functions of the connection) in one transaction; returns the last result."""
+        try:
+            with closing(sqlite3.connect(self.index, timeout=30)) as db:
+                with db:
+                    result = None
+                    for step in steps:
+                        result = step(db)
+                    return result
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Render cache {self.directory} unavailable: {str(e)}")
+            return None
+
+    def _path(self, key):
+        return os.path.join(self.directory, 'objects', key[:2], key)
+
+    def _materialize(self, source, target):
+        """Link or copy ``source`` to ``target``, replacing it atomically."""
+        temporary = f"{target}.{os.getpid()}.tmp"
+        try:
+            if not self.link:
+                raise OSError("hard links disabled")
+            os.link(source, temporary)
+        except OSError:
+            shutil.copyfile(source, temporary)
+        os.replace(temporary, target)
+
+    def fetch(self, items):
+        """Materialize the cached files of ``items``, (key, output_file) pairs.
+
+        Returns the set of output files written.
+        """
+        items = list(items)
+        if not items:
+            return set()
+        def lookup(db):
+            rows = {}
+            keys = [key for key, _ in items]
+            # Stay well under SQLite's limit on query parameters
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                for key, size, mtime_ns in db.execute(
+                    f"SELECT key, bytes, mtime_ns FROM render WHERE key IN ({', '.join('?' * len(batch))})", batch
+                ):
+                    rows[key] = (size, mtime_ns)
+            return rows
+
+        rows = self._execute(lookup) or {}
+
+        written = set()
+        used = []
+        stale = []
+        for key, output_file in items:
+            if key not in rows:
+                continue
+            path = self._path(key)
+            try:
+                stat = os.stat(path)
+                if (stat.st_size, stat.st_mtime_ns) != rows[key]:
+                    stale.append(key)
+                    continue
+                self._materialize(path, output_file)
+            except OSError as e:
+                logger.debug(f"Render cache entry {key} unusable: {str(e)}")
+                stale.append(key)
+                continue
+            written.add(output_file)
+            used.append(key)
+
+        now = time.time()
+        self._execute(
+            lambda db: db.executemany("UPDATE render SET last_used = ? WHERE key = ?", [(now, key) for key in used]),
+            lambda db: db.executemany("DELETE FROM render WHERE key = ?", [(key,) for key in stale])
+        )
+        for key in stale:
+            self._remove(key)
+
+        self.hits += len(written)
+        self.misses += len(items) - len(written)
+        return written
+
+    def put(self, items):
+        """Keep the rendered files of ``items``, (key, output_file) pairs, and evict the oldest."""
+        entries = []
+        for key, output_file in items:
+            path = self._path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._materialize(output_file, path)
+                stat = os.stat(path)
+            except OSError as e:
+                logger.warning(f"Cannot cache {output_file}: {str(e)}")
+                continue
+            entries.append((key, stat.st_size, stat.st_mtime_ns, time.time()))
+        if not entries:
+            return
+
+        self._evict(entries)
+
+    def _evict(self, entries=()):
+        """Index ``entries``, then evict the least recently used files beyond max_bytes, never those entries."""
+        keep = {key for key, _, _, _ in entries}
+
+        def evict(db):
+            db.executemany("INSERT OR REPLACE INTO render VALUES (?, ?, ?, ?)", entries)
+            total = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM render").fetchone()[0]
+            evicted = []
+            for key, size in db.execute("SELECT key, bytes FROM render ORDER BY last_used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                if key in keep:
+                    continue
+                evicted.append(key)
+                total -= size
+            db.executemany("DELETE FROM render WHERE key = ?", [(key,) for key in evicted])
+            return evicted
+
+        for key in self._execute(evict) or []:
+            self._remove(key)
+
+    def _remove(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Cannot remove render cache entry {key}: {str(e)}")
+
+    def stats(self):
+        """Hits and misses of this session, and the files and bytes cached."""
+        entries, size = self._execute(
+            lambda db: db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM render").fetchone()
+        ) or (0, 0)
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+    def format_stats(self):
+        stats = self.stats()
+        lookups = stats['hits'] + stats['misses']
+        rate = stats['hits'] / lookups if lookups else 0.0
+        return (
+            f"Render cache: {stats['hits']} hits, {stats['misses']} misses ({rate:.0%} hit rate), "
+            f"{stats['entries']} files, {stats['bytes'] / MB:.1f} MB of {self.max_bytes / MB:.0f} MB"
+        )
+
+    def invalidate(self):
+        """Forget every cached file."""
+        keys = self._execute(lambda db: [key for key, in db.execute("SELECT key FROM render")]) or []
+        self._execute(lambda db: db.execute("DELETE FROM render"))
+        for key in keys:
+            self._remove(key)
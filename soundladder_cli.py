@@ -0,0 +1,256 @@
+"""Command-line interface of the Sound Ladder Generator.
+
+Runs a job manifest without a display:
+
+    python soundladder_cli.py job.json
+
+The manifest is a JSON object with the same settings as the GUI:
+
+    {
+        "inputs": ["voice/a3.wav", "voice/c4.wav"],
+        "output_dir": "ladders",
+        "start_pitch": 60,
+        "pitch_increment": 0.5,
+        "num_files": 100,
+        "output_format": "wav",
+        "bit_depth": 24,
+        "detector": "piptrack",
+        "quality": "standard",
+        "engine": "vocoder",
+        "target_duration": 0,
+        "memory_budget_mb": 0,
+        "workers": 8
+    }
+
+A "bit_depth" of 8, 16, 24 or 32 sets the bit depth of WAV rungs; 0 (the
+default) keeps that of each input. MP3 rungs are encoded from 16-bit.
+
+The "vocoder" engine keeps the duration of the input. The "varispeed" engine
+shifts by resampling alone, like a tape played faster or slower, so higher
+rungs are shorter; it is much faster. A non-zero "target_duration" (seconds)
+trims or pads every varispeed rung to that length. The "psola" engine keeps
+the duration like the vocoder but works on the waveform, one pitch period at
+a time: crisper and much faster on single sung or spoken notes. Inputs that
+are mostly unvoiced or polyphonic fall back to the vocoder.
+
+A non-zero "memory_budget_mb" streams every input block by block with about
+that much working memory per worker, for inputs too long to render in memory.
+
+Every rung written is also kept in a render cache (in the user cache
+directory, or --render-cache DIR), keyed by the decoded audio and every
+setting that affects the file. Rendering the same rung again, with a
+different number of files or into another directory, hard-links or copies it
+from the cache instead. The cache keeps at most --render-cache-mb MB, evicting
+the least recently used files, and its hit rate is logged at the end of the
+run. Packed ladders and runs with a memory budget are not cached.
+
+--trace FILE records how long every stage (decode, detect, analysis,
+stretch, resample, encode, export) of every file and rung takes, writes the
+spans as a Chrome trace for chrome://tracing or ui.perfetto.dev, and logs
+percentiles per stage at the end of the run.
+
+Relative paths are resolved against the directory of the manifest. The audio
+libraries are only imported once the manifest is valid, so checking a
+manifest with --dry-run takes milliseconds.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+
+from soundladder_cache import MB, RENDER_CACHE_BYTES
+from soundladder_constants import (
+    BIT_DEPTHS,
+    DEFAULT_DETECTOR,
+    DEFAULT_ENGINE,
+    DEFAULT_OUTPUT_FORMAT,
+    DEFAULT_QUALITY,
+    OUTPUT_FORMATS,
+    PITCH_DETECTORS,
+    QUALITY_PROFILES,
+    RENDER_ENGINES
+)
+
+logger = logging.getLogger(__name__)
+
+# Default size limit of the render cache, in MB
+RENDER_CACHE_MB = RENDER_CACHE_BYTES // MB
+
+# Manifest keys, their types and defaults (None means required)
+MANIFEST_FIELDS = {
+    'inputs': (list, None),
+    'output_dir': (str, None),
+    'start_pitch': (float, 60.0),
+    'pitch_increment': (float, 0.5),
+    'num_files': (int, 100),
+    'output_format': (str, DEFAULT_OUTPUT_FORMAT),
+    'bit_depth': (int, 0),
+    'detector': (str, DEFAULT_DETECTOR),
+    'quality': (str, DEFAULT_QUALITY),
+    'engine': (str, DEFAULT_ENGINE),
+    'target_duration': (float, 0.0),
+    'memory_budget_mb': (int, 0),
+    'workers': (int, 1)
+}
+
+def load_manifest(path):
+    """Read and validate a job manifest, raising ValueError if it is invalid."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"Cannot read manifest {path}: {str(e)}")
+
+    if not isinstance(manifest, dict):
+        raise ValueError("Manifest must be a JSON object")
+
+    unknown = set(manifest) - set(MANIFEST_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown manifest keys: {', '.join(sorted(unknown))}")
+
+    job = {}
+    for key, (kind, default) in MANIFEST_FIELDS.items():
+        if key not in manifest:
+            if default is None:
+                raise ValueError(f"Manifest is missing '{key}'")
+            job[key] = default
+            continue
+        value = manifest[key]
+        try:
+            job[key] = value if kind is list else kind(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for '{key}': {value!r}")
+
+    if not job['inputs'] or not all(isinstance(f, str) for f in job['inputs']):
+        raise ValueError("'inputs' must be a non-empty list of file paths")
+    if job['num_files'] < 1:
+        raise ValueError("Number of files must be at least 1")
+    if job['output_format'] not in OUTPUT_FORMATS:
+        raise ValueError(f"'output_format' must be one of: {', '.join(OUTPUT_FORMATS)}")
+    if job['bit_depth'] not in BIT_DEPTHS:
+        raise ValueError(f"'bit_depth' must be one of: {', '.join(map(str, BIT_DEPTHS))}")
+    if job['detector'] not in PITCH_DETECTORS:
+        raise ValueError(f"'detector' must be one of: {', '.join(PITCH_DETECTORS)}")
+    if job['quality'] not in QUALITY_PROFILES:
+        raise ValueError(f"'quality' must be one of: {', '.join(QUALITY_PROFILES)}")
+    if job['engine'] not in RENDER_ENGINES:
+        raise ValueError(f"'engine' must be one of: {', '.join(RENDER_ENGINES)}")
+    if job['target_duration'] < 0:
+        raise ValueError("'target_duration' cannot be negative")
+    if job['memory_budget_mb'] < 0:
+        raise ValueError("'memory_budget_mb' cannot be negative")
+    if job['workers'] < 1:
+        raise ValueError("'workers' must be at least 1")
+
+    # Resolve paths against the manifest's directory
+    base_dir = os.path.dirname(os.path.abspath(path))
+    job['inputs'] = [os.path.join(base_dir, f) for f in job['inputs']]
+    job['output_dir'] = os.path.join(base_dir, job['output_dir'])
+
+    return job
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate pitch-shifted sound ladders from a job manifest."
+    )
+    parser.add_argument("manifest", help="path of the JSON job manifest")
+    parser.add_argument("--workers", type=int, help="worker processes, overrides the manifest")
+    parser.add_argument("--output-dir", help="output directory, overrides the manifest")
+    parser.add_argument("--quality", choices=QUALITY_PROFILES, help="quality profile, overrides the manifest")
+    parser.add_argument("--engine", choices=RENDER_ENGINES, help="rendering engine, overrides the manifest")
+    parser.add_argument("--memory-budget", type=int, metavar="MB", help="stream inputs within this many MB per worker, overrides the manifest")
+    parser.add_argument("--pitch-store", help="SQLite file of detected pitches (default: in the user cache directory)")
+    parser.add_argument("--no-pitch-store", action="store_true", help="detect every pitch again and store nothing")
+    parser.add_argument("--clear-pitch-store", action="store_true", help="forget all stored pitches before running")
+    parser.add_argument("--render-cache", metavar="DIR", help="directory of the render cache (default: in the user cache directory)")
+    parser.add_argument("--render-cache-mb", type=int, default=RENDER_CACHE_MB, metavar="MB", help="size limit of the render cache")
+    parser.add_argument("--no-render-cache", action="store_true", help="render every rung and cache nothing")
+    parser.add_argument("--clear-render-cache", action="store_true", help="forget all cached renders before running")
+    parser.add_argument("--trace", metavar="FILE", help="record stage timings to this Chrome/Perfetto trace file and log a summary")
+    parser.add_argument("--dry-run", action="store_true", help="validate the manifest and list the jobs only")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log debug details")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    try:
+        job = load_manifest(args.manifest)
+    except ValueError as e:
+        logger.error(str(e))
+        return 2
+
+    if args.workers is not None:
+        job['workers'] = max(1, args.workers)
+    if args.output_dir:
+        job['output_dir'] = os.path.abspath(args.output_dir)
+    if args.quality:
+        job['quality'] = args.quality
+    if args.engine:
+        job['engine'] = args.engine
+    if args.memory_budget is not None:
+        job['memory_budget_mb'] = max(0, args.memory_budget)
+
+    missing = [f for f in job['inputs'] if not os.path.isfile(f)]
+    if missing:
+        logger.error(f"Input files not found: {', '.join(missing)}")
+        return 2
+
+    if args.dry_run:
+        for input_file in job['inputs']:
+            print(f"{input_file} -> {job['num_files']} x {job['output_format']} in {job['output_dir']}")
+        return 0
+
+    # Only import the audio libraries once there is work to do
+    from soundladder_engine import generate_batch, use_pitch_store, use_render_cache
+    import soundladder_trace
+
+    if args.trace:
+        soundladder_trace.enable()
+
+    if not args.no_pitch_store:
+        store = use_pitch_store(args.pitch_store)
+        if args.clear_pitch_store:
+            store.invalidate()
+
+    cache = None
+    if not args.no_render_cache:
+        cache = use_render_cache(args.render_cache, max(0, args.render_cache_mb) * MB)
+        if args.clear_render_cache:
+            cache.invalidate()
+
+    # Everything else in the job is a ladder setting
+    settings = {
+        key: value for key, value in job.items()
+        if key not in ('inputs', 'output_dir', 'workers')
+    }
+
+    def on_status(index, status, progress=None):
+        if status != 'CONVERTING':
+            logger.info(f"{os.path.basename(job['inputs'][index])}: {status.lower()}")
+
+    errors = generate_batch(
+        job['inputs'],
+        job['output_dir'],
+        settings,
+        workers=job['workers'],
+        on_status=on_status
+    )
+    for index, e in errors:
+        logger.error(f"Failed: {job['inputs'][index]}: {str(e)}")
+    if cache is not None:
+        logger.info(cache.format_stats())
+
+    if args.trace:
+        soundladder_trace.tracer.write_chrome_trace(args.trace)
+        logger.info(f"Stage timings (trace written to {args.trace}):\n{soundladder_trace.tracer.format_summary()}")
+
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
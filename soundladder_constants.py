@@ -0,0 +1,36 @@
+"""Choices shared by the engine, the GUI and the command-line interface.
+
+Kept apart from soundladder_engine so that the command-line interface can
+validate a manifest and build its argument parser without importing librosa.
+
+This module only needs the standard library.
+"""
+
+OUTPUT_FORMATS = ("wav", "mp3", "packed")
+DEFAULT_OUTPUT_FORMAT = "wav"
+
+# Output bit depths; 0 keeps the bit depth of each input
+BIT_DEPTHS = (0, 8, 16, 24, 32)
+
+# Pitch detectors selectable for detect_pitch
+PITCH_DETECTORS = ("piptrack", "yin", "pyin")
+DEFAULT_DETECTOR = "piptrack"
+
+# Named quality profiles: the resampler and STFT size used for every rung.
+# "mastering" matches the defaults of librosa.effects.pitch_shift with
+# kaiser_best resampling, which is what every ladder used to be rendered with.
+# "bank" resamples through the shared FilterBank.
+QUALITY_PROFILES = {
+    'draft': {'res_type': 'soxr_lq', 'n_fft': 1024},
+    'standard': {'res_type': 'bank', 'n_fft': 2048},
+    'mastering': {'res_type': 'kaiser_best', 'n_fft': 2048}
+}
+DEFAULT_QUALITY = 'mastering'
+
+# Rendering engines. "vocoder" keeps the duration of the input (the phase
+# vocoder of LadderAnalysis, then resampling); "varispeed" only resamples, as
+# changing the speed of a tape would, so every rung up is shorter and every
+# rung down longer, unless a target duration trims or pads them; "psola"
+# keeps the duration with pitch-synchronous overlap-add, for single voices.
+RENDER_ENGINES = ("vocoder", "varispeed", "psola")
+DEFAULT_ENGINE = "vocoder"
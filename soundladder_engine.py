@@ -0,0 +1,1592 @@
+"""Audio pipeline of the Sound Ladder Generator.
+
+Decoding, pitch detection, pitch shifting and export live here, away from the
+Tkinter GUI, so that worker processes, the command-line interface and other
+Python code can use them without a display.
+"""
+import os
+import copy
+import json
+import time
+import bisect
+import hashlib
+import logging
+import sqlite3
+import threading
+from contextlib import closing
+from collections import OrderedDict, deque
+from fractions import Fraction
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+
+# Add FFmpeg to PATH before pydub looks for it
+ffmpeg_path = r"C:\Program Files\ffmpeg\ffmpeg-2024-12-26-git-fe04b93afa-full_build\bin"
+if ffmpeg_path not in os.environ["PATH"].split(os.pathsep):
+    os.environ["PATH"] += os.pathsep + ffmpeg_path
+
+import librosa
+import numpy as np
+import scipy.signal
+from pydub import AudioSegment
+
+from soundladder_cache import RENDER_CACHE_BYTES, RenderCache
+from soundladder_constants import (
+    DEFAULT_DETECTOR,
+    DEFAULT_ENGINE,
+    DEFAULT_QUALITY,
+    PITCH_DETECTORS,
+    QUALITY_PROFILES
+)
+from soundladder_pcm import PcmFile, open_pcm_file
+from soundladder_export import PCM_FULL_SCALE, PackedLadder, PcmEncoder, open_rung_writer
+from soundladder_trace import span, traced_call, tracer
+
+logger = logging.getLogger(__name__)
+
+def default_cache_dir():
+    """Directory for the persistent caches, overridable with SOUNDLADDER_CACHE_DIR."""
+    if os.environ.get('SOUNDLADDER_CACHE_DIR'):
+        return os.environ['SOUNDLADDER_CACHE_DIR']
+    base = (
+        os.environ.get('LOCALAPPDATA')
+        or os.environ.get('XDG_CACHE_HOME')
+        or os.path.join(os.path.expanduser('~'), '.cache')
+    )
+    return os.path.join(base, 'soundladder')
+
+# Filter bank resampling: shifts are rounded to BANK_RESOLUTION_CENTS so the
+# same ratios recur across rungs and inputs, and each ratio is approximated by
+# a fraction within BANK_RATIO_TOLERANCE_CENTS
+BANK_RESOLUTION_CENTS = 1.0
+BANK_RATIO_TOLERANCE_CENTS = 0.05
+BANK_ZERO_CROSSINGS = 16
+BANK_KAISER_BETA = 8.6
+BANK_CACHE_BYTES = 64 * 1024 * 1024
+BANK_DISK_BYTES = 256 * 1024 * 1024
+
+class FilterBank:
+    """Polyphase resampling kernels, designed once per ratio and reused.
+
+    A ladder with a fixed increment needs the same few pitch ratios for every
+    rung of every input, yet soxr and scipy design a new anti-aliasing filter
+    on every call. Here each ratio becomes a fraction up/down and its FIR
+    kernel is designed once, kept in memory (least recently used kernels
+    beyond ``max_bytes`` are dropped) and, given a ``directory``, saved as
+    .npy for later runs. A kernel only depends on up/down, so inputs at any
+    sample rate share it. Loading a saved kernel touches its file, and once
+    the directory holds more than ``disk_bytes`` of kernels the least
+    recently used files are removed.
+    """
+    def __init__(self, directory=None, max_bytes=BANK_CACHE_BYTES, disk_bytes=BANK_DISK_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.disk_bytes = disk_bytes
+        self.size = 0
+        self._kernels = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def ratio(semitones):
+        """Return (up, down) for a shift, rounded to BANK_RESOLUTION_CENTS."""
+        cents = round(semitones * 100 / BANK_RESOLUTION_CENTS) * BANK_RESOLUTION_CENTS
+        rate = 2.0 ** (-cents / 1200)
+
+        # Smallest denominator that keeps the ratio within tolerance
+        limit = 64
+        while True:
+            fraction = Fraction(rate).limit_denominator(limit)
+            error = abs(1200 * np.log2(float(fraction) / rate))
+            if error <= BANK_RATIO_TOLERANCE_CENTS or limit >= 1 << 16:
+                return fraction.numerator, fraction.denominator
+            limit *= 2
+
+    def _path(self, up, down):
+        name = f"{up}_{down}_z{BANK_ZERO_CROSSINGS}_b{BANK_KAISER_BETA}.npy"
+        return os.path.join(self.directory, name)
+
+    def kernel(self, up, down):
+        """Return the anti-aliasing FIR kernel for resampling by up/down."""
+        key = (up, down)
+        with self._lock:
+            if key in self._kernels:
+                self._kernels.move_to_end(key)
+                return self._kernels[key]
+
+        kernel = None
+        if self.directory:
+            try:
+                kernel = np.load(self._path(up, down))
+                # The modification time records the last use, for _evict_files
+                os.utime(self._path(up, down))
+            except (OSError, ValueError):
+                kernel = None
+
+        if kernel is None:
+            max_rate = max(up, down)
+            kernel = scipy.signal.firwin(
+                2 * BANK_ZERO_CROSSINGS * max_rate + 1,
+                1.0 / max_rate,
+                window=('kaiser', BANK_KAISER_BETA)
+            )
+            if self.directory:
+                try:
+                    os.makedirs(self.directory, exist_ok=True)
+                    # Write under a temporary name so readers never see half a file
+                    temp_path = f"{self._path(up, down)}.{os.getpid()}.tmp"
+                    with open(temp_path, 'wb') as f:
+                        np.save(f, kernel)
+                    os.replace(temp_path, self._path(up, down))
+                    self._evict_files(keep=self._path(up, down))
+                except OSError as e:
+                    logger.warning(f"Cannot save filter bank kernel: {str(e)}")
+
+        with self._lock:
+            if key not in self._kernels:
+                self._kernels[key] = kernel
+                self.size += kernel.nbytes
+            # Drop the least recently used kernels, but never the new one
+            while self.size > self.max_bytes and len(self._kernels) > 1:
+                _, evicted = self._kernels.popitem(last=False)
+                self.size -= evicted.nbytes
+        return kernel
+
+    def _evict_files(self, keep):
+        """Remove the least recently used kernel files beyond disk_bytes, never ``keep``."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npy') and entry.path != keep:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files) + os.path.getsize(keep)
+        for _, size, path in sorted(files):
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def resample(self, y, up, down):
+        """Resample ``y`` along its last axis by up/down."""
+        if up == down:
+            # No kernel exists for a ratio of 1 (a shift that rounds to 0 cents)
+            return y.copy()
+        return scipy.signal.resample_poly(y, up, down, axis=-1, window=self.kernel(up, down))
+
+# Kernels shared by every ladder rendered in this process
+filter_bank = FilterBank(os.path.join(default_cache_dir(), 'filterbank'))
+
+# Largest absolute sample difference (full scale = 1.0) between a rung rendered
+# from a LadderAnalysis and librosa.effects.pitch_shift with the same STFT size
+# and resampler, at any input length; checked by tests/test_engine.py
+LADDER_TOLERANCE = 1e-5
+
+class LadderAnalysis:
+    """STFT analysis of one input, computed once and shared by every rung.
+
+    librosa.effects.pitch_shift recomputes the forward STFT of the input for
+    every rung even though the input never changes. Here the magnitudes and the
+    per-frame phase increments are computed once, and each rung only runs the
+    phase-vocoder interpolation, the inverse STFT and the resample. The phase
+    is accumulated frame by frame in float32 exactly as librosa.phase_vocoder
+    does, so rungs match librosa.effects.pitch_shift to within
+    LADDER_TOLERANCE at any input length. Sharing the analysis saves one
+    forward STFT per rung, and wrapping the phase before the trigonometry
+    keeps sin and cos on their fast path: ten "draft" rungs render about
+    1.8 to 2.1x faster than librosa.effects.pitch_shift for inputs of 1 to
+    10 s, and 1.6x for 30 s, where the frame-by-frame phase loop weighs more.
+
+    All channels are processed together as one (channels, n) array: a single
+    batched STFT, phase-vocoder pass, inverse STFT and resample cover every
+    channel, instead of one librosa.effects.pitch_shift call per channel.
+
+    ``quality`` names one of QUALITY_PROFILES.
+    """
+    def __init__(self, samples, sample_rate, quality=DEFAULT_QUALITY):
+        if quality not in QUALITY_PROFILES:
+            raise ValueError(f"Unknown quality profile: {quality}")
+
+        # samples is a float32 array shaped (channels, n)
+        self.sample_rate = sample_rate
+        self.length = samples.shape[-1]
+        self.dtype = samples.dtype
+        self.quality = quality
+        self.res_type = QUALITY_PROFILES[quality]['res_type']
+        self.n_fft = QUALITY_PROFILES[quality]['n_fft']
+        self.hop_length = self.n_fft // 4
+
+        with span('analysis', channels=samples.shape[0], frames=self.length, quality=quality):
+            stft = librosa.stft(samples, n_fft=self.n_fft, hop_length=self.hop_length)
+            self.n_frames = stft.shape[-1]
+
+            # Two empty trailing frames, as librosa.phase_vocoder pads them
+            stft = np.pad(stft, [(0, 0)] * (stft.ndim - 1) + [(0, 2)], mode='constant')
+            self.magnitude = np.abs(stft)
+            phase = np.angle(stft)
+            self.initial_phase = phase[..., 0].copy()
+
+            # Expected phase advance per bin, plus the wrapped deviation from it
+            phi_advance = (self.hop_length * librosa.fft_frequencies(sr=2 * np.pi, n_fft=self.n_fft))[:, np.newaxis]
+            dphase = np.diff(phase, axis=-1) - phi_advance
+            dphase -= 2.0 * np.pi * np.round(dphase / (2.0 * np.pi))
+            # Frame-major, (frames, channels, bins): stretch reads one frame at a time
+            self.phase_increment = np.ascontiguousarray(np.moveaxis(phi_advance + dphase, -1, 0))
+
+    @classmethod
+    def from_sound(cls, sound, quality=DEFAULT_QUALITY):
+        """Analyze a pydub AudioSegment."""
+        return cls(sound_to_samples(sound), sound.frame_rate, quality)
+
+    def head(self, length):
+        """Return the analysis of the first ``length`` samples, sharing this one's arrays.
+
+        The frames past the end hold the input that follows instead of the
+        silence a fresh analysis would see, which only affects the last hop.
+        """
+        if length >= self.length:
+            return self
+        head = copy.copy(self)
+        head.length = length
+        head.n_frames = 1 + length // self.hop_length
+        head.magnitude = self.magnitude[..., :head.n_frames + 2]
+        head.phase_increment = self.phase_increment[:head.n_frames + 1]
+        return head
+
+    def stretch(self, rate):
+        """Time-stretch the analyzed input by ``rate`` (librosa.effects.time_stretch)."""
+        with span('stretch', rate=rate):
+            time_steps = np.arange(0, self.n_frames, rate, dtype=np.float64)
+            frames = time_steps.astype(np.intp)
+            alpha = (time_steps - frames).astype(np.float32)
+
+            # Linear magnitude interpolation between neighbouring analysis frames
+            magnitude = (1.0 - alpha) * self.magnitude[..., frames] + alpha * self.magnitude[..., frames + 1]
+
+            # Accumulated phase: initial phase plus the increments of every frame
+            # passed, rounded to float32 after each frame as librosa does. A
+            # float64 cumsum is faster but drifts from librosa by up to 0.02
+            # full scale on a 10 s input, so the frames are added in order
+            accumulated = np.empty((len(frames),) + self.initial_phase.shape, dtype=np.float32)
+            accumulator = self.initial_phase.copy()
+            for t, frame in enumerate(frames):
+                accumulated[t] = accumulator
+                accumulator += self.phase_increment[frame]
+
+            # Wrap the phase in float64 before the trigonometry: float32 sin and
+            # cos take a slow path for the large unwrapped phases of long inputs
+            phase = np.moveaxis(accumulated, 0, -1).astype(np.float64, order='C')
+            del accumulated
+            phase -= (2.0 * np.pi) * np.round(phase * (0.5 / np.pi))
+            phase = phase.astype(np.float32)
+
+            stretched = np.empty(magnitude.shape, dtype=np.complex64)
+            stretched.real = magnitude * np.cos(phase)
+            stretched.imag = magnitude * np.sin(phase)
+
+            return librosa.istft(
+                stretched,
+                hop_length=self.hop_length,
+                n_fft=self.n_fft,
+                length=int(round(self.length / rate)),
+                dtype=self.dtype
+            )
+
+    def render(self, semitones):
+        """Render one rung shifted by ``semitones``, shaped (channels, n)."""
+        if self.res_type == 'bank':
+            # Stretch by exactly the ratio the bank resamples with
+            up, down = filter_bank.ratio(semitones)
+            stretched = self.stretch(up / down)
+            with span('resample', up=up, down=down):
+                shifted = filter_bank.resample(stretched, up, down)
+            return librosa.util.fix_length(shifted, size=self.length)
+
+        rate = 2.0 ** (-float(semitones) / 12)
+        stretched = self.stretch(rate)
+        with span('resample', res_type=self.res_type):
+            shifted = librosa.resample(
+                stretched,
+                orig_sr=float(self.sample_rate) / rate,
+                target_sr=self.sample_rate,
+                res_type=self.res_type
+            )
+        return librosa.util.fix_length(shifted, size=self.length)
+
+class VarispeedRenderer:
+    """Renders rungs by resampling alone, with the interface of LadderAnalysis.
+
+    There is no analysis to share, so each rung costs a single resample: an
+    order of magnitude less than the phase vocoder, and transients keep their
+    shape. ``target_duration`` (seconds, 0 for none) trims or pads every rung.
+    """
+    def __init__(self, samples, sample_rate, quality=DEFAULT_QUALITY, target_duration=0.0):
+        if quality not in QUALITY_PROFILES:
+            raise ValueError(f"Unknown quality profile: {quality}")
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.length = samples.shape[-1]
+        self.quality = quality
+        self.res_type = QUALITY_PROFILES[quality]['res_type']
+        self.target_duration = target_duration
+
+    def head(self, length):
+        """Return the renderer of the first ``length`` samples."""
+        if length >= self.length:
+            return self
+        return VarispeedRenderer(self.samples[..., :length], self.sample_rate, self.quality, self.target_duration)
+
+    def render(self, semitones):
+        """Render one rung shifted by ``semitones``, shaped (channels, n)."""
+        with span('resample', engine='varispeed', semitones=semitones):
+            if self.res_type == 'bank':
+                up, down = filter_bank.ratio(semitones)
+                shifted = filter_bank.resample(self.samples, up, down)
+            else:
+                rate = 2.0 ** (-float(semitones) / 12)
+                shifted = librosa.resample(
+                    self.samples,
+                    orig_sr=float(self.sample_rate) / rate,
+                    target_sr=self.sample_rate,
+                    res_type=self.res_type
+                )
+        length = rung_length(self.length, self.sample_rate, semitones, 'varispeed', self.target_duration)
+        return librosa.util.fix_length(shifted, size=length)
+
+# Inputs with less than PSOLA_MIN_VOICED of their frames voiced (leaving out
+# frames PSOLA_SILENCE_DB below the loudest) are polyphonic, noisy or
+# unvoiced, and fall back to the phase vocoder
+PSOLA_MIN_VOICED = 0.6
+PSOLA_SILENCE_DB = 40.0
+
+# The pitch track is searched within this many octaves of the detected pitch
+PSOLA_SEARCH_OCTAVES = 1.0
+PSOLA_HOP = 512
+
+# Spacing of the grains that copy unvoiced parts through unchanged
+PSOLA_UNVOICED_PERIOD = 0.01
+
+def pitch_track(y, sample_rate, frequency=None):
+    """pYIN pitch track of mono samples ``y``, searched around ``frequency`` (Hz) if given.
+
+    Returns the position of every frame in samples of ``sample_rate``, the
+    f0 of every frame (NaN where unvoiced) and the voiced fraction of the
+    frames that are not silent.
+    """
+    fmin, fmax = DETECT_FMIN, DETECT_FMAX
+    if frequency and np.isfinite(frequency):
+        # A narrow search is also several times faster than the full range
+        low = max(DETECT_FMIN, frequency * 2.0 ** -PSOLA_SEARCH_OCTAVES)
+        high = min(DETECT_FMAX, frequency * 2.0 ** PSOLA_SEARCH_OCTAVES)
+        if low < high:
+            fmin, fmax = low, high
+
+    with span('track', fmin=round(fmin, 1), fmax=round(fmax, 1)):
+        y = librosa.resample(y, orig_sr=sample_rate, target_sr=DETECT_SAMPLE_RATE)
+        f0, voiced, _ = librosa.pyin(y, fmin=fmin, fmax=fmax, sr=DETECT_SAMPLE_RATE, hop_length=PSOLA_HOP)
+        rms = librosa.feature.rms(y=y, hop_length=PSOLA_HOP)[0]
+
+    n = min(len(f0), len(rms))
+    audible = rms[:n] > rms.max() * 10.0 ** (-PSOLA_SILENCE_DB / 20)
+    voiced_fraction = float(voiced[:n][audible].mean()) if audible.any() else 0.0
+    positions = np.arange(len(f0)) * (PSOLA_HOP * sample_rate / DETECT_SAMPLE_RATE)
+    return positions, np.where(voiced, f0, np.nan), voiced_fraction
+
+def pitch_marks(y, sample_rate, positions, f0):
+    """Analysis marks of mono samples ``y``: (marks, periods, voiced) lists.
+
+    Through voiced frames the marks are one period of ``f0`` apart, each
+    moved to the highest sample within a quarter period of where the pitch
+    predicts it, so every mark sits on the same point of its cycle. Elsewhere
+    they are PSOLA_UNVOICED_PERIOD apart.
+    """
+    n = len(y)
+    frame_voiced = np.isfinite(f0)
+    voiced_positions = positions[frame_voiced]
+    voiced_f0 = f0[frame_voiced]
+    frame_hop = positions[1] if len(positions) > 1 else n
+    unvoiced_period = max(1, int(PSOLA_UNVOICED_PERIOD * sample_rate))
+
+    marks, periods, voiced = [], [], []
+    mark = 0
+    while mark < n:
+        frame = min(int(round(mark / frame_hop)), len(f0) - 1)
+        if not frame_voiced[frame]:
+            marks.append(mark)
+            periods.append(unvoiced_period)
+            voiced.append(False)
+            mark += unvoiced_period
+            continue
+
+        period = max(2, int(round(sample_rate / np.interp(mark, voiced_positions, voiced_f0))))
+        # The first mark of a voiced run goes on the peak of its first cycle
+        if voiced and voiced[-1]:
+            low, high = mark - period // 4, mark + period // 4 + 1
+        else:
+            low, high = mark, mark + period
+        low = max(low, marks[-1] + 1 if marks else 0)
+        high = min(high, n)
+        if high <= low:
+            break
+        mark = low + int(np.argmax(y[low:high]))
+        if voiced and voiced[-1]:
+            # The previous grain spans exactly the cycle to this mark
+            periods[-1] = mark - marks[-1]
+        marks.append(mark)
+        periods.append(period)
+        voiced.append(True)
+        mark += period
+    return marks, periods, voiced
+
+class PsolaRenderer:
+    """Renders rungs with TD-PSOLA, with the interface of LadderAnalysis.
+
+    The input is cut into two-period grains around the pitch marks of its
+    pitch track, and each rung overlap-adds them again at marks spaced
+    period / 2 ** (semitones / 12) apart. The duration and the formants are
+    kept without an STFT or a resample, so voices stay crisp where the phase
+    vocoder smears them, and a rung costs one pass over the grains.
+
+    ``track`` is the (positions, f0) of pitch_track.
+    """
+    def __init__(self, samples, sample_rate, track, quality=DEFAULT_QUALITY):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.length = samples.shape[-1]
+        self.quality = quality
+        with span('analysis', engine='psola', frames=self.length):
+            self._set_marks(*pitch_marks(samples.mean(axis=0), sample_rate, *track))
+        self._windows = {}
+
+    def _set_marks(self, marks, periods, voiced):
+        self.marks = marks
+        self.periods = periods
+        self.voiced = voiced
+        # The nearest mark of a position is found by bisecting the midpoints
+        self._midpoints = [(a + b) / 2 for a, b in zip(marks, marks[1:])]
+
+    def head(self, length):
+        """Return the renderer of the first ``length`` samples, sharing this one's marks."""
+        if length >= self.length:
+            return self
+        head = copy.copy(self)
+        head.samples = self.samples[..., :length]
+        head.length = length
+        count = bisect.bisect_left(self.marks, length)
+        head._set_marks(self.marks[:count], self.periods[:count], self.voiced[:count])
+        return head
+
+    def _window(self, period):
+        window = self._windows.get(period)
+        if window is None:
+            # Periodic Hann windows two periods long add up to one at period spacing
+            window = scipy.signal.get_window('hann', 2 * period).astype(self.samples.dtype)
+            self._windows[period] = window
+        return window
+
+    def render(self, semitones):
+        """Render one rung shifted by ``semitones``, shaped (channels, n)."""
+        scale = 2.0 ** (-float(semitones) / 12)
+        n = self.length
+        shifted = np.zeros_like(self.samples)
+        if not self.marks:
+            return shifted
+
+        with span('psola', semitones=semitones, grains=len(self.marks)):
+            position = float(self.marks[0])
+            while position < n:
+                k = bisect.bisect_left(self._midpoints, position)
+                mark, period = self.marks[k], self.periods[k]
+                window = self._window(period)
+
+                # The grain, clipped to both the input and the rung
+                at = int(round(position))
+                low = max(-period, -mark, -at)
+                high = min(period, n - mark, n - at)
+                # Grains simply add up, as in TD-PSOLA: a pulse per cycle
+                # keeps its level however closely the grains are packed
+                grain = self.samples[:, mark + low:mark + high] * window[period + low:period + high]
+                shifted[:, at + low:at + high] += grain
+
+                position += period * scale if self.voiced[k] else period
+        return shifted
+
+class ActiveSpanRenderer:
+    """Renders only the active span of an input and puts the silence around it back.
+
+    ``renderer`` renders samples [start, stop) of a ``length``-frame input.
+    Each rung is laid into digital silence at the length rung_length gives
+    the whole input, so only the audible part costs any DSP. Varispeed rungs
+    keep their leading silence scaled by the resampling ratio, as a tape
+    would play it.
+    """
+    def __init__(self, renderer, start, stop, length, engine=DEFAULT_ENGINE, target_duration=0.0):
+        self.renderer = renderer
+        self.start = start
+        self.stop = stop
+        self.length = length
+        self.engine = engine
+        self.target_duration = target_duration
+        self.sample_rate = renderer.sample_rate
+        self.quality = renderer.quality
+
+    def head(self, length):
+        """Return the renderer of the first ``length`` samples."""
+        if length >= self.length:
+            return self
+        head = copy.copy(self)
+        head.length = length
+        head.stop = max(self.start + 1, min(self.stop, length))
+        head.renderer = self.renderer.head(head.stop - self.start)
+        return head
+
+    def render(self, semitones):
+        """Render one rung shifted by ``semitones``, shaped (channels, n)."""
+        active = self.renderer.render(semitones)
+        n = rung_length(self.length, self.sample_rate, semitones, self.engine, self.target_duration)
+        offset = self.start
+        if self.engine == 'varispeed':
+            up, down = filter_bank.ratio(semitones)
+            offset = (self.start * up + down // 2) // down
+
+        shifted = np.zeros(active.shape[:-1] + (n,), dtype=active.dtype)
+        if offset < n:
+            active = active[..., :n - offset]
+            shifted[..., offset:offset + active.shape[-1]] = active
+        return shifted
+
+def rung_length(length, sample_rate, semitones, engine=DEFAULT_ENGINE, target_duration=0.0):
+    """Frames of the rung shifted by ``semitones`` of a ``length``-frame input.
+
+    Varispeed lengths follow the FilterBank's ratio whatever the resampler, so
+    the in-memory and streaming paths agree to the frame.
+    """
+    if engine != 'varispeed':
+        return length
+    if target_duration:
+        return int(round(target_duration * sample_rate))
+    up, down = filter_bank.ratio(semitones)
+    return -(-length * up // down)
+
+def ladder_renderer(samples, sample_rate, settings, frequency=None):
+    """Return the renderer of the ladder's engine: a LadderAnalysis, a
+    VarispeedRenderer or a PsolaRenderer.
+
+    ``frequency`` is the detected pitch of the input, which narrows the
+    pitch track of the "psola" engine. Inputs too little voiced for PSOLA
+    get a LadderAnalysis. Inputs with leading or trailing silence get an
+    ActiveSpanRenderer around the renderer of their active span.
+    """
+    engine = settings.get('engine', DEFAULT_ENGINE)
+    target_duration = settings.get('target_duration', 0.0)
+    length = samples.shape[-1]
+    start, stop = active_span(samples, sample_rate)
+    if stop - start < length:
+        logger.debug(f"Active span: {start / sample_rate:.2f}-{stop / sample_rate:.2f} s of {length / sample_rate:.2f} s")
+        # The span renders at its natural length; the wrapper trims or pads the rung
+        renderer = engine_renderer(samples[..., start:stop], sample_rate, dict(settings, target_duration=0.0), frequency)
+        return ActiveSpanRenderer(renderer, start, stop, length, engine, target_duration)
+    return engine_renderer(samples, sample_rate, settings, frequency)
+
+def engine_renderer(samples, sample_rate, settings, frequency=None):
+    """The renderer of the ladder's engine for all of ``samples``; see ladder_renderer."""
+    quality = settings.get('quality', DEFAULT_QUALITY)
+    engine = settings.get('engine', DEFAULT_ENGINE)
+    if engine == 'varispeed':
+        return VarispeedRenderer(samples, sample_rate, quality, settings.get('target_duration', 0.0))
+    if engine == 'psola':
+        if quality not in QUALITY_PROFILES:
+            raise ValueError(f"Unknown quality profile: {quality}")
+        positions, f0, voiced_fraction = pitch_track(samples.mean(axis=0), sample_rate, frequency)
+        if voiced_fraction >= PSOLA_MIN_VOICED:
+            return PsolaRenderer(samples, sample_rate, (positions, f0), quality)
+        logger.info(f"Only {voiced_fraction:.0%} of the input is voiced, rendering with the phase vocoder instead of PSOLA")
+    elif engine != 'vocoder':
+        raise ValueError(f"Unknown rendering engine: {engine}")
+    return LadderAnalysis(samples, sample_rate, quality)
+
+def pcm_view(raw_data, sample_width, channels):
+    """View interleaved little-endian PCM as integers shaped (n, channels).
+
+    Widths 1, 2 and 4 are a view of ``raw_data`` with no copy; packed 24-bit
+    samples are unpacked into int32 (scaled like 32-bit) and so are copied.
+    """
+    if sample_width == 3:
+        packed = np.frombuffer(raw_data, dtype=np.uint8).reshape(-1, 3)
+        unpacked = np.zeros((len(packed), 4), dtype=np.uint8)
+        unpacked[:, 1:] = packed
+        return unpacked.view('<i4').reshape(-1, channels)
+    dtype = {1: np.int8, 2: '<i2', 4: '<i4'}[sample_width]
+    return np.frombuffer(raw_data, dtype=dtype).reshape(-1, channels)
+
+def sound_to_samples(sound, out=None):
+    """Convert a pydub AudioSegment or a PcmFile to a float32 array shaped (channels, n).
+
+    The samples are read straight from ``sound.raw_data`` (or the file's
+    mapping) and scaled by its sample width in a single pass, into ``out``
+    if given.
+    """
+    if isinstance(sound, PcmFile):
+        return sound.to_samples(out)
+    pcm = pcm_view(sound.raw_data, sound.sample_width, sound.channels)
+    if sound.sample_width == 4 and source_sample_width(sound) == 3:
+        # Drop the sign padding pydub puts in the low byte of widened 24-bit audio
+        pcm = pcm & np.int32(-256)
+    if out is None:
+        out = np.empty((sound.channels, len(pcm)), dtype=np.float32)
+
+    # De-interleave any number of channels (mono, stereo, 5.1, ambisonics...)
+    scale = np.float32(1.0 / PCM_FULL_SCALE[sound.sample_width])
+    np.multiply(pcm.T, scale, out=out, casting='unsafe')
+    return out
+
+def source_sample_width(sound):
+    """Sample width of the audio ``sound`` was decoded from.
+
+    pydub widens 24-bit audio to 32-bit samples whose low byte only repeats
+    the sign (ffmpeg leaves it zero), and such samples lose nothing when
+    written as 24-bit again.
+    """
+    if isinstance(sound, PcmFile) or sound.sample_width != 4:
+        return sound.sample_width
+    raw = np.frombuffer(sound.raw_data, dtype=np.uint8).reshape(-1, 4)
+    sign = np.where(raw[:, 3] & 0x80, 0xFF, 0)
+    return 3 if np.all((raw[:, 0] == 0) | (raw[:, 0] == sign)) else 4
+
+def output_sample_width(settings, source_width):
+    """Sample width of the rungs: the 'bit_depth' setting, or the input's if it is 0."""
+    bit_depth = settings.get('bit_depth', 0)
+    return bit_depth // 8 if bit_depth else source_width
+
+def samples_to_sound(shifted, frame_rate, sample_width=2, encoder=None):
+    """Convert a (channels, n) float array to an AudioSegment of ``sample_width`` bytes.
+
+    Pass a PcmEncoder to reuse its buffers; the segment then shares them and
+    is only valid until the encoder's next call. pydub stores 24-bit audio as
+    32-bit, so ask for width 4 instead of 3.
+    """
+    if encoder is None:
+        encoder = PcmEncoder(sample_width)
+    return AudioSegment(
+        encoder.encode(shifted),
+        frame_rate=frame_rate,
+        sample_width=encoder.sample_width,
+        channels=shifted.shape[0]
+    )
+
+# Function to change the pitch of the sound
+def change_pitch(sound, semitones, analysis=None, quality=DEFAULT_QUALITY):
+    """Change pitch while preserving duration and bit depth exactly.
+
+    Pass the LadderAnalysis of ``sound`` to reuse its STFT between calls;
+    its own quality profile then applies.
+    """
+    try:
+        if analysis is None:
+            analysis = LadderAnalysis.from_sound(sound, quality)
+        new_sound = samples_to_sound(analysis.render(semitones), sound.frame_rate, sound.sample_width)
+
+        # Final length check
+        if len(new_sound) != len(sound):
+            logger.warning(f"Length mismatch: original={len(sound)}ms, new={len(new_sound)}ms")
+            new_sound = new_sound[:len(sound)]
+
+        return new_sound
+
+    except Exception as e:
+        logger.error(f"Error in pitch shifting: {str(e)}", exc_info=True)
+        raise
+
+# Pitch search range of YIN and pYIN, roughly C2 to C7
+DETECT_FMIN = 65.0
+DETECT_FMAX = 2093.0
+
+# Seconds of audio analyzed by detect_pitch, taken from the loudest part
+DETECT_WINDOW = 3.0
+
+# Sample rate pitch detection runs at, as librosa.load would decode it
+DETECT_SAMPLE_RATE = 22050
+
+def loudest_segment(y, sr, duration=DETECT_WINDOW):
+    """Return the ``duration``-second window of ``y`` with the most energy."""
+    start, stop = loudest_window(y, sr, duration)
+    return y[start:stop]
+
+def loudest_window(y, sr, duration=DETECT_WINDOW):
+    """Return (start, stop) of the ``duration``-second window of ``y`` with the most energy."""
+    window = int(duration * sr)
+    if len(y) <= window:
+        return 0, len(y)
+
+    # Energy of 50 ms blocks, summed over every run of blocks one window long
+    block = max(1, int(0.05 * sr))
+    n_blocks = len(y) // block
+    blocks_per_window = max(1, window // block)
+    if n_blocks <= blocks_per_window:
+        return 0, len(y)
+    energy = np.square(y[:n_blocks * block].reshape(n_blocks, block)).sum(axis=1)
+
+    start = loudest_block(energy, blocks_per_window) * block
+    return start, start + window
+
+# Parts of an input more than SILENCE_TOP_DB below its peak (the default of
+# librosa.effects.trim) at its start and end are silence and are not
+# shifted; ACTIVE_PAD_SECONDS around the rest are, so the vocoder's windows
+# see every onset and release fade in and out as they would in the whole input
+SILENCE_TOP_DB = 60.0
+ACTIVE_PAD_SECONDS = 0.1
+ACTIVE_BLOCK_SECONDS = 0.01
+
+def active_span(samples, sample_rate, top_db=SILENCE_TOP_DB):
+    """Return (start, stop) of the non-silent part of ``samples`` (any channels, time last).
+
+    Leading and trailing silence is found in 10 ms blocks, from the peak of
+    every channel. Silent inputs are all active.
+    """
+    length = samples.shape[-1]
+    block = max(1, int(ACTIVE_BLOCK_SECONDS * sample_rate))
+    n_blocks = length // block
+    if n_blocks == 0:
+        return 0, length
+
+    peaks = np.abs(samples[..., :n_blocks * block]).reshape(-1, n_blocks, block).max(axis=(0, 2))
+    return active_span_of_peaks(peaks, length, sample_rate, top_db)
+
+def active_span_of_peaks(peaks, length, sample_rate, top_db=SILENCE_TOP_DB):
+    """active_span of a ``length``-frame input from the peaks of its whole blocks."""
+    if len(peaks) == 0:
+        return 0, length
+    block = max(1, int(ACTIVE_BLOCK_SECONDS * sample_rate))
+    n_blocks = len(peaks)
+    loud = np.flatnonzero(peaks > peaks.max() * 10.0 ** (-top_db / 20))
+    if len(loud) == 0:
+        return 0, length
+
+    pad = int(ACTIVE_PAD_SECONDS * sample_rate)
+    start = max(0, loud[0] * block - pad)
+    stop = (loud[-1] + 1) * block + pad
+    # The partial block at the end goes with the last full one
+    if stop >= n_blocks * block:
+        stop = length
+    return int(start), int(min(stop, length))
+
+def loudest_block(energy, blocks_per_window):
+    """Return the first block of the run of ``blocks_per_window`` blocks with the most energy."""
+    cumulative = np.concatenate(([0.0], np.cumsum(energy, dtype=np.float64)))
+    totals = cumulative[blocks_per_window:] - cumulative[:-blocks_per_window]
+    return int(np.argmax(totals))
+
+def estimate_pitch(y, sr, detector=DEFAULT_DETECTOR, window=DETECT_WINDOW):
+    """Estimate the fundamental frequency of mono samples ``y``.
+
+    Only the loudest ``window`` seconds are analyzed; pass None to analyze
+    everything. ``detector`` is one of PITCH_DETECTORS.
+    """
+    if window is not None:
+        y = loudest_segment(y, sr, window)
+
+    if detector == "piptrack":
+        pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
+        # Get the highest magnitude pitch for each time
+        frame_pitches = pitches[magnitudes.argmax(axis=0), np.arange(pitches.shape[1])]
+    elif detector == "yin":
+        frame_pitches = librosa.yin(y, fmin=DETECT_FMIN, fmax=DETECT_FMAX, sr=sr)
+    elif detector == "pyin":
+        frame_pitches, voiced_flag, _ = librosa.pyin(y, fmin=DETECT_FMIN, fmax=DETECT_FMAX, sr=sr)
+        frame_pitches = frame_pitches[voiced_flag]
+    else:
+        raise ValueError(f"Unknown pitch detector: {detector}")
+
+    # Get the most common pitch (excluding zeros and unvoiced frames), as a
+    # Python float like the pitch store returns, so that both serialize alike
+    frame_pitches = frame_pitches[frame_pitches > 0]
+    return float(np.median(frame_pitches))
+
+def detect_pitch(file_path, detector=DEFAULT_DETECTOR):
+    """Detect the fundamental frequency (pitch) of an audio file.
+
+    The result is kept in the session's input cache.
+    """
+    return input_cache.pitch(file_path, detector)
+
+def detect_sound_pitch(sound, detector=DEFAULT_DETECTOR, window=DETECT_WINDOW):
+    """Detect the fundamental frequency of an already decoded AudioSegment or a PcmFile."""
+    if isinstance(sound, PcmFile):
+        # Read the mapping a block at a time, like a spool file
+        from soundladder_stream import detect_spooled_pitch
+        with span('detect', detector=detector):
+            return detect_spooled_pitch(sound, detector, window or sound.length / sound.sample_rate)
+
+    with span('detect', detector=detector):
+        samples = sound_to_samples(sound)
+        mono = samples.mean(axis=0)
+
+        # Pick the analysis window first so only it is resampled, and leave
+        # out any silence at its ends
+        if window is not None:
+            mono = loudest_segment(mono, sound.frame_rate, window)
+        start, stop = active_span(mono, sound.frame_rate)
+        mono = mono[start:stop]
+        y = librosa.resample(mono, orig_sr=sound.frame_rate, target_sr=DETECT_SAMPLE_RATE)
+        return estimate_pitch(y, DETECT_SAMPLE_RATE, detector, window=None)
+
+# Frames of an AudioSegment hashed at a time
+HASH_BLOCK_FRAMES = 1 << 18
+
+def audio_hash(sound):
+    """Content hash of decoded audio, independent of file name, container and decoder.
+
+    Hashes the float32 samples of sound_to_samples, interleaved, and the bit
+    depth of the source, so a PcmFile and the AudioSegment pydub decodes
+    from the same file (8-bit unsigned, or 24-bit widened to 32) hash alike.
+    """
+    digest = hashlib.sha256(f"{sound.frame_rate}:{sound.channels}:{source_sample_width(sound)}:".encode())
+    if isinstance(sound, PcmFile):
+        sound.update_hash(digest)
+    else:
+        samples = sound_to_samples(sound)
+        for start in range(0, samples.shape[1], HASH_BLOCK_FRAMES):
+            digest.update(np.ascontiguousarray(samples[:, start:start + HASH_BLOCK_FRAMES].T))
+    return digest.hexdigest()
+
+# Bump when a change to pitch detection alters its results
+DETECTOR_VERSION = 3
+
+def detector_key(detector):
+    """Identify ``detector`` together with every setting that affects its result."""
+    return (
+        f"{detector}:v{DETECTOR_VERSION}:window={DETECT_WINDOW}:"
+        f"range={DETECT_FMIN}-{DETECT_FMAX}:sr={DETECT_SAMPLE_RATE}"
+    )
+
+# Default number of pitches kept by a PitchStore
+PITCH_STORE_ENTRIES = 100000
+
+class PitchStore:
+    """Persistent SQLite store of detected pitches.
+
+    Rows are keyed by the audio_hash of the decoded input and the detector_key,
+    so copied or renamed files still hit while changed detector settings miss.
+    Rows written with settings other than the current ones are pruned when the
+    store is opened, and the least recently used rows are evicted once there are
+    more than ``max_entries``. Store errors are logged and treated as misses.
+    """
+    def __init__(self, path, max_entries=PITCH_STORE_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        current = [detector_key(detector) for detector in PITCH_DETECTORS]
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS pitch ("
+            "audio_hash TEXT, detector TEXT, frequency REAL, midi_note REAL, last_used REAL, "
+            "PRIMARY KEY (audio_hash, detector))",
+            "CREATE INDEX IF NOT EXISTS pitch_last_used ON pitch (last_used)",
+            (f"DELETE FROM pitch WHERE detector NOT IN ({', '.join('?' * len(current))})", current)
+        )
+
+    def _execute(self, *statements):
+        """Run statements in one transaction; returns the rows of the first."""
+        try:
+            with closing(sqlite3.connect(self.path, timeout=30)) as db:
+                with db:
+                    rows = None
+                    for statement in statements:
+                        sql, params = statement if isinstance(statement, tuple) else (statement, ())
+                        cursor = db.execute(sql, params)
+                        if rows is None:
+                            rows = cursor.fetchall()
+                    return rows
+        except sqlite3.Error as e:
+            logger.warning(f"Pitch store {self.path} unavailable: {str(e)}")
+            return None
+
+    def get(self, audio_hash, detector):
+        """Return the stored (frequency, midi_note), or None."""
+        key = (audio_hash, detector_key(detector))
+        rows = self._execute(
+            ("SELECT frequency, midi_note FROM pitch WHERE audio_hash = ? AND detector = ?", key),
+            ("UPDATE pitch SET last_used = ? WHERE audio_hash = ? AND detector = ?", (time.time(),) + key)
+        )
+        if not rows or rows[0][0] is None:
+            return None
+        return rows[0]
+
+    def put(self, audio_hash, detector, frequency):
+        """Store a detected pitch and evict the least recently used rows."""
+        self._execute(
+            (
+                "INSERT OR REPLACE INTO pitch VALUES (?, ?, ?, ?, ?)",
+                (audio_hash, detector_key(detector), float(frequency),
+                 float(frequency_to_midi_note(frequency)), time.time())
+            ),
+            (
+                "DELETE FROM pitch WHERE rowid IN "
+                "(SELECT rowid FROM pitch ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+        )
+
+    def invalidate(self):
+        """Forget every stored pitch."""
+        self._execute("DELETE FROM pitch")
+
+def default_pitch_store_path():
+    return os.path.join(default_cache_dir(), 'pitch.sqlite3')
+
+# Default session cache limit for decoded inputs
+INPUT_CACHE_BYTES = 512 * 1024 * 1024
+
+class InputCache:
+    """Session cache of decoded inputs and their detected pitch.
+
+    Entries are keyed by path, modification time and size, so an edited file
+    is decoded again. Once the decoded audio exceeds ``max_bytes`` the least
+    recently used inputs are evicted. Pitches missing from the cache are looked
+    up in ``store``, a PitchStore, before they are detected. Uncompressed WAV
+    and AIFF inputs are memory-mapped rather than decoded (see decode_input).
+    """
+    def __init__(self, max_bytes=INPUT_CACHE_BYTES, store=None):
+        self.max_bytes = max_bytes
+        self.store = store
+        self.size = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    def _once(self, slot, lookup, compute):
+        """Return ``lookup()`` if it is not None, else ``compute()``.
+
+        The lock is only held for the lookup: ``compute`` runs outside it, once
+        per ``slot``, and concurrent callers of the same slot wait for its
+        result. ``compute`` stores its result (under the lock) before returning.
+        """
+        with self._lock:
+            value = lookup()
+            if value is not None:
+                return value
+            future = self._pending.get(slot)
+            owner = future is None
+            if owner:
+                future = self._pending[slot] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._pending[slot]
+        future.set_result(value)
+        return value
+
+    def _entry(self, path):
+        key = self._key(path)
+
+        def lookup():
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+        def decode():
+            with span('decode', file=os.path.basename(path)):
+                sound = decode_input(path)
+            # A mapped file counts its size too, so evicting entries closes their mappings
+            entry = {
+                'sound': sound, 'pitch': {},
+                'bytes': sound.nbytes if isinstance(sound, PcmFile) else len(sound.raw_data)
+            }
+            with self._lock:
+                self._entries[key] = entry
+                self.size += entry['bytes']
+
+                # Evict the least recently used inputs, but never the new one
+                while self.size > self.max_bytes and len(self._entries) > 1:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.size -= evicted['bytes']
+            return entry
+
+        return self._once(('decode', key), lookup, decode)
+
+    def sound(self, path):
+        """Return the decoded AudioSegment of ``path``."""
+        return self._entry(path)['sound']
+
+    def pitch(self, path, detector=DEFAULT_DETECTOR):
+        """Return the detected pitch of ``path`` in Hz."""
+        entry = self._entry(path)
+
+        def detect():
+            stored = None
+            if self.store is not None:
+                stored = self.store.get(self.audio_hash(path), detector)
+
+            if stored is not None:
+                frequency = stored[0]
+                logger.info(f"Pitch ({detector}) of {os.path.basename(path)} read from the pitch store")
+            else:
+                detect_start = time.perf_counter()
+                frequency = detect_sound_pitch(entry['sound'], detector)
+                logger.info(
+                    f"Pitch detection ({detector}) of {os.path.basename(path)} "
+                    f"took {time.perf_counter() - detect_start:.3f}s"
+                )
+                if self.store is not None:
+                    self.store.put(self.audio_hash(path), detector, frequency)
+            with self._lock:
+                entry['pitch'][detector] = frequency
+            return frequency
+
+        # The pending slot holds on to the entry, so its id is not reused meanwhile
+        return self._once(('pitch', id(entry), detector), lambda: entry['pitch'].get(detector), detect)
+
+    def audio_hash(self, path):
+        """Return the audio_hash of ``path``'s decoded audio."""
+        entry = self._entry(path)
+
+        def compute():
+            value = audio_hash(entry['sound'])
+            with self._lock:
+                entry['hash'] = value
+            return value
+
+        return self._once(('hash', id(entry)), lambda: entry.get('hash'), compute)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+# Decoded inputs shared by previews and generation in this session
+input_cache = InputCache()
+
+def decode_input(path):
+    """Map ``path`` as a PcmFile if it is uncompressed WAV or AIFF, else decode it with pydub."""
+    sound = open_pcm_file(path)
+    if sound is not None:
+        logger.debug(f"Mapped {os.path.basename(path)}: {sound.length} frames of {sound.sample_width * 8}-bit PCM")
+        return sound
+    return AudioSegment.from_file(path)
+
+def use_pitch_store(path=None):
+    """Persist detected pitches in the PitchStore at ``path`` (default location if None)."""
+    input_cache.store = PitchStore(path or default_pitch_store_path())
+    return input_cache.store
+
+def load_sound(file_path):
+    """Decode an audio file, reusing the session's input cache."""
+    return input_cache.sound(file_path)
+
+def frequency_to_midi_note(frequency):
+    """Convert frequency in Hz to MIDI note number."""
+    return 69 + 12 * np.log2(frequency / 440.0)
+
+def midi_note_to_frequency(midi_note):
+    """Convert MIDI note number to frequency in Hz."""
+    return 440.0 * (2.0 ** ((midi_note - 69.0) / 12.0))
+
+def default_workers():
+    """Number of worker processes used when none is configured."""
+    return os.cpu_count() or 1
+
+def analyze_input(input_file, start_pitch, detector=DEFAULT_DETECTOR):
+    """Decode ``input_file`` and find the shift that brings it to ``start_pitch``.
+
+    Returns the decoded AudioSegment, the semitone adjustment and the
+    detected frequency.
+    """
+    sound = load_sound(input_file)
+    input_freq = detect_pitch(input_file, detector)
+    input_note = frequency_to_midi_note(input_freq)
+    semitone_adjustment = start_pitch - input_note
+
+    logger.debug(f"Input frequency: {input_freq:.2f} Hz")
+    logger.debug(f"Input MIDI note: {input_note:.1f}")
+    logger.debug(f"Adjustment needed: {semitone_adjustment:.1f} semitones")
+
+    return sound, semitone_adjustment, input_freq
+
+def plan_rungs(input_file, output_dir, semitone_adjustment, settings, packed=None):
+    """List the rungs of a ladder as (index, semitones, output_file) tuples.
+
+    With a PackedLadder from open_packed_ladder, the output_file of each rung
+    is its PackedSlot.
+    """
+    original_filename = os.path.splitext(os.path.basename(input_file))[0]
+    output_format = settings['output_format']
+    return [
+        (
+            i,
+            semitones,
+            packed.slot(i) if packed is not None else
+            os.path.join(output_dir, f"{original_filename}_sound_{i+1:03d}.{output_format}")
+        )
+        for i, semitones in enumerate(rung_semitones(semitone_adjustment, settings))
+    ]
+
+def rung_semitones(semitone_adjustment, settings):
+    """Shift of every rung of a ladder, in semitones."""
+    return [(i * settings['pitch_increment']) + semitone_adjustment for i in range(settings['num_files'])]
+
+def open_packed_ladder(input_file, output_dir, settings, layout, semitone_adjustment):
+    """Create the packed ladder file of an input, or return None unless the
+    output format is "packed".
+
+    ``layout`` is (sample_rate, channels, sample_width, frames) of the input.
+    """
+    if settings['output_format'] != "packed":
+        return None
+    sample_rate, channels, sample_width, frames = layout
+    rung_frames = [
+        rung_length(
+            frames, sample_rate, semitones,
+            settings.get('engine', DEFAULT_ENGINE), settings.get('target_duration', 0.0)
+        )
+        for semitones in rung_semitones(semitone_adjustment, settings)
+    ]
+    original_filename = os.path.splitext(os.path.basename(input_file))[0]
+    return PackedLadder.create(
+        os.path.join(output_dir, f"{original_filename}_ladder.wav"), sample_rate, channels, sample_width, rung_frames
+    )
+
+def finish_packed_ladder(packed, rungs, settings):
+    """Write the index and SFZ mapping of a complete packed ladder."""
+    if packed is not None:
+        packed.write_index(rungs, settings['start_pitch'], settings['pitch_increment'])
+
+def rung_tags(original_filename, index, semitones):
+    """Metadata tags of one rung of an MP3 ladder."""
+    return {
+        'title': f'{original_filename} Sound {index+1}',
+        'artist': 'Sound Ladder Generator',
+        'pitch_shift': f'{semitones:.1f} semitones'
+    }
+
+# Bump when a change to rendering or export alters the files written
+RENDER_VERSION = 2
+
+# Decimal places of the pitches in render keys: rungs within a hundredth of a
+# cent of each other share a cache entry, so a pitch detected again with a
+# slightly different rounding still hits
+RENDER_KEY_DECIMALS = 4
+
+def render_key(input_hash, frequency, semitones, settings, sample_width, tags=None):
+    """Content key of one rung file: everything its bytes depend on.
+
+    ``input_hash`` is the audio_hash of the input and ``frequency`` its
+    detected pitch, keyed as a MIDI note. ``tags`` only matter to MP3 files.
+    """
+    output_format = settings['output_format']
+    # round() of -0.0 stays negative; adding 0.0 makes it the same key as 0.0
+    fields = {
+        'version': RENDER_VERSION,
+        'input': input_hash,
+        'note': round(float(frequency_to_midi_note(frequency)), RENDER_KEY_DECIMALS) + 0.0,
+        'semitones': round(float(semitones), RENDER_KEY_DECIMALS) + 0.0,
+        'engine': settings.get('engine', DEFAULT_ENGINE),
+        'quality': settings.get('quality', DEFAULT_QUALITY),
+        'target_duration': float(settings.get('target_duration', 0.0)),
+        'format': output_format,
+        'sample_width': sample_width,
+        'tags': tags if output_format == "mp3" else None
+    }
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+# Render cache shared by every ladder of this session, None when disabled
+render_cache = None
+
+def default_render_cache_path():
+    return os.path.join(default_cache_dir(), 'renders')
+
+def use_render_cache(path=None, max_bytes=RENDER_CACHE_BYTES, link=True):
+    """Reuse rendered rungs through the RenderCache at ``path`` (default location if None)."""
+    global render_cache
+    render_cache = RenderCache(path or default_render_cache_path(), max_bytes, link)
+    return render_cache
+
+def fetch_cached_rungs(input_file, rungs, settings, sample_width):
+    """Write the rungs of ``rungs`` (from plan_rungs) found in the render cache.
+
+    Returns the rungs left to render and a function that stores rendered
+    rungs in the cache. Packed ladders and streamed rendering bypass the
+    cache.
+    """
+    if render_cache is None or settings['output_format'] == "packed" or settings.get('memory_budget_mb'):
+        return rungs, lambda rendered: None
+
+    original_filename = os.path.splitext(os.path.basename(input_file))[0]
+    input_hash = input_cache.audio_hash(input_file)
+    frequency = input_cache.pitch(input_file, settings.get('detector', DEFAULT_DETECTOR))
+    keys = {
+        i: render_key(input_hash, frequency, semitones, settings, sample_width, rung_tags(original_filename, i, semitones))
+        for i, semitones, _ in rungs
+    }
+    with span('cache', file=original_filename):
+        cached = render_cache.fetch((keys[i], output_file) for i, _, output_file in rungs)
+    if cached:
+        logger.info(f"{len(cached)} of {len(rungs)} rungs of {original_filename} read from the render cache")
+
+    def store(rendered):
+        with span('cache', file=original_filename):
+            render_cache.put((keys[i], output_file) for i, _, output_file in rendered)
+
+    return [rung for rung in rungs if rung[2] not in cached], store
+
+def generate_ladder(input_file, output_dir, settings, on_status=None, is_cancelled=None):
+    """Render the ladder of one input in this process.
+
+    ``on_status(status, progress)`` reports progress with the GUI's STATUS_TYPES
+    keys and ``is_cancelled()`` is checked before every rung. Returns True when
+    the ladder is complete and False when it was cancelled; errors are reported
+    as 'ERROR' and re-raised.
+    """
+    if on_status is None:
+        on_status = lambda status, progress=None: None
+    if is_cancelled is None:
+        is_cancelled = lambda: False
+
+    if settings.get('memory_budget_mb'):
+        # Imported here, soundladder_stream builds on this module
+        from soundladder_stream import generate_ladder_streaming
+        return generate_ladder_streaming(input_file, output_dir, settings, on_status, is_cancelled)
+
+    try:
+        # Update status to analyzing
+        on_status('ANALYZING')
+
+        # Get original filename without extension
+        original_filename = os.path.splitext(os.path.basename(input_file))[0]
+
+        # Load and process sound
+        sound, semitone_adjustment, input_freq = analyze_input(
+            input_file, settings['start_pitch'], settings.get('detector', DEFAULT_DETECTOR)
+        )
+
+        logger.debug(f"Pitch increment: {settings['pitch_increment']} semitones")
+        logger.debug(f"Number of files: {settings['num_files']}")
+        logger.debug(f"Output format: {settings['output_format']}")
+        logger.debug(f"Engine: {settings.get('engine', DEFAULT_ENGINE)}")
+        logger.debug(f"Quality: {settings.get('quality', DEFAULT_QUALITY)}")
+
+        sample_width = output_sample_width(settings, source_sample_width(sound))
+        logger.debug(f"Output bit depth: {sample_width * 8}")
+
+        os.makedirs(output_dir, exist_ok=True)
+        packed = open_packed_ladder(
+            input_file, output_dir, settings,
+            (sound.frame_rate, sound.channels, sample_width, int(sound.frame_count())), semitone_adjustment
+        )
+
+        # Rungs rendered before, by any ladder, come from the render cache;
+        # the input is only analyzed if some are missing
+        rungs = plan_rungs(input_file, output_dir, semitone_adjustment, settings, packed)
+        missing, store = fetch_cached_rungs(input_file, rungs, settings, sample_width)
+        if missing:
+            analysis = ladder_renderer(sound_to_samples(sound), sound.frame_rate, settings, input_freq)
+
+        # Generate sound bites; MP3 rungs encode while the next one renders
+        with open_rung_writer(settings['output_format'], sample_width) as writer:
+            for done, (i, semitone_increase, output_file) in enumerate(missing, len(rungs) - len(missing) + 1):
+                if is_cancelled():
+                    on_status('CANCELLED')
+                    return False
+
+                progress = int(done / len(rungs) * 100)
+                on_status('CONVERTING', progress)
+
+                with span('rung', file=original_filename, index=i, semitones=semitone_increase):
+                    writer.write(
+                        analysis.render(semitone_increase),
+                        sound.frame_rate,
+                        output_file,
+                        rung_tags(original_filename, i, semitone_increase)
+                    )
+        store(missing)
+
+        finish_packed_ladder(packed, rungs, settings)
+        on_status('COMPLETED', 100)
+        return True
+    except Exception as e:
+        logger.error(f"Error in generate_ladder: {str(e)}", exc_info=True)
+        on_status('ERROR')
+        raise
+
+def generate_batch(input_files, output_dir, settings, workers=1, on_status=None, is_cancelled=None):
+    """Render the ladders of ``input_files``, on a process pool if ``workers`` > 1.
+
+    Takes the same callbacks as generate_parallel and, like it, returns a list
+    of (index, exception) for the inputs that failed.
+    """
+    if workers > 1:
+        return generate_parallel(input_files, output_dir, settings, workers, on_status, is_cancelled)
+
+    if on_status is None:
+        on_status = lambda index, status, progress=None: None
+    if is_cancelled is None:
+        is_cancelled = lambda: False
+
+    errors = []
+    for index, input_file in enumerate(input_files):
+        if is_cancelled():
+            break
+        try:
+            with span('ladder', file=os.path.basename(input_file)):
+                generate_ladder(
+                    input_file,
+                    output_dir,
+                    settings,
+                    on_status=lambda status, progress=None, index=index: on_status(index, status, progress),
+                    is_cancelled=is_cancelled
+                )
+        except Exception as e:
+            logger.error(f"Error processing {input_file}: {str(e)}")
+            errors.append((index, e))
+    return errors
+
+# Analyses cached by each worker process, keyed by shared memory block name
+_worker_analyses = {}
+WORKER_CACHE_SIZE = 2
+
+def create_shared(shape, dtype):
+    """Allocate an array in a new shared memory block.
+
+    Returns the block, which the caller must close and unlink, the array,
+    which must be deleted before that, and a small picklable descriptor that
+    workers use to attach to the block.
+    """
+    dtype = np.dtype(dtype)
+    block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+    array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    return block, array, (block.name, tuple(shape), dtype.str)
+
+def release_samples(block):
+    """Free a shared memory block created by create_shared."""
+    block.close()
+    block.unlink()
+
+def _worker_analysis(shared, sample_rate, frequency, settings):
+    """Return the ladder_renderer of a shared input, analyzing it on first use."""
+    name, shape, dtype = shared
+    engine = settings.get('engine', DEFAULT_ENGINE)
+    key = (name, settings.get('quality', DEFAULT_QUALITY), engine, settings.get('target_duration', 0.0))
+    analysis = _worker_analyses.get(key)
+    if analysis is None:
+        block = shared_memory.SharedMemory(name=name)
+        samples = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        try:
+            # A LadderAnalysis keeps no reference to the samples; the other
+            # renderers render from them, so they get a copy
+            analysis = ladder_renderer(
+                samples if engine == 'vocoder' else samples.copy(), sample_rate, settings, frequency
+            )
+        finally:
+            del samples
+            block.close()
+
+        while len(_worker_analyses) >= WORKER_CACHE_SIZE:
+            del _worker_analyses[next(iter(_worker_analyses))]
+        _worker_analyses[key] = analysis
+    return analysis
+
+def render_rung_chunk(shared, sample_rate, sample_width, frequency, rungs, settings, original_filename):
+    """Pool task: render and export ``rungs`` of a shared input at ``sample_width``.
+
+    ``frequency`` is the detected pitch of the input. Returns the number of
+    rungs written.
+    """
+    analysis = _worker_analysis(shared, sample_rate, frequency, settings)
+
+    # Every worker is busy rendering, so encode MP3 in this process; WAV
+    # writes only wait on the disk and still go to an I/O thread
+    output_format = settings['output_format']
+    with open_rung_writer(output_format, sample_width, background=output_format != "mp3") as writer:
+        for i, semitones, output_file in rungs:
+            with span('rung', file=original_filename, index=i, semitones=semitones):
+                writer.write(
+                    analysis.render(semitones),
+                    sample_rate,
+                    output_file,
+                    rung_tags(original_filename, i, semitones)
+                )
+    return len(rungs)
+
+def prepare_shared_input(input_file, settings):
+    """Analyze an input for generate_parallel.
+
+    Returns the pool task rendering its rungs, the leading arguments of that
+    task, the semitone adjustment, a function releasing the shared input and
+    the (sample_rate, channels, sample_width, frames) layout of its rungs.
+    """
+    if settings.get('memory_budget_mb'):
+        from soundladder_stream import prepare_spooled_input
+        return prepare_spooled_input(input_file, settings)
+
+    sound, semitone_adjustment, input_freq = analyze_input(
+        input_file, settings['start_pitch'], settings.get('detector', DEFAULT_DETECTOR)
+    )
+    sample_width = output_sample_width(settings, source_sample_width(sound))
+
+    # Convert straight into shared memory
+    block, samples, shared = create_shared((sound.channels, int(sound.frame_count())), np.float32)
+    try:
+        sound_to_samples(sound, out=samples)
+    except Exception:
+        del samples
+        release_samples(block)
+        raise
+    del samples
+
+    task_args = (shared, sound.frame_rate, sample_width, input_freq)
+    layout = (sound.frame_rate, sound.channels, sample_width, int(sound.frame_count()))
+    return render_rung_chunk, task_args, semitone_adjustment, lambda: release_samples(block), layout
+
+def generate_parallel(input_files, output_dir, settings, workers, on_status=None, is_cancelled=None):
+    """Render the ladders of ``input_files`` on a pool of ``workers`` processes.
+
+    Each input is decoded and pitch-detected here, then handed to the pool
+    through shared memory (or, with a memory budget, a spool file) so its
+    samples are never pickled. Its rungs are
+    split into chunks spread across the workers, and the next inputs are
+    analyzed while earlier ones render.
+
+    ``on_status(index, status, progress)`` reports per-input progress with the
+    GUI's STATUS_TYPES keys. ``is_cancelled()`` is polled while waiting; once it
+    returns True, rungs that have not started are dropped.
+
+    Returns a list of (index, exception) for the inputs that failed.
+    """
+    if on_status is None:
+        on_status = lambda index, status, progress=None: None
+    if is_cancelled is None:
+        is_cancelled = lambda: False
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    errors = []
+    traced = tracer.enabled
+    queue = deque(enumerate(input_files))
+    active = {}  # input index -> state of its ladder
+    pending = {}  # future -> input index
+    cancelled = False
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            while (queue and not cancelled) or pending:
+                # Keep up to one input per worker in flight
+                while queue and not cancelled and len(active) < workers:
+                    index, input_file = queue.popleft()
+                    on_status(index, 'ANALYZING')
+                    try:
+                        with span('prepare', file=os.path.basename(input_file)):
+                            task, task_args, semitone_adjustment, release, layout = prepare_shared_input(input_file, settings)
+                        try:
+                            packed = open_packed_ladder(input_file, output_dir, settings, layout, semitone_adjustment)
+                            rungs = plan_rungs(input_file, output_dir, semitone_adjustment, settings, packed)
+                            # Only the rungs missing from the render cache go to the pool
+                            missing, store = fetch_cached_rungs(input_file, rungs, settings, layout[2])
+                        except Exception:
+                            release()
+                            raise
+                    except Exception as e:
+                        logger.error(f"Error processing {input_file}: {str(e)}", exc_info=True)
+                        on_status(index, 'ERROR')
+                        errors.append((index, e))
+                        continue
+
+                    original_filename = os.path.splitext(os.path.basename(input_file))[0]
+                    chunk_size = max(1, -(-len(missing) // (workers * 4)))
+                    # Workers send their spans back with each chunk when tracing
+                    if traced:
+                        task_args = (task, *task_args)
+                        task = traced_call
+                    chunks = {
+                        executor.submit(
+                            task,
+                            *task_args,
+                            missing[start:start + chunk_size],
+                            settings,
+                            original_filename
+                        ): missing[start:start + chunk_size]
+                        for start in range(0, len(missing), chunk_size)
+                    }
+                    for future in chunks:
+                        pending[future] = index
+                    cached = len(rungs) - len(missing)
+                    active[index] = {
+                        'release': release, 'futures': list(chunks), 'chunks': chunks, 'store': store,
+                        'done': cached, 'total': len(rungs), 'packed': packed, 'rungs': rungs
+                    }
+                    on_status(index, 'CONVERTING', int(cached / len(rungs) * 100))
+                    cancelled = is_cancelled()
+
+                if not cancelled and is_cancelled():
+                    cancelled = True
+                if cancelled:
+                    for future in pending:
+                        future.cancel()
+
+                done = set()
+                if pending:
+                    done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    index = pending.pop(future)
+                    state = active[index]
+                    if future.cancelled():
+                        continue
+                    try:
+                        result = future.result()
+                        if traced:
+                            result, events = result
+                            tracer.events.extend(events)
+                        state['done'] += result
+                        state['store'](state['chunks'][future])
+                    except Exception as e:
+                        if 'error' not in state:
+                            logger.error(f"Error processing {input_files[index]}: {str(e)}")
+                            state['error'] = e
+                            errors.append((index, e))
+                            for other in state['futures']:
+                                other.cancel()
+                        continue
+                    if 'error' not in state:
+                        on_status(index, 'CONVERTING', int(state['done'] / state['total'] * 100))
+
+                # Release the inputs that have no rungs left in the pool
+                finished = [
+                    index for index, state in active.items()
+                    if not any(future in pending for future in state['futures'])
+                ]
+                for index in finished:
+                    state = active.pop(index)
+                    state['release']()
+                    if 'error' not in state and state['done'] == state['total']:
+                        try:
+                            finish_packed_ladder(state['packed'], state['rungs'], settings)
+                        except Exception as e:
+                            logger.error(f"Error processing {input_files[index]}: {str(e)}")
+                            state['error'] = e
+                            errors.append((index, e))
+                    if 'error' in state:
+                        on_status(index, 'ERROR')
+                    elif state['done'] == state['total']:
+                        on_status(index, 'COMPLETED', 100)
+                    else:
+                        on_status(index, 'CANCELLED')
+        finally:
+            for state in active.values():
+                state['release']()
+
+    return errors
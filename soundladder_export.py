@@ -0,0 +1,471 @@
+"""Export stage of the Sound Ladder Generator: rendered samples to files.
+
+Rungs are written through a RungWriter from open_rung_writer. WAV rungs go
+straight from NumPy to the wave module through reused PcmEncoders, on a
+dedicated I/O thread with a short queue, so disk or network writes overlap
+with rendering the next rung. A packed ladder (PackedLadder) holds every rung
+in one WAV file at fixed offsets, with a JSON index and an SFZ mapping.
+
+MP3 rungs are encoded with LAME in-process (lameenc) instead of an ffmpeg
+process per rung: a background RungWriter hands each rung to a long-lived
+encoder process over a pipe and returns at once, so a rung is encoded while
+the next one renders. Without lameenc, ffmpeg is fed the PCM over a pipe
+instead of a temporary WAV file, on a background thread.
+
+This module only needs NumPy (and soundladder_trace, which only needs the
+standard library), so encoder processes start quickly.
+"""
+import os
+import json
+import wave
+import struct
+import logging
+import tempfile
+import subprocess
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from soundladder_trace import span
+
+try:
+    import lameenc
+except ImportError:
+    lameenc = None
+
+logger = logging.getLogger(__name__)
+
+# Full-scale value of signed integer PCM, by sample width in bytes. pydub keeps
+# 8-bit audio signed and widens 24-bit audio to 32-bit when decoding.
+PCM_FULL_SCALE = {1: 128.0, 2: 32768.0, 3: 8388608.0, 4: 2147483648.0}
+
+class PcmEncoder:
+    """Converts float (channels, n) samples to interleaved integer PCM.
+
+    The scaled, integer and packed buffers are allocated on the first call and
+    reused while the shape stays the same, so a ladder's rungs are encoded
+    without new allocations. The returned memoryview is only valid until the
+    next call to encode(). ``unsigned`` stores 8-bit samples offset by 128,
+    as WAV files do.
+    """
+    def __init__(self, sample_width, unsigned=False):
+        self.sample_width = sample_width
+        self.unsigned = unsigned and sample_width == 1
+        self._shape = None
+
+    def _allocate(self, shape):
+        # Full-scale 32-bit values need float64 to clip exactly
+        float_dtype = np.float64 if self.sample_width == 4 else np.float32
+        int_dtype = {1: np.int8, 2: '<i2', 3: '<i4', 4: '<i4'}[self.sample_width]
+        self._scaled = np.empty(shape, dtype=float_dtype)
+        self._ints = np.empty(shape, dtype=int_dtype)
+        if self.sample_width == 3:
+            self._packed = np.empty((shape[0] * shape[1], 3), dtype=np.uint8)
+        self._shape = shape
+
+    def encode(self, samples):
+        """Return the PCM bytes of ``samples`` as a memoryview."""
+        with span('encode', sample_width=self.sample_width):
+            return self._encode(samples)
+
+    def _encode(self, samples):
+        shape = (samples.shape[-1], samples.shape[0])
+        if shape != self._shape:
+            self._allocate(shape)
+
+        full_scale = PCM_FULL_SCALE[self.sample_width]
+        np.multiply(samples.T, full_scale, out=self._scaled)
+        np.clip(self._scaled, -full_scale, full_scale - 1, out=self._scaled)
+        np.copyto(self._ints, self._scaled, casting='unsafe')
+
+        if self.sample_width == 3:
+            # Keep the low three bytes of each little-endian int32
+            np.copyto(self._packed, self._ints.view(np.uint8).reshape(-1, 4)[:, :3])
+            return memoryview(self._packed).cast('B')
+        if self.unsigned:
+            self._ints.view(np.uint8)[...] ^= 0x80
+        return memoryview(self._ints).cast('B')
+
+def check_mp3_channels(channels):
+    """Raise ValueError if MP3 cannot hold ``channels`` channels."""
+    if channels > 2:
+        raise ValueError(
+            f"MP3 supports at most 2 channels, this input has {channels}; use WAV output"
+        )
+
+def rung_encoder(output_format, sample_width):
+    """PcmEncoder for the rungs of a ladder; MP3 is always encoded from 16-bit."""
+    if output_format == "mp3":
+        return PcmEncoder(2)
+    return PcmEncoder(sample_width, unsigned=True)
+
+# Size of the plain PCM header written by the wave module and PackedLadder
+WAV_HEADER_BYTES = 44
+
+def unlink_output(output_file):
+    """Remove ``output_file`` if it exists, so the next write creates a new file.
+
+    A rung hard-linked from the render cache shares its data with the cache
+    and with other outputs; writing into it in place would change them too.
+    """
+    try:
+        os.remove(output_file)
+    except FileNotFoundError:
+        pass
+
+def write_wav(output_file, pcm, sample_rate, channels, sample_width):
+    """Write PCM bytes (unsigned if 8-bit) to a WAV file."""
+    unlink_output(output_file)
+    with wave.open(output_file, 'wb') as f:
+        f.setnchannels(channels)
+        f.setsampwidth(sample_width)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm)
+
+# A rung of a packed ladder, the destination RungWriters get instead of a file
+PackedSlot = namedtuple('PackedSlot', ['ladder', 'index'])
+
+# Version of the index written next to a packed ladder
+PACKED_INDEX_VERSION = 1
+
+class PackedLadder:
+    """Every rung of a ladder in one WAV file, at fixed byte offsets.
+
+    The file is created at its full size up front, so rungs can be written in
+    any order and by several processes at once. Rung i holds ``rung_frames[i]``
+    frames, rung_bytes(i) bytes from offset(i). write_index() adds a JSON index
+    and an SFZ mapping, which consumers use to mmap the file and jump straight
+    to a rung.
+    """
+    def __init__(self, path, sample_rate, channels, sample_width, rung_frames):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.rung_frames = list(rung_frames)
+        self.frame_bytes = channels * sample_width
+        self.data_offset = WAV_HEADER_BYTES
+        self._first_frames = [0]
+        for frames in self.rung_frames:
+            self._first_frames.append(self._first_frames[-1] + frames)
+
+    @classmethod
+    def create(cls, path, sample_rate, channels, sample_width, rung_frames):
+        """Create the WAV file of a packed ladder, silent until rungs are written."""
+        ladder = cls(path, sample_rate, channels, sample_width, rung_frames)
+        data_bytes = ladder._first_frames[-1] * ladder.frame_bytes
+        if data_bytes + WAV_HEADER_BYTES - 8 > 0xFFFFFFFF:
+            raise ValueError(
+                f"A packed ladder of {len(ladder.rung_frames)} rungs would exceed the 4 GB limit of "
+                "WAV files; use fewer rungs or separate WAV files"
+            )
+
+        block_align = ladder.frame_bytes
+        header = struct.pack(
+            '<4sI4s4sIHHIIHH4sI',
+            b'RIFF', data_bytes + WAV_HEADER_BYTES - 8, b'WAVE',
+            b'fmt ', 16, 1, channels, sample_rate, sample_rate * block_align, block_align, sample_width * 8,
+            b'data', data_bytes
+        )
+        with open(path, 'wb') as f:
+            f.write(header)
+            f.truncate(WAV_HEADER_BYTES + data_bytes)
+        return ladder
+
+    def offset(self, index):
+        """Byte offset of rung ``index`` in the file."""
+        return self.data_offset + self._first_frames[index] * self.frame_bytes
+
+    def rung_bytes(self, index):
+        return self.rung_frames[index] * self.frame_bytes
+
+    def slot(self, index):
+        return PackedSlot(self, index)
+
+    def open_rung(self, index):
+        """Open the file for writing at the start of rung ``index``."""
+        f = open(self.path, 'r+b')
+        f.seek(self.offset(index))
+        return f
+
+    def write_rung(self, index, pcm):
+        """Write the PCM bytes (unsigned if 8-bit) of a whole rung."""
+        if len(pcm) != self.rung_bytes(index):
+            raise ValueError(f"Rung {index} has {len(pcm)} bytes, the packed ladder expects {self.rung_bytes(index)}")
+        with self.open_rung(index) as f:
+            f.write(pcm)
+
+    def write_index(self, rungs, start_pitch, pitch_increment):
+        """Write the JSON index and SFZ mapping of the ``rungs`` (index, semitones, slot).
+
+        Returns the paths of both files.
+        """
+        base = os.path.splitext(self.path)[0]
+        sample = os.path.basename(self.path)
+        entries = [
+            {
+                'index': i,
+                'note': float(start_pitch + i * pitch_increment),
+                'semitones': float(semitones),
+                'offset': self.offset(i),
+                'length': self.rung_bytes(i),
+                'frames': self.rung_frames[i]
+            }
+            for i, semitones, _ in rungs
+        ]
+        index = {
+            'version': PACKED_INDEX_VERSION,
+            'file': sample,
+            'sample_rate': self.sample_rate,
+            'channels': self.channels,
+            'sample_width': self.sample_width,
+            'data_offset': self.data_offset,
+            'rungs': entries
+        }
+        # Serialize before opening the file, so a failure cannot leave half an index
+        text = json.dumps(index, indent=2)
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            f.write(text)
+
+        with open(base + '.sfz', 'w', encoding='utf-8') as f:
+            f.write(sfz_mapping(sample, entries, self.frame_bytes))
+        return base + '.json', base + '.sfz'
+
+def sfz_mapping(sample, entries, frame_bytes):
+    """SFZ regions playing each packed rung on the MIDI key nearest its note.
+
+    Where several rungs round to the same key (increments under a semitone),
+    the rung closest to the key plays it; ``tune`` corrects the rest.
+    """
+    regions = {}
+    for entry in entries:
+        key = int(round(entry['note']))
+        if not 0 <= key <= 127:
+            continue
+        if key not in regions or abs(entry['note'] - key) < abs(regions[key]['note'] - key):
+            regions[key] = entry
+
+    lines = [f'// Packed sound ladder {sample}', '<group>']
+    for key, entry in sorted(regions.items()):
+        first = (entry['offset'] - WAV_HEADER_BYTES) // frame_bytes
+        lines.append(
+            f"<region> sample={sample} offset={first} end={first + entry['frames'] - 1} "
+            f"key={key} pitch_keycenter={key} tune={int(round((key - entry['note']) * 100))}"
+        )
+    return '\n'.join(lines) + '\n'
+
+MP3_BITRATE = 192
+
+# LAME's algorithm quality (0 best, 9 fastest); 3 is LAME's own default
+LAME_QUALITY = 3
+
+# Rungs handed to the background encoder before write() waits for it
+MP3_PIPELINE_DEPTH = 2
+
+# Rungs queued for the WAV writer thread before write() waits for it
+WAV_PIPELINE_DEPTH = 2
+
+# ID3v2 frames for the tags ffmpeg maps to standard frames; the others
+# become TXXX frames named after the tag, as ffmpeg writes them
+ID3_FRAMES = {'title': 'TIT2', 'artist': 'TPE1', 'album': 'TALB', 'comment': 'COMM'}
+
+def _syncsafe(n):
+    return bytes([(n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F])
+
+def id3_tag(tags):
+    """Build an ID3v2.4 tag holding ``tags`` as UTF-8 text frames."""
+    frames = b''
+    for key, value in tags.items():
+        frame_id = ID3_FRAMES.get(key, 'TXXX')
+        if frame_id == 'COMM':
+            body = b'\x03eng\x00' + str(value).encode('utf-8')
+        elif frame_id == 'TXXX':
+            body = b'\x03' + key.encode('utf-8') + b'\x00' + str(value).encode('utf-8')
+        else:
+            body = b'\x03' + str(value).encode('utf-8')
+        frames += frame_id.encode('ascii') + _syncsafe(len(body)) + b'\x00\x00' + body
+    return b'ID3\x04\x00\x00' + _syncsafe(len(frames)) + frames
+
+def lame_encoder(sample_rate, channels, bitrate=MP3_BITRATE):
+    """A lameenc.Encoder for interleaved 16-bit PCM."""
+    encoder = lameenc.Encoder()
+    encoder.set_bit_rate(bitrate)
+    encoder.set_in_sample_rate(sample_rate)
+    encoder.set_channels(channels)
+    encoder.set_quality(LAME_QUALITY)
+    return encoder
+
+def ffmpeg_mp3_command(output_file, sample_rate, channels, tags, bitrate=MP3_BITRATE):
+    """ffmpeg command line encoding 16-bit PCM from stdin to an MP3 file."""
+    command = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 's16le', '-ar', str(sample_rate), '-ac', str(channels), '-i', '-',
+        '-b:a', f'{bitrate}k', '-id3v2_version', '4'
+    ]
+    for key, value in tags.items():
+        command += ['-metadata', f'{key}={value}']
+    return command + [output_file]
+
+def encode_mp3(output_file, pcm, sample_rate, channels, tags, bitrate=MP3_BITRATE):
+    """Encode interleaved 16-bit PCM to an MP3 file with ID3 tags."""
+    check_mp3_channels(channels)
+    if lameenc is None:
+        return encode_mp3_ffmpeg(output_file, pcm, sample_rate, channels, tags, bitrate)
+
+    encoder = lame_encoder(sample_rate, channels, bitrate)
+    data = encoder.encode(bytes(pcm))
+    data += encoder.flush()
+
+    unlink_output(output_file)
+    with open(output_file, 'wb') as f:
+        f.write(id3_tag(tags))
+        f.write(data)
+
+def encode_mp3_ffmpeg(output_file, pcm, sample_rate, channels, tags, bitrate=MP3_BITRATE):
+    """encode_mp3 through an ffmpeg process, fed over a pipe."""
+    command = ffmpeg_mp3_command(output_file, sample_rate, channels, tags, bitrate)
+    unlink_output(output_file)
+    with tempfile.TemporaryFile() as errors:
+        result = subprocess.run(command, input=pcm, stdout=subprocess.DEVNULL, stderr=errors)
+        if result.returncode != 0:
+            errors.seek(0)
+            message = errors.read().decode(errors='replace').strip()
+            raise RuntimeError(f"ffmpeg cannot encode {output_file}: {message}")
+
+# Background MP3 encoder shared by every ladder of this process, started on first use
+_mp3_executor = None
+
+def mp3_executor():
+    """Return the long-lived background MP3 encoder.
+
+    A process when lameenc is available, since it holds the GIL while
+    encoding; otherwise a thread, which only waits on ffmpeg.
+    """
+    global _mp3_executor
+    if _mp3_executor is None:
+        _mp3_executor = ProcessPoolExecutor(max_workers=1) if lameenc else ThreadPoolExecutor(max_workers=1)
+    return _mp3_executor
+
+class RungWriter:
+    """Base of the rung writers: keeps up to ``depth`` rungs in flight.
+
+    Subclasses hand each rung to a background stage with _submit(). Errors of
+    that stage are raised by a later write() or by close(), which waits for
+    every rung.
+    """
+    def __init__(self, depth):
+        self.depth = depth
+        self._pending = deque()
+
+    def _wait_for_slot(self):
+        while len(self._pending) >= self.depth:
+            self._pending.popleft().result()
+
+    def _submit(self, executor, function, *args):
+        self._pending.append(executor.submit(function, *args))
+
+    def close(self):
+        """Wait for the rungs in flight, raising the first error."""
+        error = None
+        while self._pending:
+            try:
+                self._pending.popleft().result()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        # Already failing: finish the rungs in flight but keep the first error
+        try:
+            self.close()
+        except Exception as e:
+            logger.error(f"Error writing rung: {str(e)}")
+
+class WavRungWriter(RungWriter):
+    """Writes WAV rungs at ``sample_width``, on an I/O thread if ``background``.
+
+    write() returns once the rung is converted to PCM and queued, so the next
+    rung renders while the previous one is written; on network storage that
+    hides most of the write time. Each of the ``depth`` queued rungs has its
+    own PcmEncoder, whose buffer is written as is, without a copy.
+    """
+    def __init__(self, sample_width, background=True, depth=WAV_PIPELINE_DEPTH):
+        super().__init__(depth if background else 1)
+        self.sample_width = sample_width
+        self.encoders = [PcmEncoder(sample_width, unsigned=True) for _ in range(self.depth)]
+        self._next = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='wav-writer') if background else None
+
+    def write(self, samples, sample_rate, output_file, tags=None):
+        if self._executor is None:
+            self._write(output_file, self.encoders[0].encode(samples), sample_rate, samples.shape[0])
+            return
+
+        # The encoder of this slot was last used ``depth`` rungs ago, whose
+        # write has finished once fewer than ``depth`` rungs are in flight
+        self._wait_for_slot()
+        encoder = self.encoders[self._next]
+        self._next = (self._next + 1) % self.depth
+        self._submit(self._executor, self._write, output_file, encoder.encode(samples), sample_rate, samples.shape[0])
+
+    def _write(self, output_file, pcm, sample_rate, channels):
+        with span('export', format='wav'):
+            write_wav(output_file, pcm, sample_rate, channels, self.sample_width)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+
+class PackedRungWriter(WavRungWriter):
+    """Writes rungs into their PackedSlot of a PackedLadder, like WavRungWriter."""
+    def _write(self, slot, pcm, sample_rate, channels):
+        with span('export', format='packed'):
+            slot.ladder.write_rung(slot.index, pcm)
+
+class Mp3RungWriter(RungWriter):
+    """Writes MP3 rungs, encoding them in the background if ``background``.
+
+    write() returns once the rung is converted to PCM and handed to the
+    encoder; up to ``depth`` rungs are in flight.
+    """
+    def __init__(self, background=True, depth=MP3_PIPELINE_DEPTH):
+        super().__init__(depth)
+        self.background = background
+        self.encoder = PcmEncoder(2)
+
+    def write(self, samples, sample_rate, output_file, tags=None):
+        check_mp3_channels(samples.shape[0])
+        if not self.background:
+            with span('export', format='mp3'):
+                encode_mp3(output_file, self.encoder.encode(samples), sample_rate, samples.shape[0], tags or {})
+            return
+
+        self._wait_for_slot()
+        # The encoder's buffer is reused for the next rung, so send a copy
+        pcm = bytes(self.encoder.encode(samples))
+        self._submit(mp3_executor(), encode_mp3, output_file, pcm, sample_rate, samples.shape[0], tags or {})
+
+def open_rung_writer(output_format, sample_width, background=True):
+    """Return the RungWriter (WavRungWriter, PackedRungWriter or Mp3RungWriter) of a ladder.
+
+    ``sample_width`` applies to WAV and packed ladders; MP3 is always encoded
+    from 16-bit. ``background`` lets the next rung render while WAV rungs are
+    written on an I/O thread and MP3 rungs are encoded.
+    """
+    if output_format == "mp3":
+        # Overlapping encoding with rendering needs a spare core
+        return Mp3RungWriter(background and (os.cpu_count() or 1) > 1)
+    if output_format == "packed":
+        return PackedRungWriter(sample_width, background)
+    return WavRungWriter(sample_width, background)
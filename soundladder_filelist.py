@@ -0,0 +1,244 @@
+"""The GUI's list of input files, for batches of tens of thousands of inputs.
+
+FileRegistry holds the queued inputs in order and finds any of them by path
+or by item ID in constant time. VirtualFileList shows a registry in a
+Treeview that only ever holds the rows on screen: scrolling refills those
+rows from the registry, so adding, scrolling through and updating the
+status of 50,000 files costs about as much as for ten.
+
+This module only needs the standard library; the Treeview and Scrollbar are
+created by the caller.
+"""
+import os
+
+class FileEntry:
+    """One queued input: its path, item ID, status key and progress."""
+    __slots__ = ('path', 'item_id', 'status', 'progress')
+
+    def __init__(self, path, item_id, status='QUEUED', progress=None):
+        self.path = path
+        self.item_id = item_id
+        self.status = status
+        self.progress = progress
+
+class FileRegistry:
+    """Queued inputs in list order, indexed by path and by item ID.
+
+    Paths are compared after normalization, so the same file added twice,
+    or with a different case on Windows, is only queued once. Item IDs are
+    never reused within a session.
+    """
+    def __init__(self):
+        self._entries = []
+        self._by_path = {}
+        self._by_id = {}
+        self._positions = {}
+        self._next_id = 0
+
+    @staticmethod
+    def _path_key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __getitem__(self, position):
+        return self._entries[position]
+
+    def add(self, paths):
+        """Queue every new file of ``paths``; returns the entries added."""
+        added = []
+        for path in paths:
+            key = self._path_key(path)
+            if key in self._by_path:
+                continue
+            self._next_id += 1
+            entry = FileEntry(path, f"file{self._next_id}")
+            self._positions[entry.item_id] = len(self._entries)
+            self._entries.append(entry)
+            self._by_path[key] = entry
+            self._by_id[entry.item_id] = entry
+            added.append(entry)
+        return added
+
+    def remove(self, item_ids):
+        """Remove the entries of ``item_ids`` in one pass; returns how many were removed."""
+        removed = {item_id for item_id in item_ids if item_id in self._by_id}
+        if not removed:
+            return 0
+        for item_id in removed:
+            entry = self._by_id.pop(item_id)
+            del self._by_path[self._path_key(entry.path)]
+        self._entries = [entry for entry in self._entries if entry.item_id not in removed]
+        self._positions = {entry.item_id: position for position, entry in enumerate(self._entries)}
+        return len(removed)
+
+    def clear(self):
+        self._entries = []
+        self._by_path.clear()
+        self._by_id.clear()
+        self._positions.clear()
+
+    def get(self, item_id):
+        """The entry of ``item_id``, or None if it was removed."""
+        return self._by_id.get(item_id)
+
+    def find(self, path):
+        """The entry of ``path``, or None if it is not queued."""
+        return self._by_path.get(self._path_key(path))
+
+    def position(self, item_id):
+        """Index of ``item_id`` in list order."""
+        return self._positions[item_id]
+
+    def paths(self):
+        return [entry.path for entry in self._entries]
+
+    def item_ids(self):
+        return [entry.item_id for entry in self._entries]
+
+class VirtualFileList:
+    """Shows a FileRegistry in a Treeview holding only the visible rows.
+
+    The Treeview keeps ``height`` rows, reused as the list scrolls, and the
+    scrollbar is driven by the position in the registry. The selection is
+    kept by item ID, so it survives scrolling: a plain click replaces it,
+    Control- and Shift-clicks extend it. ``status_text`` maps status keys to
+    the text shown.
+    """
+    def __init__(self, treeview, scrollbar, registry, status_text):
+        self.treeview = treeview
+        self.scrollbar = scrollbar
+        self.registry = registry
+        self.status_text = status_text
+        self.height = int(treeview.cget('height'))
+        self.top = 0
+        self.selected = set()
+        self._rows = []  # Treeview items, top to bottom
+        self._shown = []  # values shown by each row
+        self._replace_selection = False
+        self._syncing = False
+
+        scrollbar.configure(command=self.yview)
+        treeview.configure(yscrollcommand=lambda first, last: None)
+        treeview.bind('<<TreeviewSelect>>', self._on_select)
+        treeview.bind('<ButtonPress-1>', self._on_click)
+        treeview.bind('<MouseWheel>', self._on_wheel)
+        treeview.bind('<Button-4>', lambda event: self.scroll(-3))
+        treeview.bind('<Button-5>', lambda event: self.scroll(3))
+        treeview.bind('<Up>', lambda event: self._on_arrow(-1))
+        treeview.bind('<Down>', lambda event: self._on_arrow(1))
+        self.refresh()
+
+    def refresh(self):
+        """Show the registry from ``top``; only rows whose values changed are updated."""
+        count = len(self.registry)
+        self.top = max(0, min(self.top, count - self.height))
+        visible = min(self.height, count - self.top)
+
+        while len(self._rows) < visible:
+            self._rows.append(self.treeview.insert('', 'end', values=('', '', '')))
+            self._shown.append(None)
+        while len(self._rows) > visible:
+            self.treeview.delete(self._rows.pop())
+            self._shown.pop()
+
+        selection = []
+        for row, entry in enumerate(self.registry[self.top:self.top + visible]):
+            values = (
+                os.path.basename(entry.path),
+                self.status_text[entry.status],
+                f"{entry.progress}%" if entry.progress is not None else ""
+            )
+            if self._shown[row] != values:
+                self.treeview.item(self._rows[row], values=values)
+                self._shown[row] = values
+            if entry.item_id in self.selected:
+                selection.append(self._rows[row])
+
+        if set(selection) != set(self.treeview.selection()):
+            # Tk delivers the <<TreeviewSelect>> of selection_set once idle; ignore it
+            self._syncing = True
+            self.treeview.selection_set(selection)
+            self.treeview.after_idle(self._end_sync)
+
+        if count:
+            self.scrollbar.set(self.top / count, (self.top + visible) / count)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _end_sync(self):
+        self._syncing = False
+
+    def _visible_entries(self):
+        return self.registry[self.top:self.top + len(self._rows)]
+
+    def yview(self, *args):
+        """Scrollbar command: 'moveto' fraction, or 'scroll' n 'units' / 'pages'."""
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * len(self.registry))
+        elif args[0] == 'scroll':
+            self.top += int(args[1]) * (self.height if args[2] == 'pages' else 1)
+        self.refresh()
+
+    def scroll(self, lines):
+        self.top += lines
+        self.refresh()
+        return 'break'
+
+    def see(self, item_id):
+        """Scroll so that ``item_id`` is visible."""
+        position = self.registry.position(item_id)
+        if position < self.top:
+            self.top = position
+        elif position >= self.top + self.height:
+            self.top = position - self.height + 1
+        self.refresh()
+
+    def _on_wheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS smaller deltas
+        step = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self.scroll(-3 * step)
+
+    def _on_arrow(self, direction):
+        """Move the selection with the arrow keys, scrolling past the visible rows."""
+        focus = self.treeview.focus()
+        if focus not in self._rows:
+            return None
+        position = self.top + self._rows.index(focus) + direction
+        if not 0 <= position < len(self.registry):
+            return 'break'
+        entry = self.registry[position]
+        self.selected = {entry.item_id}
+        self.see(entry.item_id)
+        row = self._rows[position - self.top]
+        self.treeview.focus(row)
+        return 'break'
+
+    def _on_click(self, event):
+        # Shift (0x1) and Control (0x4) clicks add to the selection
+        self._replace_selection = not event.state & 0x5
+
+    def _on_select(self, event):
+        if self._syncing:
+            return
+        chosen = set(self.treeview.selection())
+        visible = {
+            entry.item_id: self._rows[row] for row, entry in enumerate(self._visible_entries())
+        }
+        if self._replace_selection:
+            self.selected = set()
+            self._replace_selection = False
+        for item_id, row in visible.items():
+            if row in chosen:
+                self.selected.add(item_id)
+            else:
+                self.selected.discard(item_id)
+
+    def selection(self):
+        """Item IDs of the selected files, in list order."""
+        self.selected = {item_id for item_id in self.selected if self.registry.get(item_id) is not None}
+        return sorted(self.selected, key=self.registry.position)
@@ -0,0 +1,205 @@
+"""Memory-mapped inputs for uncompressed WAV and AIFF files.
+
+pydub decodes every input through ffmpeg and keeps the samples in memory,
+which for a plain PCM file means reading and copying all of it before any
+work starts. Uncompressed WAV (including WAVE_FORMAT_EXTENSIBLE and RF64)
+and AIFF/AIFC files only need their header parsed: open_pcm_file maps their
+sample data as a NumPy array in place, which takes the same few
+milliseconds for any length of file, and every process that maps the same
+file shares its pages through the OS page cache. Samples are converted to
+float only as they are read.
+
+Other files (compressed, floating point, or with a header this module does
+not understand) make open_pcm_file return None, and callers decode them with
+pydub as before.
+
+This module only needs NumPy.
+"""
+import os
+import struct
+
+import numpy as np
+
+# Same scale as soundladder_export.PCM_FULL_SCALE; 24-bit samples are read into the top of an int32
+PCM_SCALE = {1: 128.0, 2: 32768.0, 3: 2147483648.0, 4: 2147483648.0}
+
+# Frames converted to float at a time, so 24-bit unpacking needs little scratch memory
+READ_BLOCK_FRAMES = 1 << 18
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+class PcmFile:
+    """The sample data of an uncompressed WAV or AIFF file, memory-mapped.
+
+    Stands in for both the pydub AudioSegment of the input (frame_rate,
+    channels, sample_width, frame_count()) and a SpooledInput of it
+    (sample_rate, length, read(), descriptor(), close()), so the in-memory
+    and the streaming renderers read it alike. ``sample_width`` is that of
+    the file, 1 to 4 bytes; ``byteorder`` is '<' or '>'. 8-bit WAV samples
+    are unsigned, 8-bit AIFF samples signed.
+    """
+    def __init__(self, path, sample_rate, channels, sample_width, offset, length, byteorder='<'):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.offset = offset
+        self.length = length
+        self.byteorder = byteorder
+        self.nbytes = length * channels * sample_width
+        if sample_width == 1:
+            dtype = np.uint8 if byteorder == '<' else np.int8
+        elif sample_width == 3:
+            dtype = np.uint8
+        else:
+            dtype = f'{byteorder}i{sample_width}'
+        shape = (length, channels, 3) if sample_width == 3 else (length, channels)
+        if length:
+            self.samples = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+        else:
+            self.samples = np.zeros(shape, dtype=dtype)
+
+    @property
+    def frame_rate(self):
+        return self.sample_rate
+
+    def frame_count(self):
+        return self.length
+
+    def read(self, start, stop, out=None):
+        """Return frames [start, stop) as float32 shaped (channels, stop - start), zero outside the file."""
+        if out is None:
+            out = np.empty((self.channels, max(stop - start, 0)), dtype=np.float32)
+        scale = np.float32(1.0 / PCM_SCALE[self.sample_width])
+        first, last = max(start, 0), max(min(stop, self.length), 0)
+        out[:, :max(first - start, 0)] = 0
+        out[:, max(last - start, first - start):] = 0
+        for block in range(first, last, READ_BLOCK_FRAMES):
+            end = min(block + READ_BLOCK_FRAMES, last)
+            pcm = self.samples[block:end]
+            if self.sample_width == 3:
+                unpacked = np.zeros(pcm.shape[:2] + (4,), dtype=np.uint8)
+                unpacked[..., 1:] = pcm if self.byteorder == '<' else pcm[..., ::-1]
+                pcm = unpacked.view('<i4')[..., 0]
+            elif self.sample_width == 1 and self.byteorder == '<':
+                pcm = pcm.astype(np.int16) - 128
+            np.multiply(pcm.T, scale, out=out[:, block - start:end - start], casting='unsafe')
+        return out
+
+    def to_samples(self, out=None):
+        """The whole file as float32 shaped (channels, n), into ``out`` if given."""
+        return self.read(0, self.length, out)
+
+    def update_hash(self, digest):
+        """Feed the samples to ``digest`` as read() returns them, interleaved, a block at a time."""
+        out = np.empty((self.channels, min(self.length, READ_BLOCK_FRAMES)), dtype=np.float32)
+        for block in range(0, self.length, READ_BLOCK_FRAMES):
+            end = min(block + READ_BLOCK_FRAMES, self.length)
+            samples = self.read(block, end, out[:, :end - block])
+            digest.update(np.ascontiguousarray(samples.T))
+
+    def descriptor(self):
+        """Picklable description that worker processes open with from_descriptor."""
+        return (self.path, self.sample_rate, self.channels, self.sample_width, self.offset, self.length, self.byteorder)
+
+    @classmethod
+    def from_descriptor(cls, descriptor):
+        return cls(*descriptor)
+
+    def close(self):
+        # Drops the mapping; the file itself belongs to the user
+        self.samples = None
+
+def open_pcm_file(path):
+    """Map ``path`` if it is an uncompressed PCM WAV or AIFF file, else return None."""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(12)
+            if len(header) < 12:
+                return None
+            if header[:4] in (b'RIFF', b'RF64') and header[8:12] == b'WAVE':
+                layout = _wav_layout(f, header[:4] == b'RF64')
+            elif header[:4] == b'FORM' and header[8:12] in (b'AIFF', b'AIFC'):
+                layout = _aiff_layout(f, header[8:12] == b'AIFC')
+            else:
+                return None
+        if layout is None:
+            return None
+        sample_rate, channels, sample_width, offset, data_bytes, byteorder = layout
+        if sample_rate <= 0 or channels <= 0 or sample_width not in PCM_SCALE:
+            return None
+        # A truncated file keeps the frames it has, as ffmpeg would decode them
+        data_bytes = min(data_bytes, max(os.path.getsize(path) - offset, 0))
+        length = data_bytes // (channels * sample_width)
+        return PcmFile(path, sample_rate, channels, sample_width, offset, length, byteorder)
+    except (OSError, ValueError, struct.error):
+        return None
+
+def _chunks(f, byteorder):
+    """Yield (id, size, data offset) of the chunks after the 12-byte header."""
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        chunk_id, size = struct.unpack(f'{byteorder}4sI', header)
+        start = f.tell()
+        yield chunk_id, size, start
+        # Chunks are padded to an even size
+        f.seek(start + size + (size & 1))
+
+def _wav_layout(f, rf64):
+    fmt = None
+    data_size = None
+    for chunk_id, size, start in _chunks(f, '<'):
+        if chunk_id == b'ds64':
+            _, data_size = struct.unpack('<QQ', f.read(16))
+        elif chunk_id == b'fmt ':
+            fmt = f.read(min(size, 40))
+        elif chunk_id == b'data':
+            if fmt is None or len(fmt) < 16:
+                return None
+            tag, channels, sample_rate, _, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+            if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                tag = struct.unpack('<H', fmt[24:26])[0]
+            if tag != WAVE_FORMAT_PCM or bits % 8 or block_align != channels * bits // 8:
+                return None
+            if not rf64 or size != 0xFFFFFFFF:
+                data_size = size
+            if data_size is None:
+                return None
+            return sample_rate, channels, bits // 8, start, data_size, '<'
+    return None
+
+def _extended_float(data):
+    """Decode the 80-bit IEEE extended float AIFF stores the sample rate in."""
+    exponent, mantissa = struct.unpack('>HQ', data)
+    sign = -1 if exponent & 0x8000 else 1
+    exponent &= 0x7FFF
+    if exponent == 0 and mantissa == 0:
+        return 0.0
+    return sign * mantissa * 2.0 ** (exponent - 16383 - 63)
+
+def _aiff_layout(f, aifc):
+    comm = None
+    for chunk_id, size, start in _chunks(f, '>'):
+        if chunk_id == b'COMM':
+            comm = f.read(min(size, 22))
+        elif chunk_id == b'SSND':
+            if comm is None or len(comm) < 18:
+                return None
+            channels, frames, bits = struct.unpack('>hIh', comm[:8])
+            sample_rate = _extended_float(comm[8:18])
+            byteorder = '>'
+            if aifc and bits != 8:
+                compression = comm[18:22]
+                if compression == b'sowt':
+                    byteorder = '<'
+                elif compression != b'NONE':
+                    return None
+            if bits <= 0 or bits % 8 or sample_rate != int(sample_rate):
+                return None
+            offset, _ = struct.unpack('>II', f.read(8))
+            data_size = min(frames * channels * (bits // 8), size - 8 - offset)
+            return int(sample_rate), channels, bits // 8, start + 8 + offset, data_size, byteorder
+    return None
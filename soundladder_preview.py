@@ -0,0 +1,182 @@
+"""Low-latency previews of single rungs.
+
+A preview used to decode the input and detect its pitch again, render the
+whole rung, write preview.wav to the working directory and open it in an
+external player. Here the decoded input and its pitch come from the engine's
+input cache, and only a PREVIEW_SECONDS excerpt (the loudest part of the
+input) is analyzed. That analysis is kept in a small cache, so previewing any
+rung of the ladder only renders the excerpt (shortened for rungs shifted far
+up), which takes tens of milliseconds.
+
+Previews play from memory with sounddevice when it is installed, or with
+winsound on Windows. Otherwise the excerpt is written to a temporary file
+and opened with the system's player, as before.
+"""
+import io
+import os
+import sys
+import wave
+import logging
+import tempfile
+import threading
+import subprocess
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import sounddevice
+except ImportError:
+    sounddevice = None
+
+try:
+    import winsound
+except ImportError:
+    winsound = None
+
+from soundladder_engine import (
+    DEFAULT_DETECTOR,
+    DEFAULT_ENGINE,
+    DEFAULT_QUALITY,
+    detect_pitch,
+    frequency_to_midi_note,
+    ladder_renderer,
+    load_sound,
+    loudest_window,
+    sound_to_samples
+)
+from soundladder_export import PcmEncoder
+
+logger = logging.getLogger(__name__)
+
+# Length of the excerpt that previews render
+PREVIEW_SECONDS = 3.0
+
+# The phase vocoder stretches the excerpt by 2 ** (semitones / 12) before
+# resampling, so rungs shifted far up preview a shorter excerpt, keeping the stretched
+# audio under PREVIEW_WORK_SECONDS and every preview quick to start
+PREVIEW_WORK_SECONDS = 8.0
+PREVIEW_MIN_SECONDS = 0.25
+
+# Fade in and out of the excerpt, so it does not start or stop with a click
+PREVIEW_FADE_SECONDS = 0.01
+
+# Excerpt analyses kept, one per input, detector, quality profile and engine
+PREVIEW_CACHE_SIZE = 8
+
+class PreviewCache:
+    """Excerpt analyses of recently previewed inputs.
+
+    Entries are keyed by the input's path, modification time and size, the
+    detector, the quality profile and the engine, so changing any of them
+    analyzes the input again. Previews ignore the target duration.
+    """
+    def __init__(self, max_entries=PREVIEW_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def excerpt(self, input_file, detector=DEFAULT_DETECTOR, quality=DEFAULT_QUALITY, engine=DEFAULT_ENGINE):
+        """Return the renderer (see ladder_renderer) of the excerpt of ``input_file`` and the input's MIDI note."""
+        stat = os.stat(input_file)
+        key = (os.path.abspath(input_file), stat.st_mtime_ns, stat.st_size, detector, quality, engine)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        sound = load_sound(input_file)
+        frequency = detect_pitch(input_file, detector)
+        input_note = frequency_to_midi_note(frequency)
+        samples = sound_to_samples(sound)
+        start, stop = loudest_window(samples.mean(axis=0), sound.frame_rate, PREVIEW_SECONDS)
+        analysis = ladder_renderer(
+            np.ascontiguousarray(samples[:, start:stop]), sound.frame_rate, {'quality': quality, 'engine': engine}, frequency
+        )
+
+        entry = (analysis, input_note)
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Excerpt analyses shared by every preview of this session
+preview_cache = PreviewCache()
+
+def render_preview(input_file, index, settings):
+    """Render the excerpt of rung ``index`` (0 is the lowest) of the ladder of ``input_file``.
+
+    Returns the samples, shaped (channels, n), and their sample rate.
+    """
+    analysis, input_note = preview_cache.excerpt(
+        input_file,
+        settings.get('detector', DEFAULT_DETECTOR),
+        settings.get('quality', DEFAULT_QUALITY),
+        settings.get('engine', DEFAULT_ENGINE)
+    )
+    semitones = settings['start_pitch'] - input_note + index * settings['pitch_increment']
+    logger.debug(f"Preview of rung {index + 1}: {semitones:.2f} semitones")
+
+    if settings.get('engine', DEFAULT_ENGINE) == 'vocoder':
+        seconds = min(PREVIEW_SECONDS, max(PREVIEW_MIN_SECONDS, PREVIEW_WORK_SECONDS * 2.0 ** (-semitones / 12)))
+        analysis = analysis.head(int(seconds * analysis.sample_rate))
+    shifted = analysis.render(semitones)
+    fade = min(int(PREVIEW_FADE_SECONDS * analysis.sample_rate), shifted.shape[-1] // 2)
+    if fade:
+        ramp = np.linspace(0.0, 1.0, fade, dtype=shifted.dtype)
+        shifted[:, :fade] *= ramp
+        shifted[:, -fade:] *= ramp[::-1]
+    return shifted, analysis.sample_rate
+
+def wav_bytes(samples, sample_rate):
+    """A 16-bit WAV file of ``samples``, in memory."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(samples.shape[0])
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(PcmEncoder(2).encode(samples))
+    return buffer.getvalue()
+
+class PreviewPlayer:
+    """Plays one preview at a time; a new preview stops the previous one."""
+    def play(self, samples, sample_rate):
+        self.stop()
+        if sounddevice is not None:
+            sounddevice.play(np.ascontiguousarray(samples.T), sample_rate)
+        elif winsound is not None:
+            # winsound cannot play from memory asynchronously, so play on a thread
+            data = wav_bytes(samples, sample_rate)
+            threading.Thread(target=winsound.PlaySound, args=(data, winsound.SND_MEMORY), daemon=True).start()
+        else:
+            self._play_file(wav_bytes(samples, sample_rate))
+
+    def stop(self):
+        if sounddevice is not None:
+            sounddevice.stop()
+        elif winsound is not None:
+            winsound.PlaySound(None, 0)
+
+    def _play_file(self, data):
+        path = os.path.join(tempfile.gettempdir(), 'soundladder_preview.wav')
+        with open(path, 'wb') as f:
+            f.write(data)
+        if sys.platform == "win32":
+            os.startfile(path)
+        elif sys.platform == "darwin":
+            subprocess.Popen(["open", path])
+        else:
+            subprocess.Popen(["xdg-open", path])
+
+player = PreviewPlayer()
+
+def preview_rung(input_file, index, settings):
+    """Render and start playing rung ``index`` of the ladder of ``input_file``."""
+    samples, sample_rate = render_preview(input_file, index, settings)
+    player.play(samples, sample_rate)
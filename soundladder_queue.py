@@ -0,0 +1,478 @@
+"""Distributed rendering through a shared spool directory.
+
+A coordinator splits every input of a job manifest into units of a few rungs
+each and writes them to a spool directory that every render node can reach,
+for example over NFS. Any number of workers on any number of hosts then
+claim units, render them and record them as done:
+
+    spool/
+        jobs/<job>.json        output directory and settings of a job
+        units/<unit>.json      one input of a job and a range of its rungs
+        claims/<unit>.lock     held by the worker rendering the unit
+        done/<unit>.json       written once the unit's rungs are on disk
+        failed/<unit>.json     the last error of a unit and how often it failed
+
+Claims are created with O_CREAT | O_EXCL, which is atomic on local disks and
+on NFSv3 or later, so exactly one worker wins each unit. The worker touches
+its claim every lease / 4 seconds while it renders. A claim that has not been
+touched for a whole lease belongs to a worker that crashed or lost the share:
+the next worker to find it renames it away (also atomic, so only one does)
+and renders the unit again. A claim renamed away just after another worker
+had already reclaimed the unit is recognized by its nonce and put back. Lease ages are measured with the file server's
+clock, so the clocks of the hosts need not agree. Records are written to a
+temporary file and renamed into place, so a unit is either done or not.
+
+    python soundladder_queue.py submit job.json /mnt/spool
+    python soundladder_queue.py work /mnt/spool [--workers 4]
+    python soundladder_queue.py status /mnt/spool
+
+Workers keep going until every unit of every job is done or has failed
+MAX_ATTEMPTS times. The paths in the manifest must name the same files on
+every host. Packed output needs the whole ladder in one process and is not
+supported here. Every worker links rungs it finds in its host's render cache
+instead of rendering them (--no-render-cache turns that off).
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import logging
+import argparse
+import threading
+import multiprocessing
+
+from soundladder_cli import load_manifest
+
+logger = logging.getLogger(__name__)
+
+# Rungs rendered per unit; a unit is also what a crash loses
+UNIT_RUNGS = 25
+
+# Seconds a claim stays valid without a heartbeat
+LEASE_SECONDS = 120.0
+
+# Seconds between scans while every remaining unit is claimed by others
+POLL_SECONDS = 5.0
+
+# A unit that failed this many times is left for a person to look at
+MAX_ATTEMPTS = 3
+
+def worker_name():
+    """Identifies this worker process in claims and records."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def write_json(path, data):
+    """Write ``data`` to ``path`` atomically: readers see the old file or the new one."""
+    temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(temporary, path)
+
+def read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def claim_nonce(path):
+    """The nonce of the claim at ``path``, or None if there is none (yet)."""
+    try:
+        return read_json(path).get('nonce')
+    except (OSError, ValueError):
+        return None
+
+class Claim:
+    """A unit's lock file, kept fresh by a heartbeat thread while it is held.
+
+    The claim is identified by the nonce written into its file, so a claim
+    that was reclaimed, and the unit claimed again by another worker under
+    the same path, is seen as lost rather than refreshed or removed.
+    """
+    def __init__(self, path, heartbeat, nonce):
+        self.path = path
+        self.heartbeat = heartbeat
+        self.nonce = nonce
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+
+    def held(self):
+        """True while the lock file is still this claim's."""
+        return claim_nonce(self.path) == self.nonce
+
+    def _beat(self):
+        while not self._stop.wait(self.heartbeat):
+            try:
+                if not self.held():
+                    raise FileNotFoundError(self.path)
+                os.utime(self.path)
+            except OSError:
+                # Reclaimed by another worker after missing a whole lease
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.release()
+
+    def release(self):
+        if self.lost or not self.held():
+            return
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+class WorkSpool:
+    """The job units in a spool directory, and the claims and records on them."""
+    def __init__(self, path, lease=LEASE_SECONDS):
+        self.path = path
+        self.lease = lease
+        self.name = worker_name()
+        for directory in ('jobs', 'units', 'claims', 'done', 'failed'):
+            os.makedirs(os.path.join(path, directory), exist_ok=True)
+        self._jobs = {}
+
+    def _file(self, directory, name, extension='.json'):
+        return os.path.join(self.path, directory, name + extension)
+
+    def _names(self, directory, extension='.json'):
+        return {
+            name[:-len(extension)] for name in os.listdir(os.path.join(self.path, directory))
+            if name.endswith(extension)
+        }
+
+    def now(self):
+        """The file server's current time, from the mtime of a file touched now."""
+        clock = os.path.join(self.path, 'clock')
+        with open(clock, 'a'):
+            pass
+        os.utime(clock)
+        return os.stat(clock).st_mtime
+
+    def submit(self, job, unit_rungs=UNIT_RUNGS):
+        """Split a job manifest (from load_manifest) into units; returns (job id, unit count)."""
+        if job['output_format'] == "packed":
+            raise ValueError("Packed output cannot be split across workers")
+        job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        settings = {
+            key: value for key, value in job.items()
+            if key not in ('inputs', 'output_dir', 'workers')
+        }
+        write_json(self._file('jobs', job_id), {
+            'id': job_id,
+            'output_dir': job['output_dir'],
+            'inputs': job['inputs'],
+            'settings': settings,
+            'submitted_by': self.name
+        })
+
+        count = 0
+        for index, input_file in enumerate(job['inputs']):
+            for start in range(0, settings['num_files'], unit_rungs):
+                unit_id = f"{job_id}-{index:06d}-{start:06d}"
+                write_json(self._file('units', unit_id), {
+                    'job': job_id,
+                    'index': index,
+                    'input': input_file,
+                    'start': start,
+                    'stop': min(start + unit_rungs, settings['num_files'])
+                })
+                count += 1
+        return job_id, count
+
+    def job(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self._jobs[job_id] = read_json(self._file('jobs', job_id))
+        return job
+
+    def unit(self, unit_id):
+        return read_json(self._file('units', unit_id))
+
+    def attempts(self, unit_id):
+        try:
+            return read_json(self._file('failed', unit_id))['attempts']
+        except FileNotFoundError:
+            return 0
+
+    def exhausted(self):
+        """Units that failed MAX_ATTEMPTS times, which workers no longer claim."""
+        return {unit_id for unit_id in self._names('failed') if self.attempts(unit_id) >= MAX_ATTEMPTS}
+
+    def status(self):
+        """Per job: counts of its units that are done, claimed, failed and pending."""
+        units = self._names('units')
+        done = self._names('done')
+        claimed = self._names('claims', '.lock')
+        failed = self.exhausted() - done
+
+        jobs = {}
+        for unit_id in units:
+            job_id = unit_id.rsplit('-', 2)[0]
+            counts = jobs.setdefault(job_id, dict.fromkeys(('units', 'done', 'claimed', 'failed', 'pending'), 0))
+            counts['units'] += 1
+            if unit_id in done:
+                counts['done'] += 1
+            elif unit_id in failed:
+                counts['failed'] += 1
+            elif unit_id in claimed:
+                counts['claimed'] += 1
+            else:
+                counts['pending'] += 1
+        return jobs
+
+    def _break_stale(self, unit_id):
+        """Remove the claim on ``unit_id`` if its lease ran out; True if it is gone."""
+        path = self._file('claims', unit_id, '.lock')
+        now = self.now()
+        try:
+            expired = os.stat(path)
+        except FileNotFoundError:
+            return True
+        nonce = claim_nonce(path)
+        age = now - expired.st_mtime
+        if age < self.lease:
+            return False
+
+        # Renaming is atomic, so of all the workers finding the stale claim
+        # only one moves it away; the others see it gone
+        stale = f"{path}.{uuid.uuid4().hex}.stale"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return True
+
+        # Between the stat and the rename another worker may have broken the
+        # claim and claimed the unit again, or the holder's heartbeat touched
+        # it: then the file moved is a live claim and goes back
+        if os.stat(stale).st_mtime_ns != expired.st_mtime_ns or claim_nonce(stale) != nonce:
+            self._restore(unit_id, stale, path)
+            return False
+
+        try:
+            owner = read_json(stale).get('worker')
+        except (OSError, ValueError):
+            owner = "an unknown worker"
+        os.remove(stale)
+        logger.warning(f"Reclaiming {unit_id} from {owner}, silent for {age:.0f} s")
+        return True
+
+    def _restore(self, unit_id, stale, path):
+        """Put the live claim moved to ``stale`` back at ``path``, never over another claim."""
+        try:
+            # Unlike a rename, a link fails if the path exists again
+            os.link(stale, path)
+        except FileExistsError:
+            # Its holder sees the claim lost at its next heartbeat
+            logger.warning(f"Claim on {unit_id} changed hands while it was being reclaimed")
+        except OSError:
+            os.replace(stale, path)
+            return
+        os.remove(stale)
+
+    def claim(self, unit_id):
+        """Claim ``unit_id``; returns a Claim, or None if another worker holds it."""
+        path = self._file('claims', unit_id, '.lock')
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._break_stale(unit_id):
+                    return None
+                continue
+            nonce = uuid.uuid4().hex
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'worker': self.name, 'claimed': time.time(), 'nonce': nonce}, f)
+            claim = Claim(path, self.lease / 4, nonce)
+            # The previous holder may have finished between our scan and the claim
+            if os.path.exists(self._file('done', unit_id)):
+                claim.release()
+                return None
+            return claim
+        return None
+
+    def claim_next(self):
+        """Claim the first unit that is not done; returns (unit id, Claim) or None.
+
+        None means every unit left is claimed by another worker or failed too often.
+        """
+        claimed = self._names('claims', '.lock')
+        for unit_id in sorted(self._names('units') - self._names('done') - self.exhausted()):
+            if unit_id in claimed and not self._break_stale(unit_id):
+                continue
+            claim = self.claim(unit_id)
+            if claim is not None:
+                return unit_id, claim
+        return None
+
+    def remaining(self):
+        """Units that are neither done nor failed for good."""
+        return self._names('units') - self._names('done') - self.exhausted()
+
+    def complete(self, unit_id, written, seconds):
+        write_json(self._file('done', unit_id), {
+            'worker': self.name, 'rungs': written, 'seconds': round(seconds, 3), 'finished': time.time()
+        })
+
+    def fail(self, unit_id, error):
+        write_json(self._file('failed', unit_id), {
+            'worker': self.name, 'attempts': self.attempts(unit_id) + 1, 'error': str(error), 'failed': time.time()
+        })
+
+class QueueWorker:
+    """Claims and renders units until the spool is drained.
+
+    Consecutive units of the same input reuse its decoded samples and its
+    analysis, so a worker keeps the last input it prepared.
+    """
+    def __init__(self, spool):
+        self.spool = spool
+        self._input = None  # ((job id, input index), prepare_shared_input result)
+
+    def run(self, is_cancelled=None):
+        """Work until no unit is left; returns the number of units rendered."""
+        rendered = 0
+        try:
+            while is_cancelled is None or not is_cancelled():
+                claimed = self.spool.claim_next()
+                if claimed is None:
+                    if not self.spool.remaining():
+                        break
+                    # Wait for the other workers, or for their claims to expire
+                    time.sleep(min(POLL_SECONDS, self.spool.lease / 4))
+                    continue
+
+                unit_id, claim = claimed
+                with claim:
+                    start = time.perf_counter()
+                    try:
+                        written = self.render(unit_id)
+                    except Exception as e:
+                        logger.error(f"Failed: {unit_id}: {str(e)}", exc_info=True)
+                        self.spool.fail(unit_id, e)
+                        continue
+                    if claim.lost:
+                        logger.warning(f"{unit_id} was reclaimed while rendering; recording it anyway")
+                    self.spool.complete(unit_id, written, time.perf_counter() - start)
+                rendered += 1
+                logger.info(f"{unit_id}: {written} rungs in {time.perf_counter() - start:.1f} s")
+        finally:
+            self.release()
+        return rendered
+
+    def render(self, unit_id):
+        """Render the rungs of a unit; returns the number written."""
+        # Imported here so submitting a job does not need the audio libraries
+        from soundladder_engine import fetch_cached_rungs, plan_rungs, prepare_shared_input
+
+        unit = self.spool.unit(unit_id)
+        job = self.spool.job(unit['job'])
+        settings = job['settings']
+
+        key = (unit['job'], unit['index'])
+        if self._input is None or self._input[0] != key:
+            self.release()
+            self._input = (key, prepare_shared_input(unit['input'], settings))
+        task, task_args, semitone_adjustment, _, layout = self._input[1]
+
+        os.makedirs(job['output_dir'], exist_ok=True)
+        original_filename = os.path.splitext(os.path.basename(unit['input']))[0]
+        rungs = plan_rungs(unit['input'], job['output_dir'], semitone_adjustment, settings)[unit['start']:unit['stop']]
+        missing, store = fetch_cached_rungs(unit['input'], rungs, settings, layout[2])
+        if missing:
+            task(*task_args, missing, settings, original_filename)
+            store(missing)
+        return len(rungs)
+
+    def release(self):
+        if self._input is not None:
+            _, (_, _, _, release, _) = self._input
+            self._input = None
+            release()
+
+def run_worker(spool_path, lease=LEASE_SECONDS, pitch_store=True, verbose=False, render_cache=True):
+    """Entry point of a worker process."""
+    # A no-op when the process was forked from main(), which configured logging
+    logging.basicConfig(
+        level=logging.DEBUG if verbose else logging.INFO,
+        format='%(asctime)s - %(process)d - %(levelname)s - %(message)s'
+    )
+    if pitch_store:
+        from soundladder_engine import use_pitch_store
+        use_pitch_store()
+    if render_cache:
+        from soundladder_engine import use_render_cache
+        use_render_cache()
+    return QueueWorker(WorkSpool(spool_path, lease)).run()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render sound ladders through a shared spool directory.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log debug details")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="split a job manifest into units in the spool")
+    submit.add_argument("manifest", help="path of the JSON job manifest")
+    submit.add_argument("spool", help="shared spool directory")
+    submit.add_argument("--unit-rungs", type=int, default=UNIT_RUNGS, help="rungs per unit")
+
+    work = commands.add_parser("work", help="render units until the spool is drained")
+    work.add_argument("spool", help="shared spool directory")
+    work.add_argument("--workers", type=int, default=1, help="worker processes on this host")
+    work.add_argument("--lease", type=float, default=LEASE_SECONDS, help="seconds before a silent worker's unit is reclaimed")
+    work.add_argument("--no-pitch-store", action="store_true", help="detect every pitch again and store nothing")
+    work.add_argument("--no-render-cache", action="store_true", help="render every rung and cache nothing")
+
+    status = commands.add_parser("status", help="count the units of every job")
+    status.add_argument("spool", help="shared spool directory")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - %(process)d - %(levelname)s - %(message)s'
+    )
+
+    if args.command == "submit":
+        try:
+            job = load_manifest(args.manifest)
+            if args.unit_rungs < 1:
+                raise ValueError("--unit-rungs must be at least 1")
+            job_id, count = WorkSpool(args.spool).submit(job, args.unit_rungs)
+        except ValueError as e:
+            logger.error(str(e))
+            return 2
+        print(f"Submitted {job_id}: {count} units of {len(job['inputs'])} inputs")
+        return 0
+
+    if args.command == "work":
+        if args.workers <= 1:
+            run_worker(args.spool, args.lease, not args.no_pitch_store, args.verbose, not args.no_render_cache)
+        else:
+            processes = [
+                multiprocessing.Process(
+                    target=run_worker,
+                    args=(args.spool, args.lease, not args.no_pitch_store, args.verbose, not args.no_render_cache)
+                )
+                for _ in range(args.workers)
+            ]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+    spool = WorkSpool(args.spool)
+    failed = False
+    for job_id, counts in sorted(spool.status().items()):
+        print(f"{job_id}: " + ", ".join(f"{count} {state}" for state, count in counts.items()))
+        failed = failed or counts['failed'] > 0
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
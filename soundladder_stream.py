@@ -0,0 +1,696 @@
+"""Streaming, bounded-memory rendering of long inputs.
+
+The regular engine holds the whole decoded input, its STFT and several copies
+of every rung in memory, which for an hour-long recording means gigabytes per
+rung. With a memory budget the input is instead decoded once to a float32
+spool file that is memory-mapped, and every rung is rendered block by block:
+
+* the STFT frames of the input are computed only for the output frames being
+  rendered, and the phase-vocoder phase is carried from block to block;
+* the inverse STFT overlap-adds into a few hop-sized blocks that are emitted as
+  soon as no later frame overlaps them;
+* the polyphase resampler keeps only the history its kernel needs;
+* leading and trailing silence is skipped and written back as zeros, as the
+  engine's ActiveSpanRenderer does;
+* each block is encoded as PCM and appended to the output file.
+
+Uncompressed WAV and AIFF inputs skip the spool file: they are read through
+a memory mapping of the input itself (see soundladder_pcm).
+
+Peak memory follows the budget, not the length of the input. Rungs match the
+"standard" profile of the engine: resampling always goes through the
+FilterBank (shifts rounded to the nearest cent), because a rational ratio is
+what lets block boundaries line up exactly with the resampler's output grid.
+The quality profile still picks the STFT size. The varispeed engine skips
+the phase vocoder and streams the input straight into the resampler. PSOLA
+needs the pitch track of the whole input, so it is not streamed: with a
+memory budget the "psola" engine renders with the phase vocoder.
+"""
+import os
+import wave
+import shutil
+import logging
+import itertools
+import tempfile
+import subprocess
+
+import librosa
+import numpy as np
+import scipy.fft
+import scipy.signal
+from pydub.utils import mediainfo
+
+from soundladder_engine import (
+    ACTIVE_BLOCK_SECONDS,
+    DEFAULT_DETECTOR,
+    DEFAULT_ENGINE,
+    DEFAULT_QUALITY,
+    DETECT_SAMPLE_RATE,
+    DETECT_WINDOW,
+    QUALITY_PROFILES,
+    active_span,
+    active_span_of_peaks,
+    estimate_pitch,
+    filter_bank,
+    finish_packed_ladder,
+    frequency_to_midi_note,
+    loudest_block,
+    open_packed_ladder,
+    output_sample_width,
+    plan_rungs,
+    rung_length,
+    rung_tags
+)
+from soundladder_trace import span
+from soundladder_pcm import open_pcm_file
+from soundladder_export import (
+    PCM_FULL_SCALE,
+    check_mp3_channels,
+    ffmpeg_mp3_command,
+    id3_tag,
+    lame_encoder,
+    lameenc,
+    rung_encoder,
+    unlink_output
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+# Frames read from a spool file at a time outside of rendering
+SPOOL_BLOCK_FRAMES = 1 << 18
+
+# Working bytes per STFT bin of one output frame and channel: complex128
+# spectra, magnitudes and angles of the input frames, interpolated
+# magnitudes, float32 phases, float64 increments and complex64 spectra
+STREAM_BYTES_PER_BIN = 64
+
+class SpooledInput:
+    """An input decoded once to a raw float32 file and memory-mapped.
+
+    ``samples`` is shaped (n, channels), as ffmpeg interleaves them. Only the
+    pages being read are resident, so any length of input fits. The spool
+    file is deleted by close() if this object created it. ``sample_width`` is
+    that of the original input, in bytes.
+    """
+    def __init__(self, path, sample_rate, channels, sample_width=2, owned=False):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.owned = owned
+        self.length = os.path.getsize(path) // (4 * channels)
+        if self.length:
+            self.samples = np.memmap(path, dtype=np.float32, mode='r', shape=(self.length, channels))
+        else:
+            self.samples = np.zeros((0, channels), dtype=np.float32)
+
+    @classmethod
+    def decode(cls, input_file, directory=None):
+        """Decode ``input_file`` with ffmpeg into a new spool file."""
+        info = mediainfo(input_file)
+        sample_rate = int(info['sample_rate'])
+        channels = int(info['channels'])
+        sample_width = source_sample_width(info)
+
+        fd, path = tempfile.mkstemp(prefix='soundladder_', suffix='.f32', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as spool, tempfile.TemporaryFile() as errors:
+                process = subprocess.Popen(
+                    ['ffmpeg', '-v', 'error', '-i', input_file, '-f', 'f32le', '-acodec', 'pcm_f32le', '-'],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=errors
+                )
+                with process:
+                    shutil.copyfileobj(process.stdout, spool, SPOOL_BLOCK_FRAMES * 4)
+                if process.returncode != 0:
+                    errors.seek(0)
+                    message = errors.read().decode(errors='replace').strip()
+                    raise RuntimeError(f"ffmpeg cannot decode {input_file}: {message}")
+        except BaseException:
+            os.remove(path)
+            raise
+        return cls(path, sample_rate, channels, sample_width, owned=True)
+
+    def descriptor(self):
+        """Picklable description that worker processes open with from_descriptor."""
+        return (self.path, self.sample_rate, self.channels, self.sample_width)
+
+    @classmethod
+    def from_descriptor(cls, descriptor):
+        return cls(*descriptor)
+
+    def read(self, start, stop):
+        """Return frames [start, stop) shaped (channels, stop - start), zero outside the input."""
+        out = np.zeros((self.channels, max(stop - start, 0)), dtype=np.float32)
+        first, last = max(start, 0), min(stop, self.length)
+        if last > first:
+            out[:, first - start:last - start] = self.samples[first:last].T
+        return out
+
+    def close(self):
+        # Drop the mapping first, Windows cannot delete a mapped file
+        self.samples = None
+        if self.owned:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                logger.warning(f"Cannot remove spool file {self.path}: {str(e)}")
+
+class SpanView:
+    """Frames [start, stop) of a spooled input, read like a spooled input of their own.
+
+    Frames outside the span read as silence, as they do for the samples an
+    ActiveSpanRenderer hands its renderer.
+    """
+    def __init__(self, spool, start, stop):
+        self.spool = spool
+        self.start = start
+        self.length = stop - start
+        self.sample_rate = spool.sample_rate
+        self.channels = spool.channels
+        self.sample_width = spool.sample_width
+
+    def read(self, start, stop):
+        """Return frames [start, stop) of the span shaped (channels, stop - start)."""
+        out = np.zeros((self.channels, max(stop - start, 0)), dtype=np.float32)
+        first, last = max(start, 0), min(stop, self.length)
+        if last > first:
+            out[:, first - start:last - start] = self.spool.read(self.start + first, self.start + last)
+        return out
+
+def spooled_active_span(spool):
+    """active_span of a spooled input, reading it a block at a time."""
+    block = max(1, int(ACTIVE_BLOCK_SECONDS * spool.sample_rate))
+    end = spool.length - spool.length % block
+    step = block * max(1, SPOOL_BLOCK_FRAMES // block)
+    peaks = [
+        np.abs(spool.read(start, min(start + step, end))).reshape(spool.channels, -1, block).max(axis=(0, 2))
+        for start in range(0, end, step)
+    ]
+    return active_span_of_peaks(np.concatenate(peaks) if peaks else [], spool.length, spool.sample_rate)
+
+def source_sample_width(info):
+    """Sample width in bytes of an input described by pydub's mediainfo.
+
+    Lossy codecs report no bit depth; their rungs are written as 16-bit.
+    """
+    for key in ('bits_per_raw_sample', 'bits_per_sample'):
+        bits = str(info.get(key, ''))
+        if bits.isdigit() and int(bits) // 8 in PCM_FULL_SCALE:
+            return int(bits) // 8
+    return 2
+
+def detect_spooled_pitch(spool, detector=DEFAULT_DETECTOR, window=DETECT_WINDOW):
+    """Detect the pitch of a spooled input, reading it a block at a time."""
+    sample_rate = spool.sample_rate
+
+    # Energy of 50 ms blocks of the downmix, as loudest_segment measures it
+    block = max(1, int(0.05 * sample_rate))
+    step = block * max(1, SPOOL_BLOCK_FRAMES // block)
+    energy = []
+    for start in range(0, spool.length, step):
+        mono = spool.read(start, min(start + step, spool.length)).mean(axis=0)
+        n_blocks = len(mono) // block
+        energy.append(np.square(mono[:n_blocks * block].reshape(n_blocks, block)).sum(axis=1))
+    energy = np.concatenate(energy) if energy else np.zeros(0)
+
+    window_frames = int(window * sample_rate)
+    blocks_per_window = max(1, window_frames // block)
+    if spool.length <= window_frames or len(energy) <= blocks_per_window:
+        start, stop = 0, spool.length
+    else:
+        start = loudest_block(energy, blocks_per_window) * block
+        stop = start + window_frames
+
+    mono = spool.read(start, stop).mean(axis=0)
+    start, stop = active_span(mono, sample_rate)
+    y = librosa.resample(mono[start:stop], orig_sr=sample_rate, target_sr=DETECT_SAMPLE_RATE)
+    return estimate_pitch(y, DETECT_SAMPLE_RATE, detector, window=None)
+
+def block_sizes(memory_budget, channels, n_fft):
+    """Output STFT frames per phase-vocoder block and samples per resampler block."""
+    n_bins = n_fft // 2 + 1
+    frame_bytes = channels * (n_bins * STREAM_BYTES_PER_BIN + n_fft * 8)
+    # Half the budget for each stage; the resampler keeps a few float64 copies
+    frames = max(8, memory_budget // (2 * frame_bytes))
+    samples = max(4096, memory_budget // (2 * channels * 32))
+    return int(frames), int(samples)
+
+def stretch_blocks(spool, rate, n_fft, frames_per_block):
+    """Yield the spooled input time-stretched by ``rate``, in (channels, k) blocks.
+
+    The same computation as LadderAnalysis.stretch (librosa's phase vocoder,
+    with its float32 phase accumulator, and librosa.istft), done for
+    ``frames_per_block`` output frames at a time. The blocks add up to
+    round(n / rate) samples.
+    """
+    hop = n_fft // 4
+    overlap = n_fft // hop
+    n_bins = n_fft // 2 + 1
+    channels = spool.channels
+    n_frames = 1 + spool.length // hop
+    length = int(round(spool.length / rate))
+
+    # The analysis runs in float64 and is rounded to complex64, as librosa.stft
+    # does: the float32 phase accumulator amplifies any other rounding
+    analysis_window = scipy.signal.get_window('hann', n_fft)
+    window = analysis_window.astype(np.float32)
+    window_square = np.square(window).reshape(overlap, hop)
+    phi_advance = hop * librosa.fft_frequencies(sr=2 * np.pi, n_fft=n_fft)
+    tiny = np.finfo(np.float32).tiny
+
+    time_steps = np.arange(0, n_frames, rate, dtype=np.float64)
+    phase_acc = None
+
+    # Overlap-add of the inverse STFT, in hop-sized blocks from first_block on
+    ola = np.zeros((channels, 0, hop), dtype=np.float32)
+    ola_weight = np.zeros((0, hop), dtype=np.float32)
+    first_block = 0
+    emitted = 0
+
+    for t0 in range(0, len(time_steps), frames_per_block):
+        t1 = min(t0 + frames_per_block, len(time_steps))
+        steps = time_steps[t0:t1]
+        frames = steps.astype(np.intp)
+        alpha = (steps - frames).astype(np.float32)[:, np.newaxis]
+
+        # STFT frames of the input this block interpolates between; frames past
+        # the end are zero, like the two frames librosa.phase_vocoder pads
+        first, last = frames[0], frames[-1] + 2
+        segment = spool.read(first * hop - n_fft // 2, (last - 1) * hop + n_fft // 2)
+        spectrum = scipy.fft.rfft(
+            np.lib.stride_tricks.sliding_window_view(segment, n_fft, axis=-1)[:, ::hop] * analysis_window,
+            axis=-1
+        ).astype(np.complex64)
+        spectrum[:, max(0, n_frames - first):] = 0
+        magnitude = np.abs(spectrum)
+        angle = np.angle(spectrum)
+        del spectrum
+
+        if phase_acc is None:
+            phase_acc = angle[:, 0].copy()
+
+        # Expected phase advance per bin, plus the wrapped deviation from it
+        local = frames - first
+        dphase = np.diff(angle, axis=1) - phi_advance
+        dphase -= 2.0 * np.pi * np.round(dphase / (2.0 * np.pi))
+        increment = (phi_advance + dphase)[:, local]
+        del angle, dphase
+
+        stretched_magnitude = (1.0 - alpha) * magnitude[:, local] + alpha * magnitude[:, local + 1]
+        del magnitude
+
+        # Phase of each output frame, continuing from the previous block and
+        # rounded to float32 after each frame as LadderAnalysis.stretch does
+        phase = np.empty(increment.shape, dtype=np.float32)
+        for t in range(increment.shape[1]):
+            phase[:, t] = phase_acc
+            phase_acc += increment[:, t]
+        del increment
+
+        stretched = np.empty(phase.shape, dtype=np.complex64)
+        stretched.real = stretched_magnitude * np.cos(phase)
+        stretched.imag = stretched_magnitude * np.sin(phase)
+        del stretched_magnitude, phase
+
+        output_frames = scipy.fft.irfft(stretched, n=n_fft, axis=-1) * window
+        output_frames = output_frames.reshape(channels, t1 - t0, overlap, hop)
+        del stretched
+
+        # Overlap-add: frame t covers hop blocks t .. t + overlap - 1
+        needed = t1 + overlap - 1 - first_block
+        if ola.shape[1] < needed:
+            grow = needed - ola.shape[1]
+            ola = np.concatenate([ola, np.zeros((channels, grow, hop), dtype=np.float32)], axis=1)
+            ola_weight = np.concatenate([ola_weight, np.zeros((grow, hop), dtype=np.float32)])
+        for q in range(overlap):
+            ola[:, t0 + q - first_block:t1 + q - first_block] += output_frames[:, :, q]
+            ola_weight[t0 + q - first_block:t1 + q - first_block] += window_square[q]
+        del output_frames
+
+        # Blocks before t1 get no more frames (all of them after the last frame)
+        complete = ola.shape[1] if t1 == len(time_steps) else t1 - first_block
+        y = ola[:, :complete].reshape(channels, -1)
+        weight = ola_weight[:complete].reshape(-1)
+        y = np.where(weight > tiny, y / np.where(weight > tiny, weight, 1.0), y)
+        position = first_block * hop
+        ola = ola[:, complete:]
+        ola_weight = ola_weight[complete:]
+        first_block += complete
+
+        # Drop the centering padding and everything past the stretched length
+        begin = max(emitted + n_fft // 2 - position, 0)
+        end = min(length + n_fft // 2 - position, y.shape[1])
+        if end > begin:
+            yield y[:, begin:end]
+            emitted += end - begin
+
+    if emitted < length:
+        yield np.zeros((channels, length - emitted), dtype=np.float32)
+
+def resample_blocks(blocks, length, up, down, n_out, samples_per_block):
+    """Resample a stream of (channels, k) blocks totalling ``length`` samples by up/down.
+
+    Yields exactly ``n_out`` samples in blocks, the same as
+    FilterBank.resample followed by librosa.util.fix_length. Each output
+    block is computed with scipy.signal.upfirdn from the input samples its
+    kernel reaches, starting at a multiple of ``down`` so that the block lands
+    on the output grid of the whole signal.
+    """
+    blocks = iter(blocks)
+    buffer = next(blocks, None)
+    if buffer is None:
+        return
+
+    if up == down:
+        produced = 0
+        for block in itertools.chain([buffer], blocks):
+            block = block[:, :n_out - produced]
+            if block.shape[1]:
+                yield block
+                produced += block.shape[1]
+        if produced < n_out:
+            yield np.zeros((buffer.shape[0], n_out - produced), dtype=np.float32)
+        return
+
+    kernel = filter_bank.kernel(up, down)
+    half_len = (len(kernel) - 1) // 2
+    pre_pad = down - half_len % down
+    kernel = np.concatenate((np.zeros(pre_pad), kernel * up))
+    # resample_poly stops at ceil(length * up / down); fix_length pads zeros
+    valid = -(-length * up // down)
+
+    buffer_start = 0
+    exhausted = False
+    for m0 in range(0, n_out, samples_per_block):
+        m1 = min(m0 + samples_per_block, n_out)
+
+        # Input samples [k_min, k_max] reach outputs [m0, m1)
+        k_min = max(0, -(-(m0 * down + half_len - (len(kernel) - pre_pad - 1)) // up))
+        k_max = min(length - 1, ((m1 - 1) * down + half_len) // up)
+        start = k_min - k_min % down
+
+        while not exhausted and buffer_start + buffer.shape[1] <= k_max:
+            try:
+                block = next(blocks)
+            except StopIteration:
+                exhausted = True
+                break
+            if start > buffer_start + buffer.shape[1]:
+                # Nothing of the buffer is needed any more
+                buffer_start += buffer.shape[1]
+                buffer = block
+            else:
+                buffer = np.concatenate([buffer, block], axis=1)
+        if start > buffer_start:
+            buffer = buffer[:, start - buffer_start:]
+            buffer_start = start
+
+        out = np.zeros((buffer.shape[0], m1 - m0), dtype=np.float32)
+        segment = buffer[:, start - buffer_start:k_max + 1 - buffer_start]
+        if segment.shape[1]:
+            y = scipy.signal.upfirdn(kernel, segment, up, down, axis=-1)
+            first = m0 + (half_len + pre_pad) // down - start * up // down
+            y = y[:, first:first + (m1 - m0)]
+            out[:, :y.shape[1]] = y
+        out[:, max(valid - m0, 0):] = 0
+        yield out
+
+def silent_blocks(channels, frames, samples_per_block):
+    """Yield ``frames`` of silence in blocks of at most ``samples_per_block``."""
+    for start in range(0, frames, samples_per_block):
+        yield np.zeros((channels, min(samples_per_block, frames - start)), dtype=np.float32)
+
+def place_blocks(blocks, offset, length, channels, samples_per_block):
+    """Yield ``blocks`` after ``offset`` frames of silence, cut or padded with silence to ``length`` frames."""
+    placed = min(offset, length)
+    yield from silent_blocks(channels, placed, samples_per_block)
+    for block in blocks:
+        if placed == length:
+            break
+        block = block[:, :length - placed]
+        yield block
+        placed += block.shape[1]
+    yield from silent_blocks(channels, length - placed, samples_per_block)
+
+class WavStreamWriter:
+    """Append PCM blocks to a WAV file; the header is finished on close."""
+    def __init__(self, output_file, sample_rate, channels, sample_width=2):
+        unlink_output(output_file)
+        self._wave = wave.open(output_file, 'wb')
+        self._wave.setnchannels(channels)
+        self._wave.setsampwidth(sample_width)
+        self._wave.setframerate(sample_rate)
+
+    def write(self, pcm):
+        self._wave.writeframes(pcm)
+
+    def close(self):
+        self._wave.close()
+
+class PackedStreamWriter:
+    """Write PCM blocks into the PackedSlot ``slot`` of a packed ladder."""
+    def __init__(self, slot):
+        self._file = slot.ladder.open_rung(slot.index)
+
+    def write(self, pcm):
+        self._file.write(pcm)
+
+    def close(self):
+        self._file.close()
+
+class Mp3StreamWriter:
+    """Encode 16-bit PCM blocks to an MP3 file, with LAME in-process or an ffmpeg pipe."""
+    def __init__(self, output_file, sample_rate, channels, tags):
+        check_mp3_channels(channels)
+        self.output_file = output_file
+        unlink_output(output_file)
+        if lameenc is not None:
+            self._lame = lame_encoder(sample_rate, channels)
+            self._file = open(output_file, 'wb')
+            self._file.write(id3_tag(tags))
+            return
+
+        self._lame = None
+        self._errors = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            ffmpeg_mp3_command(output_file, sample_rate, channels, tags),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=self._errors
+        )
+
+    def write(self, pcm):
+        if self._lame is not None:
+            self._file.write(self._lame.encode(bytes(pcm)))
+        else:
+            self._process.stdin.write(pcm)
+
+    def close(self):
+        if self._lame is not None:
+            try:
+                self._file.write(self._lame.flush())
+            finally:
+                self._file.close()
+            return
+
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        self._process.wait()
+        self._errors.seek(0)
+        message = self._errors.read().decode(errors='replace').strip()
+        self._errors.close()
+        if self._process.returncode != 0:
+            raise RuntimeError(f"ffmpeg cannot encode {self.output_file}: {message}")
+
+def open_stream_writer(output_file, output_format, sample_rate, channels, tags, sample_width=2):
+    """Open an incremental writer for one rung; MP3 is always fed 16-bit PCM."""
+    if output_format == "mp3":
+        return Mp3StreamWriter(output_file, sample_rate, channels, tags)
+    if output_format == "packed":
+        return PackedStreamWriter(output_file)
+    return WavStreamWriter(output_file, sample_rate, channels, sample_width)
+
+def render_streaming_rung(spool, semitones, output_file, output_format, tags,
+                          quality=DEFAULT_QUALITY, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB,
+                          encoder=None, engine=DEFAULT_ENGINE, target_duration=0.0, active_range=None):
+    """Shift a spooled input by ``semitones`` and write it to ``output_file`` block by block.
+
+    ``encoder`` is the rung_encoder of the output, by default one for the
+    input's sample width. With the "varispeed" engine the input is only
+    resampled, and ``target_duration`` trims or pads the rung.
+    ``active_range`` is the (start, stop) of the input's active part, from
+    spooled_active_span: only that part is rendered, laid into silence as
+    ActiveSpanRenderer lays it.
+    """
+    if quality not in QUALITY_PROFILES:
+        raise ValueError(f"Unknown quality profile: {quality}")
+    n_fft = QUALITY_PROFILES[quality]['n_fft']
+    frames_per_block, samples_per_block = block_sizes(
+        memory_budget_mb * 1024 * 1024, spool.channels, n_fft
+    )
+
+    start, stop = active_range or (0, spool.length)
+    source = spool if stop - start == spool.length else SpanView(spool, start, stop)
+
+    up, down = filter_bank.ratio(semitones)
+    n_out = rung_length(spool.length, spool.sample_rate, semitones, engine, target_duration)
+    if engine == 'varispeed':
+        # Leading silence keeps its length scaled by the ratio, as a tape plays it
+        offset = (start * up + down // 2) // down
+        n_active = min(rung_length(source.length, spool.sample_rate, semitones, engine), max(n_out - offset, 0))
+        blocks = (
+            source.read(block, min(block + samples_per_block, source.length))
+            for block in range(0, source.length, samples_per_block)
+        )
+        active = resample_blocks(blocks, source.length, up, down, n_active, samples_per_block)
+    else:
+        # Stretch by exactly the ratio the bank resamples with
+        offset = start
+        rate = up / down
+        stretched = stretch_blocks(source, rate, n_fft, frames_per_block)
+        active = resample_blocks(
+            stretched, int(round(source.length / rate)), up, down, source.length, samples_per_block
+        )
+    shifted = place_blocks(active, offset, n_out, spool.channels, samples_per_block)
+
+    if encoder is None:
+        encoder = rung_encoder(output_format, spool.sample_width)
+    writer = open_stream_writer(
+        output_file, output_format, spool.sample_rate, spool.channels, tags, encoder.sample_width
+    )
+    try:
+        for block in shifted:
+            writer.write(encoder.encode(block))
+    finally:
+        writer.close()
+
+def render_spooled_rungs(spool, rungs, settings, original_filename, is_cancelled=None, on_rung=None):
+    """Render ``rungs`` of a spooled input; returns the number written."""
+    encoder = rung_encoder(settings['output_format'], output_sample_width(settings, spool.sample_width))
+    active_range = spooled_active_span(spool)
+    start, stop = active_range
+    if stop - start < spool.length:
+        logger.debug(
+            f"Active span: {start / spool.sample_rate:.2f}-{stop / spool.sample_rate:.2f} s "
+            f"of {spool.length / spool.sample_rate:.2f} s"
+        )
+    written = 0
+    for i, semitones, output_file in rungs:
+        if is_cancelled is not None and is_cancelled():
+            break
+        if on_rung is not None:
+            on_rung(i)
+        with span('rung', file=original_filename, index=i, semitones=semitones):
+            render_streaming_rung(
+                spool,
+                semitones,
+                output_file,
+                settings['output_format'],
+                rung_tags(original_filename, i, semitones),
+                settings.get('quality', DEFAULT_QUALITY),
+                settings.get('memory_budget_mb') or DEFAULT_MEMORY_BUDGET_MB,
+                encoder,
+                settings.get('engine', DEFAULT_ENGINE),
+                settings.get('target_duration', 0.0),
+                active_range
+            )
+        written += 1
+    return written
+
+def analyze_spooled_input(input_file, start_pitch, detector=DEFAULT_DETECTOR):
+    """Spool ``input_file`` and find the shift that brings it to ``start_pitch``.
+
+    Uncompressed WAV and AIFF inputs are read through a PcmFile mapping of
+    the input itself instead of a spool file. Returns the SpooledInput or
+    PcmFile, which the caller must close, and the semitone adjustment.
+    """
+    with span('decode', file=os.path.basename(input_file)):
+        spool = open_pcm_file(input_file) or SpooledInput.decode(input_file)
+    try:
+        with span('detect', detector=detector):
+            input_freq = detect_spooled_pitch(spool, detector)
+    except BaseException:
+        spool.close()
+        raise
+    input_note = frequency_to_midi_note(input_freq)
+    semitone_adjustment = start_pitch - input_note
+
+    logger.debug(f"Input frequency: {input_freq:.2f} Hz")
+    logger.debug(f"Input MIDI note: {input_note:.1f}")
+    logger.debug(f"Adjustment needed: {semitone_adjustment:.1f} semitones")
+
+    return spool, semitone_adjustment
+
+def generate_ladder_streaming(input_file, output_dir, settings, on_status, is_cancelled):
+    """generate_ladder with bounded memory; called by it when a memory budget is set."""
+    try:
+        on_status('ANALYZING')
+
+        original_filename = os.path.splitext(os.path.basename(input_file))[0]
+        spool, semitone_adjustment = analyze_spooled_input(
+            input_file, settings['start_pitch'], settings.get('detector', DEFAULT_DETECTOR)
+        )
+        try:
+            logger.debug(f"Streaming {spool.length} frames with a budget of {settings['memory_budget_mb']} MB")
+            if settings.get('engine') == 'psola':
+                logger.info("PSOLA is not streamed, rendering with the phase vocoder")
+            os.makedirs(output_dir, exist_ok=True)
+            packed = open_packed_ladder(
+                input_file, output_dir, settings, spooled_layout(spool, settings), semitone_adjustment
+            )
+
+            rungs = plan_rungs(input_file, output_dir, semitone_adjustment, settings, packed)
+            written = render_spooled_rungs(
+                spool,
+                rungs,
+                settings,
+                original_filename,
+                is_cancelled=is_cancelled,
+                on_rung=lambda i: on_status('CONVERTING', int((i + 1) / len(rungs) * 100))
+            )
+        finally:
+            spool.close()
+
+        if written < len(rungs):
+            on_status('CANCELLED')
+            return False
+        finish_packed_ladder(packed, rungs, settings)
+        on_status('COMPLETED', 100)
+        return True
+    except Exception as e:
+        logger.error(f"Error in generate_ladder: {str(e)}", exc_info=True)
+        on_status('ERROR')
+        raise
+
+def prepare_spooled_input(input_file, settings):
+    """prepare_shared_input for a memory budget: workers read a shared spool file."""
+    if settings.get('engine') == 'psola':
+        logger.info("PSOLA is not streamed, rendering with the phase vocoder")
+    spool, semitone_adjustment = analyze_spooled_input(
+        input_file, settings['start_pitch'], settings.get('detector', DEFAULT_DETECTOR)
+    )
+    return (
+        render_spooled_chunk, (type(spool), spool.descriptor()), semitone_adjustment, spool.close,
+        spooled_layout(spool, settings)
+    )
+
+def spooled_layout(spool, settings):
+    """(sample_rate, channels, sample_width, frames) of the rungs of a spooled input."""
+    return (spool.sample_rate, spool.channels, output_sample_width(settings, spool.sample_width), spool.length)
+
+def render_spooled_chunk(source, descriptor, rungs, settings, original_filename):
+    """Pool task: render and export ``rungs`` of a spooled input.
+
+    ``source`` is the class of the input, SpooledInput or PcmFile.
+    """
+    spool = source.from_descriptor(descriptor)
+    try:
+        return render_spooled_rungs(spool, rungs, settings, original_filename)
+    finally:
+        spool.close()
@@ -0,0 +1,92 @@
+"""Shared fixtures of the test suite.
+
+The persistent caches go to a temporary directory, set before the engine is
+imported because the filter bank opens its cache at import time. Inputs are
+synthetic WAV files written with the wave module, which pydub reads without
+ffmpeg.
+"""
+import os
+import struct
+import sys
+import wave
+import tempfile
+
+os.environ['SOUNDLADDER_CACHE_DIR'] = tempfile.mkdtemp(prefix='soundladder_tests_')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+from soundladder_export import PcmEncoder
+
+SAMPLE_RATE = 22050
+
+def sung_note(seconds=1.0, frequency=220.0, channels=2, sample_rate=SAMPLE_RATE, seed=0):
+    """A vibrato tone with a few harmonics and a little noise, shaped (channels, n)."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    phase = 2 * np.pi * frequency * (t + 0.002 * np.sin(2 * np.pi * 5 * t))
+    tone = sum(0.3 / k * np.sin(k * phase) for k in range(1, 5))
+    return np.stack([
+        (tone * (1.0 - 0.2 * c) + 0.005 * rng.standard_normal(len(t))).astype(np.float32)
+        for c in range(channels)
+    ])
+
+def write_wav(path, samples, sample_rate=SAMPLE_RATE, sample_width=2):
+    """Write (channels, n) float samples as PCM; 8-bit WAV is unsigned."""
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(samples.shape[0])
+        f.setsampwidth(sample_width)
+        f.setframerate(sample_rate)
+        f.writeframes(PcmEncoder(sample_width, unsigned=sample_width == 1).encode(samples))
+    return str(path)
+
+@pytest.fixture
+def note_wav(tmp_path):
+    """A one-second stereo 16-bit input with silence either side."""
+    samples = sung_note()
+    silence = np.zeros((2, SAMPLE_RATE // 2), dtype=np.float32)
+    return write_wav(tmp_path / 'note.wav', np.concatenate([silence, samples, silence], axis=1))
+
+@pytest.fixture
+def settings():
+    return {
+        'start_pitch': 60.0,
+        'pitch_increment': 1.0,
+        'num_files': 4,
+        'output_format': 'wav',
+        'bit_depth': 0,
+        'detector': 'yin',
+        'quality': 'standard',
+        'engine': 'vocoder',
+        'target_duration': 0.0,
+        'memory_budget_mb': 0
+    }
+
+@pytest.fixture(autouse=True)
+def fresh_session():
+    """Forget decoded inputs and the render cache between tests."""
+    import soundladder_engine
+    soundladder_engine.input_cache.clear()
+    soundladder_engine.input_cache.store = None
+    soundladder_engine.render_cache = None
+    yield
+    soundladder_engine.input_cache.clear()
+    soundladder_engine.render_cache = None
+
+def _extended_float(value):
+    """The 80-bit IEEE extended float of a positive integer, as AIFF stores sample rates."""
+    shift = value.bit_length() - 1
+    return struct.pack('>HQ', 16383 + shift, value << (63 - shift))
+
+def write_aiff(path, samples, sample_rate=SAMPLE_RATE, sample_width=2):
+    """Write (channels, n) float samples as big-endian, signed AIFF PCM."""
+    pcm = np.frombuffer(bytes(PcmEncoder(sample_width).encode(samples)), dtype=np.uint8)
+    pcm = pcm.reshape(-1, sample_width)[:, ::-1].tobytes()
+    channels, frames = samples.shape
+    comm = struct.pack('>hIh', channels, frames, sample_width * 8) + _extended_float(sample_rate)
+    ssnd = struct.pack('>II', 0, 0) + pcm
+    body = b'AIFF' + b'COMM' + struct.pack('>I', len(comm)) + comm + b'SSND' + struct.pack('>I', len(ssnd)) + ssnd
+    with open(path, 'wb') as f:
+        f.write(b'FORM' + struct.pack('>I', len(body)) + body)
+    return str(path)
@@ -0,0 +1,49 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import soundladder_cli
+from soundladder_constants import DEFAULT_QUALITY, QUALITY_PROFILES
+from soundladder_engine import generate_batch
+
+def read_outputs(directory):
+    return {name: open(os.path.join(directory, name), 'rb').read() for name in sorted(os.listdir(directory))}
+
+@pytest.mark.parametrize('engine', ['vocoder', 'varispeed'])
+def test_parallel_matches_serial(tmp_path, note_wav, settings, engine):
+    settings['engine'] = engine
+    serial, parallel = tmp_path / 'serial', tmp_path / 'parallel'
+    serial.mkdir()
+    parallel.mkdir()
+    assert generate_batch([note_wav], str(serial), settings, workers=1) == []
+    assert generate_batch([note_wav], str(parallel), settings, workers=2) == []
+    outputs = read_outputs(serial)
+    assert len(outputs) == settings['num_files']
+    assert read_outputs(parallel) == outputs
+
+def test_manifest_defaults_and_choices(tmp_path):
+    path = tmp_path / 'job.json'
+    path.write_text(json.dumps({'inputs': ['a.wav'], 'output_dir': 'out'}))
+    job = soundladder_cli.load_manifest(str(path))
+    assert job['quality'] == DEFAULT_QUALITY
+
+    path.write_text(json.dumps({'inputs': ['a.wav'], 'output_dir': 'out', 'quality': 'lofi'}))
+    with pytest.raises(ValueError, match=', '.join(QUALITY_PROFILES)):
+        soundladder_cli.load_manifest(str(path))
+
+def test_cli_runs_a_job_without_tkinter(tmp_path, note_wav):
+    path = tmp_path / 'job.json'
+    path.write_text(json.dumps({
+        'inputs': [note_wav], 'output_dir': str(tmp_path / 'out'), 'num_files': 2, 'quality': 'standard'
+    }))
+    script = (
+        "import sys, soundladder_cli\n"
+        f"code = soundladder_cli.main([{str(path)!r}, '--no-pitch-store', '--no-render-cache'])\n"
+        "sys.exit(3 if 'tkinter' in sys.modules else code)\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True).returncode == 0
+    assert sorted(os.listdir(tmp_path / 'out')) == ['note_sound_001.wav', 'note_sound_002.wav']
@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+
+import soundladder_engine
+from soundladder_cache import MB, RenderCache
+from soundladder_engine import generate_batch, render_key, use_render_cache
+
+def write_file(path, size):
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+    return str(path)
+
+def test_hit_miss_and_eviction(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=2500)
+    outputs = tmp_path / 'out'
+    outputs.mkdir()
+    files = {key: write_file(outputs / f'{key}.wav', 1000) for key in ('aa1', 'bb2', 'cc3')}
+
+    cache.put([('aa1', files['aa1']), ('bb2', files['bb2'])])
+    assert cache.fetch([('aa1', str(tmp_path / 'a.wav')), ('cc3', str(tmp_path / 'c.wav'))]) == {str(tmp_path / 'a.wav')}
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert open(tmp_path / 'a.wav', 'rb').read() == open(files['aa1'], 'rb').read()
+
+    # aa1 was used last, so the third file evicts bb2
+    cache.put([('cc3', files['cc3'])])
+    assert cache.stats()['entries'] == 2
+    assert cache.fetch([('bb2', str(tmp_path / 'b.wav'))]) == set()
+    assert len(cache.fetch([('aa1', str(tmp_path / 'a.wav')), ('cc3', str(tmp_path / 'c.wav'))])) == 2
+
+    # A lower limit applies as soon as the cache is opened
+    assert RenderCache(str(tmp_path / 'cache'), max_bytes=1500).stats()['entries'] == 1
+
+def test_stats_in_mebibytes(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=1024 * MB)
+    assert cache.format_stats().endswith("0.0 MB of 1024 MB")
+
+def test_key_ignores_float32_rounding(settings):
+    frequency = 261.6255653005986
+    semitones = 60.0 - soundladder_engine.frequency_to_midi_note(frequency)
+    key = render_key('input', frequency, semitones, settings, 2)
+    assert render_key('input', np.float32(frequency), np.float32(semitones), settings, 2) == key
+    assert render_key('input', frequency, semitones + 0.01, settings, 2) != key
+
+def test_overlapping_ladder_served_from_cache(tmp_path, note_wav, settings):
+    cache = use_render_cache(str(tmp_path / 'cache'))
+    assert generate_batch([note_wav], str(tmp_path / 'first'), settings) == []
+    assert (cache.hits, cache.misses) == (0, 4)
+
+    # Same input and pitches, two more rungs, another directory
+    soundladder_engine.input_cache.clear()
+    settings['num_files'] = 6
+    assert generate_batch([note_wav], str(tmp_path / 'second'), settings) == []
+    assert (cache.hits, cache.misses) == (4, 6)
+    for i in range(1, 5):
+        name = f'note_sound_{i:03d}.wav'
+        assert open(tmp_path / 'second' / name, 'rb').read() == open(tmp_path / 'first' / name, 'rb').read()
+
+def test_filter_bank_files_evicted_beyond_budget(tmp_path):
+    from soundladder_engine import FilterBank
+    directory = tmp_path / 'bank'
+    FilterBank(str(directory)).kernel(1, 3)
+    size = (directory / os.listdir(directory)[0]).stat().st_size
+
+    bank = FilterBank(str(directory), disk_bytes=2 * size)
+    bank.kernel(2, 3)
+    # Date the files apart, then load the older one again in a new session
+    for age, (up, down) in enumerate([(2, 3), (1, 3)], start=1):
+        os.utime(bank._path(up, down), ns=(0, 10 ** 18 - age * 10 ** 9))
+    FilterBank(str(directory), disk_bytes=2 * size).kernel(1, 3)
+
+    # (2, 3) was used least recently, so the third kernel evicts it
+    bank.kernel(3, 2)
+    kept = {os.path.basename(bank._path(up, down)) for up, down in [(1, 3), (3, 2)]}
+    assert set(os.listdir(directory)) == kept
@@ -0,0 +1,82 @@
+import librosa
+import numpy as np
+import pytest
+
+from conftest import sung_note
+from soundladder_engine import LADDER_TOLERANCE, QUALITY_PROFILES, LadderAnalysis, PsolaRenderer, estimate_pitch, ladder_renderer
+
+@pytest.mark.parametrize('quality', ['draft', 'mastering'])
+@pytest.mark.parametrize('seconds', [2, 10])
+def test_ladder_matches_librosa_pitch_shift(quality, seconds):
+    if QUALITY_PROFILES[quality]['res_type'] == 'kaiser_best':
+        pytest.importorskip('resampy')
+    samples = sung_note(seconds, sample_rate=44100)
+    analysis = LadderAnalysis(samples, 44100, quality)
+    for semitones in (-7, 3.5, 12):
+        expected = librosa.effects.pitch_shift(
+            samples, sr=44100, n_steps=semitones,
+            n_fft=QUALITY_PROFILES[quality]['n_fft'], res_type=QUALITY_PROFILES[quality]['res_type']
+        )
+        assert np.abs(analysis.render(semitones) - expected).max() <= LADDER_TOLERANCE
+
+@pytest.mark.parametrize('frequency', [220.0, 330.0])
+def test_psola_lands_on_the_target_pitch(frequency):
+    samples = sung_note(2, frequency=frequency)
+    renderer = ladder_renderer(samples, 22050, {'engine': 'psola'}, frequency)
+    assert isinstance(renderer, PsolaRenderer)
+
+    # Measured against the input's own estimate, which the vibrato biases a few cents
+    source = estimate_pitch(samples.mean(axis=0), 22050, 'yin', window=None)
+    for semitones in (-7, -3.5, 5, 12):
+        shifted = renderer.render(semitones)
+        assert shifted.shape == samples.shape
+        pitch = estimate_pitch(shifted.mean(axis=0), 22050, 'yin', window=None)
+        assert abs(1200 * np.log2(pitch / source) - 100 * semitones) < 5
+
+@pytest.mark.parametrize('detector', ['piptrack', 'yin'])
+def test_detected_pitch_is_a_python_float(tmp_path, note_wav, detector):
+    from pydub import AudioSegment
+    from soundladder_engine import PitchStore, decode_input, detect_sound_pitch, input_cache
+
+    assert type(detect_sound_pitch(AudioSegment.from_wav(note_wav), detector)) is float
+    assert type(detect_sound_pitch(decode_input(note_wav), detector)) is float
+
+    input_cache.store = PitchStore(str(tmp_path / 'pitch.db'))
+    detected = input_cache.pitch(note_wav, detector)
+    input_cache.clear()
+    stored = input_cache.pitch(note_wav, detector)
+    assert type(detected) is float and stored == detected
+
+def test_input_cache_decodes_outside_its_lock(tmp_path, monkeypatch):
+    import threading
+    import soundladder_engine
+    from conftest import write_wav
+    from soundladder_engine import InputCache
+
+    slow = write_wav(tmp_path / 'slow.wav', sung_note(0.5))
+    fast = write_wav(tmp_path / 'fast.wav', sung_note(0.5, frequency=330.0))
+    started, release = threading.Event(), threading.Event()
+    decoded = []
+    decode_input = soundladder_engine.decode_input
+
+    def held_decode(path):
+        decoded.append(path)
+        if path == slow:
+            started.set()
+            assert release.wait(10)
+        return decode_input(path)
+
+    monkeypatch.setattr(soundladder_engine, 'decode_input', held_decode)
+    cache = InputCache()
+    waiting = [threading.Thread(target=cache.sound, args=(slow,)) for _ in range(2)]
+    for thread in waiting:
+        thread.start()
+
+    # Another file is served while the first one is still decoding
+    assert started.wait(10)
+    assert cache.pitch(fast, 'yin') > 0
+    release.set()
+    for thread in waiting:
+        thread.join(10)
+    assert not any(thread.is_alive() for thread in waiting)
+    assert sorted(decoded) == sorted([slow, fast])
@@ -0,0 +1,46 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from conftest import sung_note
+from soundladder_engine import generate_batch, rung_tags
+from soundladder_export import PackedLadder, encode_mp3, rung_encoder
+
+def test_packed_ladder_of_freshly_detected_input(tmp_path, note_wav, settings):
+    settings['output_format'] = 'packed'
+    assert generate_batch([note_wav], str(tmp_path), settings) == []
+
+    with open(tmp_path / 'note_ladder.json', encoding='utf-8') as f:
+        index = json.load(f)
+    assert [entry['note'] for entry in index['rungs']] == [60.0, 61.0, 62.0, 63.0]
+    assert all(type(entry['semitones']) is float for entry in index['rungs'])
+    assert os.path.exists(tmp_path / 'note_ladder.sfz')
+
+def test_index_accepts_numpy_scalars(tmp_path):
+    packed = PackedLadder.create(str(tmp_path / 'x_ladder.wav'), 22050, 1, 2, [100, 90])
+    rungs = [(i, np.float32(-1.5 + i), None) for i in range(2)]
+    index_path, sfz_path = packed.write_index(rungs, np.float64(60.0), np.float32(0.5))
+    with open(index_path, encoding='utf-8') as f:
+        entries = json.load(f)['rungs']
+    assert [entry['semitones'] for entry in entries] == [-1.5, -0.5]
+    assert [entry['note'] for entry in entries] == [60.0, 60.5]
+
+@pytest.mark.parametrize('channels', [1, 2])
+def test_mp3_rung_decodes_back(tmp_path, channels):
+    pytest.importorskip('lameenc')
+    soundfile = pytest.importorskip('soundfile')
+    if 'MP3' not in soundfile.available_formats():
+        pytest.skip("libsndfile cannot read MP3")
+
+    samples = sung_note(1, channels=channels)
+    output_file = str(tmp_path / 'note_sound_001.mp3')
+    pcm = rung_encoder('mp3', 3).encode(samples)
+    encode_mp3(output_file, pcm, 22050, channels, rung_tags('note.wav', 0, 3.0))
+
+    decoded, sample_rate = soundfile.read(output_file, always_2d=True)
+    assert sample_rate == 22050
+    assert decoded.shape[1] == channels
+    # Encoder delay and padding add at most a few frames of 576 samples
+    assert samples.shape[1] <= len(decoded) <= samples.shape[1] + 4 * 576
@@ -0,0 +1,148 @@
+from types import SimpleNamespace
+
+from soundladder_filelist import FileRegistry, VirtualFileList
+
+STATUS_TEXT = {'QUEUED': "Queued", 'COMPLETED': "Done"}
+
+class FakeTreeview:
+    """The part of ttk.Treeview that VirtualFileList uses, without a display."""
+    def __init__(self, height):
+        self.height = height
+        self.rows = {}
+        self.order = []
+        self.selected = ()
+        self.focused = ''
+        self.bindings = {}
+        self.updates = 0
+        self._next = 0
+
+    def cget(self, option):
+        return str(self.height)
+
+    def configure(self, **options):
+        pass
+
+    def bind(self, sequence, handler):
+        self.bindings[sequence] = handler
+
+    def insert(self, parent, index, values):
+        self._next += 1
+        row = f"I{self._next:03d}"
+        self.rows[row] = values
+        self.order.append(row)
+        return row
+
+    def delete(self, row):
+        del self.rows[row]
+        self.order.remove(row)
+
+    def item(self, row, values):
+        self.rows[row] = values
+        self.updates += 1
+
+    def selection(self):
+        return self.selected
+
+    def selection_set(self, rows):
+        self.selected = tuple(rows)
+
+    def after_idle(self, callback):
+        callback()
+
+    def focus(self, row=None):
+        if row is None:
+            return self.focused
+        self.focused = row
+
+    def names(self):
+        return [self.rows[row][0] for row in self.order]
+
+class FakeScrollbar:
+    def configure(self, **options):
+        self.command = options['command']
+
+    def set(self, first, last):
+        self.position = (first, last)
+
+def file_list(count, height=5):
+    registry = FileRegistry()
+    registry.add([f"/in/file{i:05d}.wav" for i in range(count)])
+    treeview = FakeTreeview(height)
+    return registry, treeview, VirtualFileList(treeview, FakeScrollbar(), registry, STATUS_TEXT)
+
+def test_registry_order_and_lookup():
+    registry = FileRegistry()
+    added = registry.add(["/in/a.wav", "/in/b.wav", "/in/../in/a.wav", "/in/c.wav"])
+    assert [entry.path for entry in added] == ["/in/a.wav", "/in/b.wav", "/in/c.wav"]
+    assert registry.find("/in/b.wav") is added[1]
+    assert registry.position(added[2].item_id) == 2
+
+    assert registry.remove([added[1].item_id, "unknown"]) == 1
+    assert registry.paths() == ["/in/a.wav", "/in/c.wav"]
+    assert registry.position(added[2].item_id) == 1
+    assert registry.find("/in/b.wav") is None
+    # Item IDs are not reused
+    assert registry.add(["/in/b.wav"])[0].item_id not in {entry.item_id for entry in added}
+
+def test_only_visible_rows_exist():
+    registry, treeview, view = file_list(50000)
+    assert treeview.names() == [f"file{i:05d}.wav" for i in range(5)]
+
+    view.yview('moveto', '0.5')
+    assert treeview.names() == [f"file{i:05d}.wav" for i in range(25000, 25005)]
+    assert view.scrollbar.position == (0.5, 25005 / 50000)
+    view.yview('scroll', '1', 'pages')
+    assert treeview.names()[0] == "file25005.wav"
+    view.yview('moveto', '1.0')
+    assert treeview.names()[-1] == "file49999.wav"
+    assert len(treeview.rows) == 5
+
+def test_scrolling_only_updates_changed_rows():
+    registry, treeview, view = file_list(20)
+    treeview.updates = 0
+    view.refresh()
+    assert treeview.updates == 0
+    registry[2].status, registry[2].progress = 'COMPLETED', 100
+    view.refresh()
+    assert treeview.updates == 1
+    assert treeview.rows[treeview.order[2]] == ("file00002.wav", "Done", "100%")
+
+def test_list_shrinks_and_grows():
+    registry, treeview, view = file_list(3)
+    assert len(treeview.rows) == 3
+    registry.add([f"/more/{i}.wav" for i in range(10)])
+    view.refresh()
+    assert len(treeview.rows) == 5
+    registry.clear()
+    view.refresh()
+    assert len(treeview.rows) == 0 and view.scrollbar.position == (0.0, 1.0)
+
+def test_selection_survives_scrolling():
+    registry, treeview, view = file_list(100)
+    view._on_click(SimpleNamespace(state=0))
+    treeview.selected = (treeview.order[1],)
+    view._on_select(None)
+    chosen = registry[1].item_id
+
+    view.scroll(50)
+    assert treeview.selection() == ()
+    view.see(chosen)
+    assert view.top == 1
+    assert treeview.selection() == (treeview.order[0],)
+
+    # Control-click on another row adds to the selection
+    view._on_click(SimpleNamespace(state=0x4))
+    treeview.selected = (treeview.order[0], treeview.order[3])
+    view._on_select(None)
+    assert view.selection() == [chosen, registry[4].item_id]
+
+    registry.remove([chosen])
+    assert view.selection() == [registry[3].item_id]
+
+def test_arrow_keys_scroll_past_the_visible_rows():
+    registry, treeview, view = file_list(100)
+    treeview.focus(treeview.order[4])
+    view._on_arrow(1)
+    assert view.top == 1
+    assert view.selection() == [registry[5].item_id]
+    assert treeview.focus() == treeview.order[4]
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from pydub import AudioSegment
+
+from conftest import sung_note, write_aiff, write_wav
+from soundladder_engine import audio_hash, sound_to_samples, source_sample_width
+from soundladder_pcm import READ_BLOCK_FRAMES, open_pcm_file
+
+@pytest.mark.parametrize('sample_width', [1, 2, 3, 4])
+@pytest.mark.parametrize('channels', [1, 2])
+def test_mapped_wav_matches_pydub(tmp_path, sample_width, channels):
+    path = write_wav(tmp_path / 'in.wav', sung_note(0.5, channels=channels), sample_width=sample_width)
+    pcm = open_pcm_file(path)
+    sound = AudioSegment.from_wav(path)
+
+    assert (pcm.frame_rate, pcm.channels, pcm.frame_count()) == (sound.frame_rate, sound.channels, sound.frame_count())
+    assert source_sample_width(pcm) == source_sample_width(sound) == sample_width
+    np.testing.assert_array_equal(sound_to_samples(pcm), sound_to_samples(sound))
+    assert audio_hash(pcm) == audio_hash(sound)
+
+@pytest.mark.parametrize('sample_width', [1, 2, 3, 4])
+def test_mapped_aiff_matches_wav(tmp_path, sample_width):
+    samples = sung_note(0.5)
+    aiff = open_pcm_file(write_aiff(tmp_path / 'in.aiff', samples, sample_width=sample_width))
+    sound = AudioSegment.from_wav(write_wav(tmp_path / 'in.wav', samples, sample_width=sample_width))
+
+    np.testing.assert_array_equal(sound_to_samples(aiff), sound_to_samples(sound))
+    assert audio_hash(aiff) == audio_hash(sound)
+
+def test_read_pads_outside_the_file(tmp_path):
+    pcm = open_pcm_file(write_wav(tmp_path / 'in.wav', sung_note(0.1)))
+    whole = pcm.to_samples()
+    window = pcm.read(-10, pcm.length + 10)
+    assert not window[:, :10].any() and not window[:, -10:].any()
+    np.testing.assert_array_equal(window[:, 10:-10], whole)
+
+def test_hash_spans_read_blocks(tmp_path):
+    samples = sung_note(READ_BLOCK_FRAMES * 1.5 / 22050, channels=1)
+    path = write_wav(tmp_path / 'in.wav', samples)
+    assert audio_hash(open_pcm_file(path)) == audio_hash(AudioSegment.from_wav(path))
+
+def test_compressed_and_float_files_are_not_mapped(tmp_path):
+    path = tmp_path / 'float.wav'
+    write_wav(path, sung_note(0.1))
+    data = bytearray(path.read_bytes())
+    data[20:22] = (3).to_bytes(2, 'little')  # WAVE_FORMAT_IEEE_FLOAT
+    path.write_bytes(bytes(data))
+    assert open_pcm_file(str(path)) is None
+    (tmp_path / 'x.mp3').write_bytes(b'ID3' + bytes(64))
+    assert open_pcm_file(str(tmp_path / 'x.mp3')) is None
@@ -0,0 +1,88 @@
+import os
+import time
+
+import pytest
+
+from soundladder_engine import generate_batch, input_cache
+from soundladder_queue import QueueWorker, WorkSpool
+
+def read_outputs(directory):
+    return {name: open(os.path.join(directory, name), 'rb').read() for name in sorted(os.listdir(directory))}
+
+@pytest.mark.parametrize('memory_budget_mb', [0, 1])
+def test_spooled_job_matches_serial(tmp_path, note_wav, settings, memory_budget_mb):
+    settings['memory_budget_mb'] = memory_budget_mb
+    assert generate_batch([note_wav], str(tmp_path / 'serial'), settings) == []
+    input_cache.clear()
+
+    spool = WorkSpool(str(tmp_path / 'spool'))
+    job = dict(settings, inputs=[note_wav], output_dir=str(tmp_path / 'queued'), workers=1)
+    job_id, units = spool.submit(job, unit_rungs=3)
+    assert units == 2
+    assert QueueWorker(spool).run() == 2
+    assert spool.status()[job_id] == {'units': 2, 'done': 2, 'claimed': 0, 'failed': 0, 'pending': 0}
+    assert read_outputs(tmp_path / 'queued') == read_outputs(tmp_path / 'serial')
+
+def test_claims_are_exclusive_until_the_lease_runs_out(tmp_path, note_wav, settings):
+    first = WorkSpool(str(tmp_path / 'spool'), lease=0.5)
+    second = WorkSpool(str(tmp_path / 'spool'), lease=0.5)
+    first.submit(dict(settings, inputs=[note_wav], output_dir=str(tmp_path / 'out'), workers=1))
+    unit_id, claim = first.claim_next()
+
+    # The heartbeat keeps a held claim fresh past its lease
+    with claim:
+        time.sleep(1.0)
+        assert second.claim_next() is None
+
+    # A claim nobody touches goes stale and the other worker takes it over
+    assert first.claim(unit_id) is not None
+    time.sleep(1.0)
+    reclaimed = second.claim_next()
+    assert reclaimed is not None and reclaimed[0] == unit_id
+    reclaimed[1].release()
+
+def test_packed_jobs_are_refused(tmp_path, note_wav, settings):
+    spool = WorkSpool(str(tmp_path / 'spool'))
+    with pytest.raises(ValueError):
+        spool.submit(dict(settings, output_format='packed', inputs=[note_wav], output_dir=str(tmp_path), workers=1))
+
+def test_breaking_a_claim_that_was_claimed_again(tmp_path, note_wav, settings, monkeypatch):
+    spool_path = str(tmp_path / 'spool')
+    holder = WorkSpool(spool_path, lease=0.5)
+    first, second = WorkSpool(spool_path, lease=0.5), WorkSpool(spool_path, lease=0.5)
+    holder.submit(dict(settings, inputs=[note_wav], output_dir=str(tmp_path / 'out'), workers=1))
+    unit_id, _ = holder.claim_next()
+    time.sleep(0.6)
+
+    # Both breakers find the claim stale; the second breaks it and claims the
+    # unit again between the first one's check and its rename
+    rename = os.rename
+    taken = []
+    def interleaved(source, target):
+        monkeypatch.setattr(os, 'rename', rename)
+        assert second._break_stale(unit_id)
+        taken.append(second.claim(unit_id))
+        rename(source, target)
+    monkeypatch.setattr(os, 'rename', interleaved)
+    assert not first._break_stale(unit_id)
+    monkeypatch.undo()
+
+    claim = taken[0]
+    assert claim is not None and claim.held()
+    assert first.claim(unit_id) is None
+    with claim:
+        pass
+    assert not claim.lost and not claim.held()
+
+def test_reclaimed_claim_is_lost_to_its_holder(tmp_path, note_wav, settings):
+    spool_path = str(tmp_path / 'spool')
+    holder, other = WorkSpool(spool_path, lease=0.4), WorkSpool(spool_path, lease=0.4)
+    holder.submit(dict(settings, inputs=[note_wav], output_dir=str(tmp_path / 'out'), workers=1))
+    unit_id, claim = holder.claim_next()
+    time.sleep(0.5)
+    _, taken = other.claim_next()
+
+    # The old holder neither refreshes nor removes the new claim
+    claim.release()
+    assert taken.held() and not claim.held()
+    taken.release()
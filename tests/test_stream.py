@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pytest
+from pydub import AudioSegment
+
+from conftest import SAMPLE_RATE, sung_note, write_wav
+from soundladder_engine import active_span, generate_batch, input_cache, sound_to_samples
+from soundladder_pcm import open_pcm_file
+from soundladder_stream import SpanView, place_blocks, spooled_active_span
+
+# Two steps of 16-bit PCM
+STREAM_TOLERANCE = 2.0 / 32768
+
+def read_rungs(directory):
+    return {
+        name: sound_to_samples(AudioSegment.from_wav(os.path.join(directory, name)))
+        for name in sorted(os.listdir(directory))
+    }
+
+@pytest.mark.parametrize('engine, target_duration', [('vocoder', 0.0), ('varispeed', 0.0), ('varispeed', 1.2)])
+def test_streamed_rungs_match_in_memory(tmp_path, note_wav, settings, engine, target_duration):
+    settings.update(engine=engine, target_duration=target_duration, pitch_increment=2.5)
+    assert generate_batch([note_wav], str(tmp_path / 'memory'), settings) == []
+    input_cache.clear()
+    # A tiny budget, so every rung takes many blocks
+    assert generate_batch([note_wav], str(tmp_path / 'stream'), dict(settings, memory_budget_mb=1)) == []
+
+    in_memory = read_rungs(tmp_path / 'memory')
+    streamed = read_rungs(tmp_path / 'stream')
+    assert streamed.keys() == in_memory.keys()
+    for name, samples in in_memory.items():
+        assert streamed[name].shape == samples.shape
+        assert np.abs(streamed[name] - samples).max() <= STREAM_TOLERANCE
+
+def test_spooled_active_span(tmp_path):
+    silence = np.zeros((2, SAMPLE_RATE // 3 + 7), dtype=np.float32)
+    samples = np.concatenate([silence, sung_note(0.5), silence], axis=1)
+    pcm = open_pcm_file(write_wav(tmp_path / 'in.wav', samples))
+    start, stop = spooled_active_span(pcm)
+    assert (start, stop) == active_span(pcm.to_samples(), SAMPLE_RATE)
+    assert 0 < start and stop < pcm.length
+
+    view = SpanView(pcm, start, stop)
+    np.testing.assert_array_equal(view.read(-5, view.length + 5)[:, 5:-5], pcm.read(start, stop))
+    assert not view.read(-5, 0).any() and not view.read(view.length, view.length + 5).any()
+
+def test_place_blocks():
+    blocks = [np.ones((1, 3), dtype=np.float32)] * 3
+    placed = np.concatenate(list(place_blocks(iter(blocks), 2, 8, 1, 4)), axis=1)
+    np.testing.assert_array_equal(placed, [[0, 0, 1, 1, 1, 1, 1, 1]])
+    placed = np.concatenate(list(place_blocks(iter(blocks[:1]), 2, 8, 1, 4)), axis=1)
+    np.testing.assert_array_equal(placed, [[0, 0, 1, 1, 1, 0, 0, 0]])
+
+@pytest.mark.parametrize('frames_per_block', [8, 13, 1000])
+def test_stretch_blocks_match_ladder_analysis(tmp_path, frames_per_block):
+    from soundladder_engine import LadderAnalysis
+    from soundladder_stream import stretch_blocks
+
+    pcm = open_pcm_file(write_wav(tmp_path / 'in.wav', sung_note(1.0)))
+    expected = LadderAnalysis(pcm.to_samples(), SAMPLE_RATE, 'standard').stretch(0.8)
+    streamed = np.concatenate(list(stretch_blocks(pcm, 0.8, 2048, frames_per_block)), axis=1)
+    assert streamed.shape == expected.shape
+    assert np.abs(streamed - expected).max() <= 1e-5
+
+@pytest.mark.parametrize('samples_per_block', [4096, 10000])
+def test_resample_blocks_match_filter_bank(samples_per_block):
+    import librosa
+    from soundladder_engine import filter_bank
+    from soundladder_stream import resample_blocks
+
+    samples = sung_note(1.0)
+    up, down = filter_bank.ratio(5.0)
+    expected = librosa.util.fix_length(filter_bank.resample(samples, up, down), size=samples.shape[1])
+    blocks = (samples[:, start:start + 3000] for start in range(0, samples.shape[1], 3000))
+    resampled = np.concatenate(
+        list(resample_blocks(blocks, samples.shape[1], up, down, samples.shape[1], samples_per_block)), axis=1
+    )
+    assert np.abs(resampled - expected).max() <= 1e-5
+
+@pytest.mark.parametrize('engine', ['vocoder', 'varispeed'])
+def test_memory_follows_the_budget(tmp_path, engine):
+    import tracemalloc
+    from soundladder_stream import render_streaming_rung
+
+    short = open_pcm_file(write_wav(tmp_path / 'short.wav', sung_note(2.0)))
+    long = open_pcm_file(write_wav(tmp_path / 'long.wav', sung_note(40.0)))
+    # Kernels and FFT plans are cached on first use
+    render_streaming_rung(short, 3.0, str(tmp_path / 'out.wav'), 'wav', {}, 'standard', 1, engine=engine)
+
+    tracemalloc.start()
+    try:
+        render_streaming_rung(long, 3.0, str(tmp_path / 'out.wav'), 'wav', {}, 'standard', 1, engine=engine)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Well under the 7 MB of the decoded input alone
+    assert peak < 2 * 1024 * 1024